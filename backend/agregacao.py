@@ -0,0 +1,314 @@
+# Agregação do histórico em baldes de tempo para os gráficos.
+#
+# Em vez de enviar todas as linhas ao frontend, as rotas devolvem uma série com
+# a quantidade de pontos pedida: cada balde traz mínimo, máximo, média e
+# percentis (p50/p95), calculados no próprio SQLite com GROUP BY e funções de
+# janela. As taxas de tráfego vêm das diferenças entre contadores consecutivos
+# (LAG) ou dos agregados da série temporal. Opcionalmente, a série pode ser
+# reduzida com LTTB (Largest-Triangle-Three-Buckets), que preserva picos e vales.
+import math
+import time
+
+from flask import Blueprint, jsonify, request
+
+import banco
+import config
+import identidade
+import paginacao
+import serie_temporal
+
+agregacao_bp = Blueprint("agregacao", __name__)
+
+METRICAS_VELOCIDADE = ("ping_ms", "download_mb", "upload_mb")
+METRICAS_TRAFEGO = ("download_bps", "upload_bps")
+
+
+# ==== CONSTRUÇÃO DAS CONSULTAS ====
+
+# Percentil por posição mais próxima: o valor de posição ceil(q * n) entre os n valores
+# não nulos da métrica no balde (os nulos ficam depois deles na ordenação)
+def _percentil(metrica, q):
+    return (f"MAX(CASE WHEN r_{metrica} >= {q} * n_{metrica} AND r_{metrica} - 1 < {q} * n_{metrica} "
+            f"THEN {metrica} END)")
+
+
+# Monta a consulta de estatísticas por balde sobre uma origem com as colunas "balde" e as métricas.
+# extras são expressões agregadas adicionais (por exemplo, somas) incluídas depois das estatísticas.
+def _sql_estatisticas(origem, metricas, extras=()):
+    posicoes = ", ".join(
+        f"COUNT({m}) OVER (PARTITION BY balde) AS n_{m}, "
+        f"ROW_NUMBER() OVER (PARTITION BY balde ORDER BY {m} NULLS LAST) AS r_{m}"
+        for m in metricas
+    )
+    colunas = []
+    for m in metricas:
+        colunas += [f"MIN({m})", f"MAX({m})", f"AVG({m})", _percentil(m, 0.5), _percentil(m, 0.95)]
+    colunas += list(extras)
+    return f"""
+        WITH origem AS ({origem}),
+        ordenadas AS (
+            SELECT *, {posicoes}
+            FROM origem
+        )
+        SELECT balde, COUNT(*), {", ".join(colunas)}
+        FROM ordenadas
+        GROUP BY balde
+        ORDER BY balde
+    """
+
+
+# Converte uma linha de estatísticas em {metrica: {min, max, media, p50, p95}}
+def _estatisticas(linha, metricas, inicio, largura):
+    balde = {"timestamp": inicio + linha[0] * largura, "amostras": linha[1]}
+    for i, m in enumerate(metricas):
+        minimo, maximo, media, p50, p95 = linha[2 + i * 5:7 + i * 5]
+        balde[m] = {"min": minimo, "max": maximo, "media": media, "p50": p50, "p95": p95}
+    return balde
+
+
+# Largura (segundos inteiros) dos baldes para dividir o intervalo na quantidade de pontos pedida
+def largura_balde(inicio, fim, pontos):
+    return max(1, math.ceil((fim - inicio) / max(1, pontos)))
+
+
+# ==== LTTB ====
+
+# Reduz pontos (x, y, ...) ordenados por x a no máximo "limite" pontos pelo algoritmo LTTB
+def lttb(pontos, limite):
+    if limite >= len(pontos) or limite < 3:
+        return list(pontos)
+
+    selecionados = [pontos[0]]
+    tamanho = (len(pontos) - 2) / (limite - 2)
+    a = pontos[0]
+    for i in range(limite - 2):
+        inicio = int(i * tamanho) + 1
+        fim = int((i + 1) * tamanho) + 1
+        # Média do próximo balde, usada como terceiro vértice do triângulo
+        proximo = pontos[fim:min(int((i + 2) * tamanho) + 1, len(pontos))] or [pontos[-1]]
+        media_x = sum(p[0] for p in proximo) / len(proximo)
+        media_y = sum(p[1] for p in proximo) / len(proximo)
+
+        melhor, maior_area = None, -1.0
+        for p in pontos[inicio:fim]:
+            area = abs((a[0] - media_x) * (p[1] - a[1]) - (a[0] - p[0]) * (media_y - a[1]))
+            if area > maior_area:
+                melhor, maior_area = p, area
+        selecionados.append(melhor)
+        a = melhor
+    selecionados.append(pontos[-1])
+    return selecionados
+
+
+# ==== VELOCIDADE ====
+
+# Estatísticas dos testes de velocidade por balde; inicio/fim em epoch (padrão: todo o histórico)
+def agregar_velocidade(dispositivo_id, inicio=None, fim=None, pontos=None):
+    conn = banco.obter_conexao()
+    if inicio is None or fim is None:
+        primeiro, ultimo = conn.execute("""
+            SELECT CAST(strftime('%s', MIN(timestamp), 'utc') AS INTEGER),
+                   CAST(strftime('%s', MAX(timestamp), 'utc') AS INTEGER)
+            FROM velocidade WHERE dispositivo_id = ?
+        """, (dispositivo_id,)).fetchone()
+        if primeiro is None:
+            return {"inicio": inicio, "fim": fim, "largura_segundos": None, "baldes": []}
+        inicio = primeiro if inicio is None else inicio
+        fim = ultimo if fim is None else fim
+    inicio, fim = int(inicio), int(fim)
+    largura = largura_balde(inicio, fim + 1, pontos or config.PONTOS_SERIE)
+
+    origem = f"""
+        SELECT (CAST(strftime('%s', timestamp, 'utc') AS INTEGER) - :inicio) / :largura AS balde,
+               {", ".join(METRICAS_VELOCIDADE)}
+        FROM velocidade
+        WHERE dispositivo_id = :dispositivo AND timestamp >= :inicio_texto AND timestamp <= :fim_texto
+    """
+    cursor = conn.execute(_sql_estatisticas(origem, METRICAS_VELOCIDADE), {
+        "dispositivo": dispositivo_id,
+        "inicio": inicio,
+        "largura": largura,
+        "inicio_texto": paginacao.instante_texto(inicio),
+        "fim_texto": paginacao.instante_texto(fim),
+    })
+    baldes = [_estatisticas(linha, METRICAS_VELOCIDADE, inicio, largura) for linha in cursor]
+    return {"inicio": inicio, "fim": fim, "largura_segundos": largura, "baldes": baldes}
+
+
+# Testes de velocidade reduzidos por LTTB sobre uma métrica
+def reduzir_velocidade(dispositivo_id, inicio=None, fim=None, pontos=None, metrica="download_mb"):
+    if metrica not in METRICAS_VELOCIDADE:
+        raise ValueError(f"Métrica inválida: {metrica}")
+    condicoes, parametros = [], []
+    if inicio is not None:
+        condicoes.append("timestamp >= ?")
+        parametros.append(paginacao.instante_texto(inicio))
+    if fim is not None:
+        condicoes.append("timestamp <= ?")
+        parametros.append(paginacao.instante_texto(fim))
+    filtros = "".join(f" AND {c}" for c in condicoes)
+    linhas = banco.obter_conexao().execute(f"""
+        SELECT CAST(strftime('%s', timestamp, 'utc') AS INTEGER), {metrica}, ping_ms, download_mb, upload_mb
+        FROM velocidade
+        WHERE dispositivo_id = ?{filtros}
+        ORDER BY timestamp, id
+    """, (dispositivo_id, *parametros)).fetchall()
+    selecionados = lttb(linhas, pontos or config.PONTOS_SERIE)
+    return {
+        "metrica": metrica,
+        "pontos": [
+            {"timestamp": ts, "ping_ms": ping, "download_mb": download, "upload_mb": upload}
+            for ts, _, ping, download, upload in selecionados
+        ],
+    }
+
+
+# ==== TRÁFEGO ====
+
+# Prepara a origem dos intervalos de tráfego (ts, duracao, download_bytes, upload_bytes).
+# Nos níveis agregados, cada balde da série é um intervalo; no nível bruto, as amostras
+# vão para uma tabela temporária e os volumes saem da diferença entre contadores (LAG).
+def _origem_trafego(conn, dispositivo_id, inicio, fim, nivel):
+    if nivel != serie_temporal.BRUTO:
+        return """
+            SELECT balde AS ts, nivel AS duracao, download_bytes, upload_bytes
+            FROM trafego_agregados
+            WHERE dispositivo_id = :dispositivo AND nivel = :nivel AND balde BETWEEN :inicio AND :fim
+        """
+
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS amostras_agregacao (ts INTEGER, download INTEGER, upload INTEGER)")
+    conn.execute("DELETE FROM temp.amostras_agregacao")
+    conn.executemany(
+        "INSERT INTO temp.amostras_agregacao (ts, download, upload) VALUES (?, ?, ?)",
+        serie_temporal.amostras(dispositivo_id, inicio, fim),
+    )
+    return """
+        SELECT ts, duracao,
+               CASE WHEN download >= download_anterior THEN download - download_anterior ELSE download END
+                   AS download_bytes,
+               CASE WHEN upload >= upload_anterior THEN upload - upload_anterior ELSE upload END
+                   AS upload_bytes
+        FROM (
+            SELECT ts, download, upload,
+                   ts - LAG(ts) OVER janela AS duracao,
+                   LAG(download) OVER janela AS download_anterior,
+                   LAG(upload) OVER janela AS upload_anterior
+            FROM temp.amostras_agregacao
+            WINDOW janela AS (ORDER BY ts)
+        )
+        WHERE duracao > 0
+    """
+
+
+# Taxas de tráfego (bytes por segundo) por balde; inicio/fim em epoch (padrão: últimas 24 horas)
+def agregar_trafego(dispositivo_id, inicio=None, fim=None, pontos=None, reduzir=False):
+    fim = int(time.time()) if fim is None else int(fim)
+    inicio = fim - serie_temporal.DIA if inicio is None else int(inicio)
+    pontos = pontos or config.PONTOS_SERIE
+    largura = largura_balde(inicio, fim + 1, pontos)
+    nivel = serie_temporal.escolher_nivel(largura, inicio)
+
+    with banco.transacao() as conn:
+        intervalos = _origem_trafego(conn, dispositivo_id, inicio, fim, nivel)
+        parametros = {"dispositivo": dispositivo_id, "nivel": nivel, "inicio": inicio, "fim": fim,
+                      "largura": largura}
+
+        if reduzir:
+            linhas = conn.execute(f"""
+                SELECT ts, (download_bytes + upload_bytes) * 1.0 / duracao,
+                       download_bytes * 1.0 / duracao, upload_bytes * 1.0 / duracao
+                FROM ({intervalos})
+                ORDER BY ts
+            """, parametros).fetchall()
+            pontos_reduzidos = [
+                {"timestamp": ts, "download_bps": download, "upload_bps": upload}
+                for ts, _, download, upload in lttb(linhas, pontos)
+            ]
+            return {"inicio": inicio, "fim": fim, "nivel": nivel, "pontos": pontos_reduzidos}
+
+        origem = f"""
+            SELECT (ts - :inicio) / :largura AS balde, duracao, download_bytes, upload_bytes,
+                   download_bytes * 1.0 / duracao AS download_bps,
+                   upload_bytes * 1.0 / duracao AS upload_bps
+            FROM ({intervalos})
+            WHERE ts >= :inicio
+        """
+        extras = ("SUM(download_bytes)", "SUM(upload_bytes)", "SUM(duracao)")
+        baldes = []
+        for linha in conn.execute(_sql_estatisticas(origem, METRICAS_TRAFEGO, extras), parametros):
+            balde = _estatisticas(linha, METRICAS_TRAFEGO, inicio, largura)
+            download_bytes, upload_bytes, duracao = linha[-3:]
+            balde["download_bytes"] = download_bytes
+            balde["upload_bytes"] = upload_bytes
+            # A média da taxa é ponderada pelo tempo coberto por cada intervalo
+            balde["download_bps"]["media"] = download_bytes / duracao if duracao else None
+            balde["upload_bps"]["media"] = upload_bytes / duracao if duracao else None
+            baldes.append(balde)
+
+    return {"inicio": inicio, "fim": fim, "nivel": nivel, "largura_segundos": largura, "baldes": baldes}
+
+
+# ==== ROTAS ====
+
+# Retorna o ID da máquina local no banco, ou None se ainda não registrada
+def _dispositivo_local_id():
+    linha = banco.obter_conexao().execute(
+        "SELECT id FROM dispositivos WHERE ip = ?", (identidade.ip_local(),)
+    ).fetchone()
+    return linha[0] if linha else None
+
+
+# Lê from, to, pontos e lttb dos parâmetros; ValueError se inválidos
+def _ler_parametros():
+    inicio = paginacao.ler_instante(request.args.get("from"))
+    fim = paginacao.ler_instante(request.args.get("to"))
+    pontos = request.args.get("pontos")
+    if pontos not in (None, ""):
+        try:
+            pontos = int(pontos)
+        except ValueError:
+            raise ValueError(f"Quantidade de pontos inválida: {pontos}")
+        if pontos < 1:
+            raise ValueError(f"Quantidade de pontos inválida: {pontos}")
+    return inicio, fim, pontos or None, request.args.get("lttb") == "1"
+
+
+@agregacao_bp.route("/agregacao/speedtest", methods=["GET"])
+def agregacao_speedtest():
+    """
+    Série dos testes de velocidade da máquina local em baldes de tempo, com
+    mínimo, máximo, média, p50 e p95 de ping, download e upload. Com lttb=1,
+    devolve os próprios testes reduzidos por LTTB sobre "metrica".
+    """
+    try:
+        inicio, fim, pontos, reduzir = _ler_parametros()
+        dispositivo_id = _dispositivo_local_id()
+        if dispositivo_id is None:
+            return jsonify({"erro": "Máquina local ainda não registrada"}), 404
+        if reduzir:
+            metrica = request.args.get("metrica", "download_mb")
+            return jsonify(reduzir_velocidade(dispositivo_id, inicio, fim, pontos, metrica))
+        return jsonify(agregar_velocidade(dispositivo_id, inicio, fim, pontos))
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
+    except Exception as e:
+        return jsonify({"erro": str(e)}), 500
+
+
+@agregacao_bp.route("/agregacao/trafego", methods=["GET"])
+def agregacao_trafego():
+    """
+    Série das taxas de tráfego (bytes/s) da máquina local em baldes de tempo,
+    derivadas dos contadores cumulativos. Com lttb=1, devolve as taxas do nível
+    escolhido reduzidas por LTTB.
+    """
+    try:
+        inicio, fim, pontos, reduzir = _ler_parametros()
+        dispositivo_id = _dispositivo_local_id()
+        if dispositivo_id is None:
+            return jsonify({"erro": "Máquina local ainda não registrada"}), 404
+        return jsonify(agregar_trafego(dispositivo_id, inicio, fim, pontos, reduzir))
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
+    except Exception as e:
+        return jsonify({"erro": str(e)}), 500
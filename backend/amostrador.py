@@ -0,0 +1,253 @@
+# Amostrador contínuo do tráfego de rede da máquina local.
+#
+# Uma única thread lê psutil.net_io_counters(pernic=True) a cada
+# INTERVALO_AMOSTRAGEM segundos e guarda, por interface, as taxas de
+# recebimento e envio (bytes por segundo) em buffers circulares de tamanho
+# fixo, apoiados em array (sem um dicionário por amostra). A leitura mais
+# recente fica pronta em memória, então /trafego a entrega em O(1) sem tocar
+# no banco. Os totais vêm da contabilidade por interface (contabilidade.py) e,
+# a cada PERSISTENCIA_AMOSTRADOR segundos, são gravados na série temporal pelo
+# buffer de escrita; com vários processos, só o que detém a trava grava.
+import threading
+import time
+from array import array
+from datetime import datetime
+
+import psutil
+
+import config
+import contabilidade
+import identidade
+import trafego
+
+# fcntl só existe em sistemas POSIX; sem ele, cada processo grava suas amostras
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+TOTAL = "total"  # nome do anel com a soma de todas as interfaces
+
+_aneis = {}  # interface -> Anel
+_anteriores = {}  # interface -> (instante monotônico, bytes recebidos, bytes enviados)
+_ultima_leitura = None
+_ultima_persistencia = 0.0
+_arquivo_trava = None
+_assinantes = []
+_lock = threading.Lock()
+_thread = None
+_parar = threading.Event()
+
+
+class Anel:
+    """Buffer circular de capacidade fixa com (instante, taxa de recebimento, taxa de envio)."""
+
+    __slots__ = ("capacidade", "instantes", "recebidos", "enviados", "proximo", "tamanho")
+
+    def __init__(self, capacidade):
+        self.capacidade = capacidade
+        self.instantes = array("d", bytes(8 * capacidade))
+        self.recebidos = array("d", bytes(8 * capacidade))
+        self.enviados = array("d", bytes(8 * capacidade))
+        self.proximo = 0
+        self.tamanho = 0
+
+    def adicionar(self, instante, recebidos, enviados):
+        i = self.proximo
+        self.instantes[i] = instante
+        self.recebidos[i] = recebidos
+        self.enviados[i] = enviados
+        self.proximo = (i + 1) % self.capacidade
+        if self.tamanho < self.capacidade:
+            self.tamanho += 1
+
+    # Ponto mais recente (instante, recebidos, enviados), ou None
+    def ultimo(self):
+        if not self.tamanho:
+            return None
+        i = (self.proximo - 1) % self.capacidade
+        return self.instantes[i], self.recebidos[i], self.enviados[i]
+
+    # Pontos com instante >= desde, em ordem cronológica
+    def desde(self, desde):
+        pontos = []
+        i = self.proximo
+        for _ in range(self.tamanho):
+            i = (i - 1) % self.capacidade
+            if self.instantes[i] < desde:
+                break
+            pontos.append((self.instantes[i], self.recebidos[i], self.enviados[i]))
+        pontos.reverse()
+        return pontos
+
+
+# Registra uma função chamada com a leitura mais recente a cada amostragem
+def assinar(callback):
+    with _lock:
+        if callback not in _assinantes:
+            _assinantes.append(callback)
+
+
+def cancelar_assinatura(callback):
+    with _lock:
+        if callback in _assinantes:
+            _assinantes.remove(callback)
+
+
+def _emitir(leitura):
+    with _lock:
+        assinantes = list(_assinantes)
+    for callback in assinantes:
+        try:
+            callback(leitura)
+        except Exception as e:
+            print(f"[ERRO] Assinante do amostrador falhou: {e}")
+
+
+# Bytes transferidos desde a leitura anterior; um contador menor indica reinício
+def _diferenca(atual, anterior):
+    return atual - anterior if atual >= anterior else atual
+
+
+# Lê os contadores de todas as interfaces e atualiza os anéis e a leitura mais recente
+def amostrar():
+    global _ultima_leitura
+    contadores = psutil.net_io_counters(pernic=True)
+    agora = time.time()
+    monotonico = time.monotonic()
+
+    with _lock:
+        interfaces = {}
+        taxa_recebidos = taxa_enviados = 0.0
+        medido = False
+        for nome, io in contadores.items():
+            anterior = _anteriores.get(nome)
+            _anteriores[nome] = (monotonico, io.bytes_recv, io.bytes_sent)
+            if anterior is None or monotonico <= anterior[0]:
+                continue
+            decorrido = monotonico - anterior[0]
+            recebidos = _diferenca(io.bytes_recv, anterior[1]) / decorrido
+            enviados = _diferenca(io.bytes_sent, anterior[2]) / decorrido
+            anel = _aneis.get(nome)
+            if anel is None:
+                anel = _aneis[nome] = Anel(config.CAPACIDADE_AMOSTRADOR)
+            anel.adicionar(agora, recebidos, enviados)
+            taxa_recebidos += recebidos
+            taxa_enviados += enviados
+            medido = True
+            interfaces[nome] = {"download_bps": round(recebidos, 1), "upload_bps": round(enviados, 1)}
+
+        # Interfaces que sumiram (desconectadas) deixam de ser acompanhadas
+        for nome in list(_anteriores):
+            if nome not in contadores:
+                _anteriores.pop(nome)
+                _aneis.pop(nome, None)
+
+        if medido:
+            anel = _aneis.get(TOTAL)
+            if anel is None:
+                anel = _aneis[TOTAL] = Anel(config.CAPACIDADE_AMOSTRADOR)
+            anel.adicionar(agora, taxa_recebidos, taxa_enviados)
+
+        # Totais sem quedas nos reinícios dos contadores (ver contabilidade.py)
+        total_recebidos, total_enviados = contabilidade.observar(contadores, agora)
+        download = round(total_recebidos / trafego.BYTES_POR_MB, 2)
+        upload = round(total_enviados / trafego.BYTES_POR_MB, 2)
+        _ultima_leitura = {
+            "data": datetime.fromtimestamp(agora).strftime("%Y-%m-%d %H:%M:%S"),
+            "dispositivo_ip": identidade.ip_local(),
+            "download_mb": download,
+            "upload_mb": upload,
+            "total_mb": round(download + upload, 2),
+            "download_bps": round(taxa_recebidos, 1) if medido else None,
+            "upload_bps": round(taxa_enviados, 1) if medido else None,
+            "interfaces": interfaces,
+        }
+
+    _persistir(agora, total_recebidos, total_enviados)
+    _emitir(_ultima_leitura)
+    return _ultima_leitura
+
+
+# Em servidores com vários processos, só um deles grava as amostras na série
+def _obter_trava():
+    global _arquivo_trava
+    if fcntl is None or _arquivo_trava is not None:
+        return True
+    arquivo = open(config.DB_PATH + ".amostrador.lock", "w")
+    try:
+        fcntl.flock(arquivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        arquivo.close()
+        return False
+    _arquivo_trava = arquivo
+    return True
+
+
+# Grava os totais na série temporal a cada PERSISTENCIA_AMOSTRADOR segundos
+def _persistir(agora, recebidos, enviados):
+    global _ultima_persistencia
+    if agora - _ultima_persistencia < config.PERSISTENCIA_AMOSTRADOR:
+        return
+    _ultima_persistencia = agora
+    if not _obter_trava():
+        return
+    try:
+        trafego.registrar_amostra(agora, recebidos, enviados)
+    except Exception as e:
+        print(f"[ERRO] Falha ao registrar amostra de tráfego: {e}")
+
+
+# Leitura mais recente (totais em MB, taxas em bytes por segundo), ou None se ainda não houver
+def leitura_atual():
+    return _ultima_leitura
+
+
+# Taxas dos últimos "segundos" segundos de uma interface (ou da soma delas),
+# em ordem cronológica: [(instante, download_bps, upload_bps), ...]
+def taxas(interface=TOTAL, segundos=60):
+    with _lock:
+        anel = _aneis.get(interface)
+        if anel is None:
+            return None
+        return anel.desde(time.time() - segundos)
+
+
+def interfaces():
+    with _lock:
+        return sorted(nome for nome in _aneis if nome != TOTAL)
+
+
+# Laço da thread: lê os contadores em intervalos fixos, sem acumular atraso
+def _executar():
+    proxima = time.monotonic()
+    while not _parar.is_set():
+        try:
+            amostrar()
+        except Exception as e:
+            print(f"[ERRO] Falha ao amostrar o tráfego: {e}")
+        proxima += config.INTERVALO_AMOSTRAGEM
+        espera = proxima - time.monotonic()
+        if espera < 0:
+            # Atrasado (máquina suspensa, por exemplo): recomeça a contagem a partir de agora
+            proxima = time.monotonic()
+            espera = 0
+        _parar.wait(espera)
+
+
+# Inicia o amostrador em segundo plano (INTERVALO_AMOSTRAGEM = 0 desliga)
+def iniciar():
+    global _thread
+    if config.INTERVALO_AMOSTRAGEM <= 0 or ativo():
+        return
+    _parar.clear()
+    _thread = threading.Thread(target=_executar, name="amostrador", daemon=True)
+    _thread.start()
+
+
+def parar():
+    _parar.set()
+
+
+def ativo():
+    return _thread is not None and _thread.is_alive()
@@ -3,8 +3,8 @@
 # Importa o módulo de conexão SQLite
 import sqlite3
 
-# Importa o Flask para criar a API, jsonify para respostas JSON
-from flask import Flask, jsonify
+# Importa o Flask para criar a API, jsonify para respostas JSON e request para ler parâmetros
+from flask import Flask, jsonify, request
 
 # Importa o CORS para permitir requisições externas (como do frontend React)
 from flask_cors import CORS
@@ -12,16 +12,13 @@ from flask_cors import CORS
 # ==== IMPORTAÇÕES DOS MÓDULOS PERSONALIZADOS ====
 
 # Importa funções relacionadas ao monitoramento de dispositivos
-from monitor import (
-    escanear_rede,
-    listar_dispositivos_mesma_rede,
-    obter_ip_local,
-    obter_hostname,
-    obter_mac_real_da_maquina,
-)
+from monitor import listar_dispositivos_mesma_rede
+
+# Importa a identidade compartilhada da máquina local
+import identidade
 
 # Importa funções e Blueprint do módulo de tráfego
-from trafego import medir_trafego_local, listar_trafego_local, trafego_bp
+from trafego import medir_trafego_local, listar_trafego_local, serie_trafego_local, trafego_bp
 
 # Importa funções do módulo de speedtest
 from speedtest_module import (
@@ -32,6 +29,29 @@ from speedtest_module import (
 # Importa o Blueprint de sessões de tráfego
 from sessoes import sessoes_bp
 
+# Importa os Blueprints de exportação e de agregação do histórico
+from exportacao import exportacao_bp
+from agregacao import agregacao_bp
+
+# Importa o Blueprint e o publicador de eventos em tempo real (SSE)
+import eventos
+from eventos import eventos_bp
+
+# Importa as varreduras em segundo plano, o registro de tarefas, o motor de presença,
+# a retenção, o amostrador de tráfego e o registro das sessões abertas
+import varreduras
+import tarefas
+import presenca
+import retencao
+import amostrador
+import sessoes_ativas
+
+# Importa as configurações do backend, a camada de acesso ao banco, a paginação e o cache de respostas
+import config
+import banco
+import paginacao
+import cache_respostas
+
 # ==== INICIALIZAÇÃO DA APLICAÇÃO ====
 
 # Cria a aplicação Flask
@@ -44,12 +64,16 @@ CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
 
 def get_db_connection():
     """
-    Cria e retorna uma conexão com o banco de dados SQLite,
-    configurando para que cada linha seja retornada como um dicionário.
+    Retorna a conexão compartilhada da thread com o banco de dados SQLite.
+    Use um cursor de get_db_cursor() para receber as linhas como dicionários.
     """
-    conn = sqlite3.connect("monitoramento.db")
-    conn.row_factory = sqlite3.Row
-    return conn
+    return banco.obter_conexao()
+
+def get_db_cursor():
+    """Retorna um cursor da conexão compartilhada cujas linhas funcionam como dicionários."""
+    cursor = get_db_connection().cursor()
+    cursor.row_factory = sqlite3.Row
+    return cursor
 
 # ==== ROTAS BÁSICAS ====
 
@@ -68,46 +92,136 @@ def ping():
 @app.route("/maquina")
 def maquina_local():
     """
-    Retorna informações da máquina local (IP, MAC e hostname).
+    Retorna informações da máquina local (IP, MAC, hostname e interface) e o
+    ID com que ela está registrada no banco (usado pelas rotas de sessões).
     """
-    ip = obter_ip_local()
-    mac = obter_mac_real_da_maquina()
-    hostname = obter_hostname(ip)
+    dados = identidade.obter_identidade()
+    try:
+        dispositivo_id = sessoes_ativas.dispositivo_local()
+    except sqlite3.Error as e:
+        print(f"[ERRO] Falha ao obter o dispositivo local: {e}")
+        dispositivo_id = None
     return jsonify({
-        "ip": ip,
-        "mac": mac,
-        "hostname": hostname
+        "ip": dados["ip"],
+        "mac": dados["mac"] or "Desconhecido",
+        "hostname": dados["hostname"],
+        "interface": dados["interface"],
+        "dispositivo_id": dispositivo_id
     })
 
 # ==== ROTAS DE DISPOSITIVOS ====
 
 @app.route("/dispositivos/rede")
+@cache_respostas.em_cache("dispositivos", condicao=lambda: config.PRESENCA_ATIVA)
 def dispositivos_mesma_rede():
     """Lista dispositivos salvos que estão na mesma sub-rede da máquina local."""
     dispositivos = listar_dispositivos_mesma_rede()
     return jsonify({"dispositivos": dispositivos})
 
+@app.route("/dispositivos/presenca")
+def estados_presenca():
+    """Lista o estado de presença (online, suspeito, offline) dos dispositivos acompanhados."""
+    return jsonify({"ativo": presenca.ativo(), "dispositivos": presenca.listar_estados()})
+
+# Acrescenta ao resultado da varredura o estado atual de cada dispositivo no motor de presença
+def _com_presenca(dispositivos):
+    estados = {estado["mac"]: estado["estado"] for estado in presenca.listar_estados()}
+    resultado = []
+    for dispositivo in dispositivos:
+        estado = estados.get(dispositivo.get("mac"))
+        if estado is None:
+            resultado.append(dispositivo)
+        else:
+            resultado.append({**dispositivo, "estado": estado, "online": estado != presenca.OFFLINE})
+    return resultado
+
 @app.route("/devices")
 def listar_dispositivos():
-    """Escaneia a rede atual e retorna os dispositivos ativos encontrados."""
+    """
+    Retorna os dispositivos da última varredura concluída e a idade do resultado.
+    Se o resultado estiver velho (ou ?atualizar=1), dispara uma varredura em segundo
+    plano, compartilhada entre todos os pedidos; com ?esperar=N aguarda por ela até
+    N segundos (limitado por ESPERA_MAXIMA_VARREDURA). Com o motor de presença
+    ativo, o estado online vem dele e o resultado vale até
+    INTERVALO_VARREDURA_COMPLETA: as varreduras completas ficam por conta do
+    motor, e a rota só varre com ?atualizar=1.
+    """
     try:
-        dispositivos = escanear_rede()
-        return jsonify({"dispositivos": dispositivos})
+        esperar = min(float(request.args.get("esperar", 0)), config.ESPERA_MAXIMA_VARREDURA)
+        forcar = request.args.get("atualizar") == "1"
+        presenca_ativa = presenca.ativo()
+
+        dispositivos, idade = varreduras.ultimo_resultado()
+        tarefa = None
+        # O motor de presença faz uma varredura completa a cada INTERVALO_VARREDURA_COMPLETA
+        # (e junta-se a esta, se coincidirem); até lá, o resultado dele basta
+        idade_maxima = config.INTERVALO_VARREDURA_COMPLETA if presenca_ativa else config.IDADE_MAXIMA_VARREDURA
+        if forcar or dispositivos is None or idade > idade_maxima:
+            tarefa = varreduras.iniciar_varredura()
+            # Sem nenhum resultado anterior, espera o tempo máximo por padrão
+            if dispositivos is None and not esperar:
+                esperar = config.ESPERA_MAXIMA_VARREDURA
+            if esperar and tarefa.aguardar(esperar):
+                if tarefa.estado == tarefas.FALHOU:
+                    return jsonify({"erro": tarefa.erro, "tarefa": tarefa.para_dict()}), 500
+                dispositivos, idade = varreduras.ultimo_resultado()
+
+        if dispositivos is None:
+            return jsonify({"dispositivos": [], "tarefa": tarefa.para_dict()}), 202
+
+        if presenca_ativa:
+            dispositivos = _com_presenca(dispositivos)
+
+        return jsonify({
+            "dispositivos": dispositivos,
+            "idade_segundos": round(idade, 1),
+            "tarefa": tarefa.para_dict() if tarefa and not tarefa.finalizada else None
+        })
+    except ValueError:
+        return jsonify({"erro": "Parâmetro 'esperar' inválido"}), 400
     except Exception as e:
         return jsonify({"erro": str(e)}), 500
 
+@app.route("/devices/scan", methods=["POST"])
+def iniciar_varredura():
+    """Inicia uma varredura em segundo plano (ou junta-se à que já está em andamento)."""
+    tarefa = varreduras.iniciar_varredura()
+    return jsonify({"tarefa": tarefa.para_dict()}), 202
+
+@app.route("/devices/scan/<tarefa_id>")
+def status_varredura(tarefa_id):
+    """Retorna o estado de uma varredura; concluída, inclui os dispositivos encontrados."""
+    tarefa = tarefas.obter(tarefa_id)
+    if not tarefa or tarefa.tipo != "varredura":
+        return jsonify({"erro": "Varredura não encontrada"}), 404
+
+    resposta = {"tarefa": tarefa.para_dict()}
+    if tarefa.estado == tarefas.CONCLUIDA:
+        resposta["dispositivos"], resposta["idade_segundos"] = varreduras.ultimo_resultado()
+    return jsonify(resposta)
+
 @app.route("/devices/db")
+@cache_respostas.em_cache("dispositivos")
 def listar_dispositivos_salvos():
     """
-    Lista todos os dispositivos armazenados no banco de dados,
-    ordenados pela última verificação.
+    Lista os dispositivos armazenados no banco de dados, ordenados pela última
+    verificação, em páginas (parâmetros from, to, limit e cursor).
     """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM dispositivos ORDER BY ultima_verificacao DESC")
-        rows = cursor.fetchall()
-        conn.close()
+        pagina = paginacao.ler_pagina(request.args)
+        condicoes, parametros = pagina.condicoes("ultima_verificacao", ["ultima_verificacao", "id"])
+        filtros = " WHERE " + " AND ".join(condicoes) if condicoes else ""
+
+        cursor = get_db_cursor()
+        cursor.execute(f"""
+            SELECT id, ip, mac, hostname, fabricante, tipo, ultima_verificacao, online
+            FROM dispositivos{filtros}
+            ORDER BY ultima_verificacao DESC, id DESC
+            LIMIT ?
+        """, (*parametros, pagina.limite + 1))
+        rows, proximo_cursor = pagina.fatiar(
+            cursor.fetchall(), lambda row: (row["ultima_verificacao"], row["id"])
+        )
 
         dispositivos = []
         for row in rows:
@@ -121,7 +235,9 @@ def listar_dispositivos_salvos():
                 "hostname": row["hostname"],
                 "ultima_verificacao": row["ultima_verificacao"]
             })
-        return jsonify({"dispositivos": dispositivos})
+        return jsonify({"dispositivos": dispositivos, "proximo_cursor": proximo_cursor})
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
     except Exception as e:
         return jsonify({"erro": str(e)}), 500
 
@@ -137,11 +253,14 @@ def executar_speedtest():
         return jsonify({"erro": str(e)}), 500
 
 @app.route("/speedtest/historico")
+@cache_respostas.em_cache("velocidade")
 def speedtest_historico():
-    """Retorna o histórico de testes de velocidade da máquina local."""
+    """Retorna uma página do histórico de testes de velocidade da máquina local (from, to, limit, cursor)."""
     try:
-        historico = listar_velocidades_da_maquina_local()
-        return jsonify({"historico": historico})
+        historico, proximo_cursor = listar_velocidades_da_maquina_local(paginacao.ler_pagina(request.args))
+        return jsonify({"historico": historico, "proximo_cursor": proximo_cursor})
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
     except Exception as e:
         return jsonify({"erro": str(e)}), 500
 
@@ -149,55 +268,124 @@ def speedtest_historico():
 
 @app.route("/trafego")
 def exibir_trafego():
-    """Mede e retorna o tráfego atual de rede da máquina (download/upload)."""
+    """
+    Retorna o tráfego atual de rede da máquina: contadores (MB) e taxas de
+    download/upload (bytes por segundo), lidos da memória do amostrador.
+    Sem o amostrador, mede e registra na hora.
+    """
     try:
-        trafego = medir_trafego_local()
+        trafego = amostrador.leitura_atual() if amostrador.ativo() else None
+        if trafego is None:
+            trafego = medir_trafego_local()
         return jsonify({"trafego": trafego})
     except Exception as e:
         return jsonify({"erro": str(e)}), 500
 
+@app.route("/trafego/taxas")
+def trafego_taxas():
+    """
+    Retorna as taxas de download/upload (bytes por segundo) dos últimos
+    "segundos" segundos (padrão 60), da soma das interfaces ou de "interface".
+    """
+    try:
+        segundos = float(request.args.get("segundos", 60))
+    except ValueError:
+        return jsonify({"erro": "Parâmetro 'segundos' inválido"}), 400
+    interface = request.args.get("interface", amostrador.TOTAL)
+    pontos = amostrador.taxas(interface, segundos)
+    if pontos is None:
+        return jsonify({"erro": f"Interface sem amostras: {interface}",
+                        "interfaces": amostrador.interfaces()}), 404
+    return jsonify({
+        "interface": interface,
+        "intervalo": config.INTERVALO_AMOSTRAGEM,
+        "pontos": [[instante, round(download, 1), round(upload, 1)] for instante, download, upload in pontos],
+    })
+
 @app.route("/trafego/historico")
+@cache_respostas.em_cache("trafego_blocos")
 def trafego_historico():
-    """Retorna o histórico completo de medições de tráfego da máquina local."""
+    """Retorna uma página do histórico de medições de tráfego da máquina local (from, to, limit, cursor)."""
     try:
-        historico = listar_trafego_local()
-        return jsonify({"historico": historico})
+        historico, proximo_cursor = listar_trafego_local(paginacao.ler_pagina(request.args))
+        return jsonify({"historico": historico, "proximo_cursor": proximo_cursor})
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
+    except Exception as e:
+        return jsonify({"erro": str(e)}), 500
+
+@app.route("/trafego/serie")
+def trafego_serie():
+    """
+    Retorna a série temporal de tráfego da máquina local entre "from" e "to"
+    (epoch ou data ISO). A resolução vem de "resolucao" (segundos) ou de
+    "pontos"; o nível de agregação é escolhido automaticamente.
+    """
+    try:
+        inicio = paginacao.ler_instante(request.args.get("from"))
+        fim = paginacao.ler_instante(request.args.get("to"))
+        resolucao = request.args.get("resolucao", type=float)
+        pontos = request.args.get("pontos", type=int)
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
+    try:
+        serie = serie_trafego_local(inicio, fim, resolucao, pontos)
+        if serie is None:
+            return jsonify({"erro": "Máquina local ainda não registrada"}), 404
+        return jsonify(serie)
     except Exception as e:
         return jsonify({"erro": str(e)}), 500
 
 # ==== ROTAS DE EXCLUSÃO ====
 
+def _excluir(funcao):
+    """Executa uma função de exclusão e transforma o retorno False em falha da tarefa."""
+    if not funcao():
+        raise RuntimeError("Erro ao deletar")
+    return True
+
+def _iniciar_exclusao(nome, funcao):
+    """
+    Inicia a exclusão como tarefa em segundo plano (apagando em lotes) e retorna 202
+    com a tarefa, cujo andamento é consultado em /tarefas/<id>. Pedidos repetidos
+    enquanto a exclusão ainda roda recebem a mesma tarefa.
+    """
+    tarefa = tarefas.iniciar("exclusao", _excluir, funcao, chave=f"exclusao:{nome}")
+    return jsonify({"mensagem": "Exclusão iniciada", "tarefa": tarefa.para_dict()}), 202
+
 @app.route("/deletar/dispositivos", methods=["DELETE"])
 def deletar_dispositivos():
     """Deleta os dispositivos da mesma sub-rede armazenados no banco."""
     from monitor import deletar_dispositivos_mesma_rede
-    if deletar_dispositivos_mesma_rede():
-        return jsonify({"mensagem": "Dispositivos deletados com sucesso"})
-    return jsonify({"erro": "Erro ao deletar"}), 500
+    return _iniciar_exclusao("dispositivos", deletar_dispositivos_mesma_rede)
 
 @app.route("/deletar/sessoes", methods=["DELETE"])
 def deletar_sessoes():
     """Deleta o histórico de sessões de tráfego da máquina local."""
     from sessoes import deletar_sessoes_da_maquina_local
-    if deletar_sessoes_da_maquina_local():
-        return jsonify({"mensagem": "Sessões deletadas com sucesso"})
-    return jsonify({"erro": "Erro ao deletar"}), 500
+    return _iniciar_exclusao("sessoes", deletar_sessoes_da_maquina_local)
 
 @app.route("/deletar/speedtest", methods=["DELETE"])
 def deletar_speedtest():
     """Deleta o histórico de testes de velocidade da máquina local."""
     from speedtest_module import deletar_historico_speedtest_local
-    if deletar_historico_speedtest_local():
-        return jsonify({"mensagem": "Histórico de speedtest deletado com sucesso"})
-    return jsonify({"erro": "Erro ao deletar"}), 500
+    return _iniciar_exclusao("speedtest", deletar_historico_speedtest_local)
 
 @app.route("/deletar/trafego", methods=["DELETE"])
 def deletar_trafego():
     """Deleta o histórico de tráfego da máquina local."""
     from trafego import deletar_historico_trafego_local
-    if deletar_historico_trafego_local():
-        return jsonify({"mensagem": "Histórico de tráfego deletado com sucesso"})
-    return jsonify({"erro": "Erro ao deletar"}), 500
+    return _iniciar_exclusao("trafego", deletar_historico_trafego_local)
+
+# ==== ROTAS DE TAREFAS ====
+
+@app.route("/tarefas/<tarefa_id>")
+def status_tarefa(tarefa_id):
+    """Retorna o estado de uma tarefa em segundo plano (exclusões, limpezas etc.)."""
+    tarefa = tarefas.obter(tarefa_id)
+    if not tarefa:
+        return jsonify({"erro": "Tarefa não encontrada"}), 404
+    return jsonify({"tarefa": tarefa.para_dict(incluir_resultado=tarefa.tipo != "varredura")})
 
 # ==== REGISTRO DOS BLUEPRINTS ====
 
@@ -207,6 +395,33 @@ app.register_blueprint(sessoes_bp)
 # Registra o Blueprint de tráfego (rotas agrupadas)
 app.register_blueprint(trafego_bp)
 
+# Registra o Blueprint de exportação do histórico (NDJSON/CSV)
+app.register_blueprint(exportacao_bp)
+
+# Registra o Blueprint de agregação do histórico para os gráficos
+app.register_blueprint(agregacao_bp)
+
+# Registra o Blueprint de eventos em tempo real
+app.register_blueprint(eventos_bp)
+
+# ==== SERVIÇOS EM SEGUNDO PLANO ====
+
+# Inicia o motor de presença (em vários processos, apenas um deles o executa)
+if config.PRESENCA_ATIVA:
+    presenca.iniciar()
+
+# Inicia a limpeza periódica do histórico conforme as políticas de retenção
+retencao.iniciar()
+
+# Inicia o amostrador contínuo das taxas de tráfego
+amostrador.iniciar()
+
+# Restaura do banco o registro das sessões abertas
+sessoes_ativas.carregar()
+
+# Publica as taxas, a presença e o andamento das tarefas para os clientes de /eventos
+eventos.iniciar()
+
 # ==== EXECUÇÃO DA APLICAÇÃO ====
 
 # Executa a aplicação Flask em modo debug
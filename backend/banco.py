@@ -0,0 +1,80 @@
+# Camada de acesso ao banco SQLite compartilhada por todos os módulos.
+#
+# Cada thread mantém uma conexão persistente (reaproveitando as instruções
+# preparadas entre chamadas) configurada com journal WAL, para que leituras
+# nunca esperem por uma escrita em andamento, busy_timeout, synchronous=NORMAL
+# e cache de páginas ajustado. A primeira conexão do processo aplica as
+# migrações pendentes (ver migracoes.py) antes de ser entregue.
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import config
+import migracoes
+
+_local = threading.local()
+_migrado = False
+_lock_migracao = threading.Lock()
+
+
+# Abre e configura uma nova conexão
+def _conectar():
+    conn = sqlite3.connect(
+        config.DB_PATH,
+        timeout=config.TIMEOUT_BANCO,
+        cached_statements=config.CACHE_INSTRUCOES,
+    )
+    # Num banco novo liga o vacuum incremental (precisa vir antes do WAL e da primeira
+    # tabela); num banco existente sem ele, é ignorado (ver migração 8)
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute(f"PRAGMA busy_timeout = {int(config.TIMEOUT_BANCO * 1000)}")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA cache_size = {-abs(config.CACHE_BANCO_KB)}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    _migrar(conn)
+    return conn
+
+
+# Garante que o esquema esteja atualizado (uma vez por processo)
+def _migrar(conn):
+    global _migrado
+    if _migrado:
+        return
+    with _lock_migracao:
+        if not _migrado:
+            migracoes.aplicar(conn)
+            _migrado = True
+
+
+# Retorna a conexão persistente da thread atual (criada na primeira chamada)
+def obter_conexao():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = _conectar()
+    return conn
+
+
+# Fecha a conexão da thread atual, se houver
+def fechar():
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        _local.conn = None
+        conn.close()
+
+
+# Executa um bloco em uma transação: commit ao final, rollback em caso de erro.
+# imediata=True reserva a trava de escrita já no início (BEGIN IMMEDIATE), evitando
+# que duas transações que leem e depois escrevem se bloqueiem mutuamente.
+@contextmanager
+def transacao(imediata=False):
+    conn = obter_conexao()
+    if imediata and not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
@@ -0,0 +1,184 @@
+# Buffer de escrita com commit em grupo para amostras de alta frequência.
+#
+# Quem produz amostras só as coloca em uma fila limitada; uma thread gravadora
+# as retira e grava em lotes, cada lote em uma única transação (um único
+# fsync), assim que o lote atinge LOTE_BUFFER itens ou o item mais antigo
+# espera INTERVALO_BUFFER segundos. Com a fila cheia, quem produz espera até
+# ESPERA_BUFFER segundos por espaço (contrapressão) e, depois disso, a amostra
+# é descartada e contada. Os itens pendentes são gravados ao encerrar o
+# processo (atexit) e sempre que esvaziar() é chamado.
+import atexit
+import threading
+import time
+from collections import deque
+
+import banco
+import config
+
+_buffers = []
+_lock_buffers = threading.Lock()
+
+
+class BufferEscrita:
+    """Fila limitada de itens gravados em lotes por gravar_lote(conn, itens)."""
+
+    def __init__(self, nome, gravar_lote, capacidade=None, tamanho_lote=None, intervalo=None):
+        self.nome = nome
+        self.gravar_lote = gravar_lote
+        self.capacidade = capacidade or config.CAPACIDADE_BUFFER
+        self.tamanho_lote = tamanho_lote or config.LOTE_BUFFER
+        self.intervalo = config.INTERVALO_BUFFER if intervalo is None else intervalo
+        self.gravados = 0
+        self.descartados = 0
+        self.lotes = 0
+        self._fila = deque()
+        self._em_gravacao = 0  # itens retirados da fila e ainda não gravados
+        self._aguardando = 0  # chamadas de esvaziar() esperando a gravação
+        self._condicao = threading.Condition()
+        self._encerrado = False
+        self._thread = None
+        with _lock_buffers:
+            _buffers.append(self)
+
+    # Quantidade de itens ainda não gravados
+    @property
+    def pendentes(self):
+        with self._condicao:
+            return len(self._fila) + self._em_gravacao
+
+    # Enfileira um item; com a fila cheia, espera até ESPERA_BUFFER segundos.
+    # Retorna False se o item foi descartado.
+    def adicionar(self, item, espera=None):
+        espera = config.ESPERA_BUFFER if espera is None else espera
+        limite = time.monotonic() + espera
+        with self._condicao:
+            if self._encerrado:
+                # Depois do encerramento não há thread gravadora: grava na hora
+                self._gravar([item])
+                return True
+            self._iniciar_thread()
+            while len(self._fila) >= self.capacidade:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    self.descartados += 1
+                    if self.descartados == 1 or self.descartados % 1000 == 0:
+                        print(f"[AVISO] Buffer {self.nome} cheio: {self.descartados} itens descartados")
+                    return False
+                self._condicao.wait(restante)
+            self._fila.append(item)
+            if len(self._fila) == 1 or len(self._fila) >= self.tamanho_lote:
+                self._condicao.notify_all()
+        return True
+
+    # Grava todos os itens pendentes antes de retornar (ou até timeout segundos);
+    # retorna True se não restou nada pendente
+    def esvaziar(self, timeout=None):
+        limite = None if timeout is None else time.monotonic() + timeout
+        with self._condicao:
+            if self._thread is None or not self._thread.is_alive():
+                # Sem thread gravadora, quem chama grava
+                while self._fila:
+                    self._gravar(self._retirar_lote())
+                return True
+            # A thread gravadora não espera o prazo enquanto alguém aguarda aqui
+            self._aguardando += 1
+            self._condicao.notify_all()
+            try:
+                while self._fila or self._em_gravacao:
+                    restante = None if limite is None else limite - time.monotonic()
+                    if restante is not None and restante <= 0:
+                        return False
+                    self._condicao.wait(restante)
+                return True
+            finally:
+                self._aguardando -= 1
+
+    # Encerra a thread gravadora depois de gravar o que estiver pendente
+    def encerrar(self, timeout=None):
+        with self._condicao:
+            self._encerrado = True
+            self._condicao.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        with self._condicao:
+            while self._fila:
+                self._gravar(self._retirar_lote())
+
+    def estado(self):
+        return {
+            "nome": self.nome,
+            "pendentes": self.pendentes,
+            "capacidade": self.capacidade,
+            "gravados": self.gravados,
+            "descartados": self.descartados,
+            "lotes": self.lotes,
+        }
+
+    # ---- Internos (chamados com self._condicao adquirida) ----
+
+    def _iniciar_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._executar, name=f"buffer-{self.nome}", daemon=True)
+            self._thread.start()
+
+    def _retirar_lote(self):
+        quantidade = min(len(self._fila), self.tamanho_lote)
+        return [self._fila.popleft() for _ in range(quantidade)]
+
+    # Grava um lote em uma única transação; um lote que falha é descartado e contado
+    def _gravar(self, lote):
+        if not lote:
+            return
+        try:
+            with banco.transacao(imediata=True) as conn:
+                self.gravar_lote(conn, lote)
+            self.gravados += len(lote)
+            self.lotes += 1
+        except Exception as e:
+            self.descartados += len(lote)
+            print(f"[ERRO] Falha ao gravar lote do buffer {self.nome} ({len(lote)} itens): {e}")
+
+    # Laço da thread gravadora: espera um lote completo ou o prazo do item mais antigo
+    def _executar(self):
+        with self._condicao:
+            while True:
+                while not self._fila and not self._encerrado:
+                    self._condicao.wait()
+                if not self._fila:
+                    return
+                prazo = time.monotonic() + self.intervalo
+                while len(self._fila) < self.tamanho_lote and not (self._encerrado or self._aguardando):
+                    restante = prazo - time.monotonic()
+                    if restante <= 0:
+                        break
+                    self._condicao.wait(restante)
+                lote = self._retirar_lote()
+                self._em_gravacao = len(lote)
+                # Libera a fila (e quem espera por espaço) durante a gravação
+                self._condicao.notify_all()
+                self._condicao.release()
+                try:
+                    self._gravar(lote)
+                finally:
+                    self._condicao.acquire()
+                    self._em_gravacao = 0
+                    self._condicao.notify_all()
+
+
+# Estado de todos os buffers do processo
+def estados():
+    with _lock_buffers:
+        return [buffer.estado() for buffer in _buffers]
+
+
+# Grava o que estiver pendente em todos os buffers ao encerrar o processo
+@atexit.register
+def encerrar_todos():
+    with _lock_buffers:
+        buffers = list(_buffers)
+    for buffer in buffers:
+        try:
+            buffer.encerrar(timeout=config.ESPERA_BUFFER)
+        except Exception as e:
+            print(f"[ERRO] Falha ao esvaziar o buffer {buffer.nome}: {e}")
@@ -0,0 +1,169 @@
+# Cache persistente de fabricantes consultados na API remota, indexado por OUI.
+#
+# As consultas remotas nunca acontecem durante a varredura: um OUI sem
+# resposta em cache entra numa fila atendida por uma thread em segundo plano,
+# que respeita TAXA_API_FABRICANTES. Enquanto isso o dispositivo fica com o
+# fabricante "Pendente", preenchido no banco quando a resposta chega.
+# Respostas positivas, "não encontrado" e falhas têm validades diferentes, e
+# cada OUI tem no máximo uma consulta em andamento (single-flight).
+import queue
+import sqlite3
+import threading
+import time
+
+import requests
+
+import banco
+import config
+import fabricantes
+
+
+# Valor exibido enquanto a consulta remota não terminou
+PENDENTE = "Pendente"
+
+_cache = {}  # oui -> (fabricante ou None, expira_em)
+_voos = {}  # oui -> threading.Event da consulta em andamento
+_fila = queue.Queue()
+_lock = threading.Lock()
+_trabalhador = None
+_cache_carregado = False
+
+
+# Extrai o OUI (AA:BB:CC) de um MAC
+def obter_oui(mac):
+    return ":".join(mac.upper().replace("-", ":").split(":")[:3])
+
+
+# MACs administrados localmente (aleatórios, comuns em celulares) não têm fabricante registrado
+def mac_aleatorio(mac):
+    try:
+        return bool(int(obter_oui(mac)[:2], 16) & 0x02)
+    except ValueError:
+        return True
+
+
+# Carrega as entradas válidas para a memória
+def _carregar_cache():
+    global _cache_carregado
+    if _cache_carregado:
+        return
+    try:
+        linhas = banco.obter_conexao().execute(
+            "SELECT oui, fabricante, expira_em FROM cache_fabricantes WHERE expira_em > ?", (time.time(),)
+        ).fetchall()
+        with _lock:
+            for oui, fabricante, expira_em in linhas:
+                _cache.setdefault(oui, (fabricante, expira_em))
+    except sqlite3.Error as e:
+        print(f"[ERRO] Falha ao carregar cache de fabricantes: {e}")
+    _cache_carregado = True
+
+
+# Consulta a API remota; retorna (fabricante ou None, validade em segundos)
+def _consultar_api(oui):
+    try:
+        url = config.URL_API_FABRICANTES.format(oui=oui)
+        response = requests.get(url, timeout=config.TIMEOUT_API_FABRICANTES)
+        if response.status_code == 200:
+            return response.text.strip() or None, config.TTL_FABRICANTE
+        if response.status_code == 404:
+            return None, config.TTL_FABRICANTE_NEGATIVO
+        if response.status_code == 429:
+            # Limite excedido: respeita o Retry-After antes da próxima requisição
+            espera = response.headers.get("Retry-After", "")
+            time.sleep(float(espera) if espera.replace(".", "", 1).isdigit() else 1.0)
+        print(f"[AVISO] API de fabricantes respondeu {response.status_code} para {oui}")
+    except Exception as e:
+        print(f"[Erro API fabricante]: {e}")
+    return None, config.TTL_FABRICANTE_FALHA
+
+
+# Grava o resultado no cache e preenche os dispositivos que aguardavam este OUI
+def _salvar(oui, fabricante, ttl):
+    expira_em = time.time() + ttl
+    with _lock:
+        _cache[oui] = (fabricante, expira_em)
+    nome = fabricante or "Desconhecido"
+    tipo = fabricantes.tipo_por_fabricante(fabricante) if fabricante else "Desconhecido"
+    try:
+        with banco.transacao() as conn:
+            conn.execute("""
+                INSERT INTO cache_fabricantes (oui, fabricante, expira_em) VALUES (?, ?, ?)
+                ON CONFLICT(oui) DO UPDATE SET fabricante = excluded.fabricante, expira_em = excluded.expira_em
+            """, (oui, fabricante, expira_em))
+            conn.execute("""
+                UPDATE dispositivos SET fabricante = ?, tipo = ?
+                WHERE fabricante = ? AND UPPER(SUBSTR(mac, 1, 8)) = ?
+            """, (nome, tipo, PENDENTE, oui))
+    except sqlite3.Error as e:
+        print(f"[ERRO] Falha ao salvar fabricante de {oui}: {e}")
+
+
+# Laço da thread de segundo plano: atende a fila respeitando o limite de taxa
+def _processar_fila():
+    intervalo = 1.0 / config.TAXA_API_FABRICANTES if config.TAXA_API_FABRICANTES > 0 else 0
+    proxima = 0.0
+    while True:
+        oui = _fila.get()
+        espera = proxima - time.monotonic()
+        if espera > 0:
+            time.sleep(espera)
+        proxima = time.monotonic() + intervalo
+        try:
+            fabricante, ttl = _consultar_api(oui)
+            _salvar(oui, fabricante, ttl)
+        finally:
+            with _lock:
+                evento = _voos.pop(oui, None)
+            if evento:
+                evento.set()
+
+
+# Coloca o OUI na fila, a menos que já exista uma consulta em andamento; retorna o evento da consulta
+def _agendar(oui):
+    global _trabalhador
+    with _lock:
+        evento = _voos.get(oui)
+        if evento is None:
+            evento = _voos[oui] = threading.Event()
+            _fila.put(oui)
+        if _trabalhador is None or not _trabalhador.is_alive():
+            _trabalhador = threading.Thread(target=_processar_fila, name="fabricantes", daemon=True)
+            _trabalhador.start()
+    return evento
+
+
+# Retorna (encontrado, fabricante ou None) a partir do cache em memória
+def _consultar_cache(oui):
+    with _lock:
+        entrada = _cache.get(oui)
+    if entrada and entrada[1] > time.time():
+        return True, entrada[0]
+    return False, None
+
+
+# Consulta sem bloquear: fabricante, None (sabidamente desconhecido) ou PENDENTE
+def consultar(mac):
+    if not mac or mac == "Desconhecido" or mac_aleatorio(mac):
+        return None
+    _carregar_cache()
+    oui = obter_oui(mac)
+    encontrado, fabricante = _consultar_cache(oui)
+    if encontrado:
+        return fabricante
+    _agendar(oui)
+    return PENDENTE
+
+
+# Consulta bloqueante (até timeout segundos), compartilhando a consulta em andamento
+def resolver(mac, timeout=None):
+    resultado = consultar(mac)
+    if resultado != PENDENTE:
+        return resultado
+    oui = obter_oui(mac)
+    with _lock:
+        evento = _voos.get(oui)
+    if evento:
+        evento.wait(config.TIMEOUT_API_FABRICANTES * 2 if timeout is None else timeout)
+    encontrado, fabricante = _consultar_cache(oui)
+    return fabricante if encontrado else PENDENTE
@@ -0,0 +1,134 @@
+# Cache de respostas e GET condicional (ETag/304) das rotas de leitura.
+#
+# Cada tabela tem um contador de alteração na tabela versoes, incrementado por
+# gatilhos (migração 10) em toda escrita, de qualquer processo. Uma rota
+# marcada com @em_cache("tabela", ...) lê esses contadores (uma consulta a uma
+# tabela minúscula) e:
+# - responde 304 se o cliente já tem a resposta dessa versão (If-None-Match;
+#   If-Modified-Since não é aceito, já que duas escritas no mesmo segundo teriam
+#   a mesma data com um segundo de resolução);
+# - senão, devolve os bytes já serializados, se a mesma requisição foi
+#   respondida nessa versão;
+# - senão, executa a rota uma única vez, mesmo com vários pedidos iguais
+#   chegando juntos, e guarda a resposta (até CACHE_RESPOSTAS entradas).
+import functools
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import Response, make_response, request
+
+import banco
+import config
+import identidade
+
+_entradas = OrderedDict()  # chave da requisição -> Entrada (menos usadas primeiro)
+_em_producao = {}  # (chave, etag) -> threading.Event de quem está gerando a resposta
+_lock = threading.Lock()
+
+
+class Entrada:
+    """Resposta serializada de uma requisição em uma versão das tabelas."""
+
+    def __init__(self, etag, corpo, mimetype):
+        self.etag = etag
+        self.corpo = corpo
+        self.mimetype = mimetype
+
+
+# Retorna (versões das tabelas, instante da última alteração entre elas)
+def versoes(tabelas):
+    marcadores = ", ".join("?" * len(tabelas))
+    linhas = banco.obter_conexao().execute(
+        f"SELECT tabela, versao, alterada_em FROM versoes WHERE tabela IN ({marcadores})", tabelas
+    ).fetchall()
+    por_tabela = {tabela: (versao, alterada_em) for tabela, versao, alterada_em in linhas}
+    versao = tuple(por_tabela.get(tabela, (0, 0))[0] for tabela in tabelas)
+    alterada_em = max((alterada_em for _, alterada_em in por_tabela.values()), default=0)
+    return versao, alterada_em
+
+
+# Chave da requisição: rota, parâmetros e IP local (as rotas da máquina local dependem dele)
+def _chave_requisicao():
+    parametros = tuple(sorted(request.args.items(multi=True)))
+    return request.path, parametros, identidade.ip_local()
+
+
+def _calcular_etag(chave, versao):
+    return hashlib.sha1(repr((chave, versao)).encode()).hexdigest()[:24]
+
+
+# Acrescenta o validador; no-cache faz o navegador sempre revalidar
+def _validadores(resposta, etag):
+    resposta.set_etag(etag, weak=True)
+    resposta.headers["Cache-Control"] = "no-cache"
+    return resposta
+
+
+def _nao_modificada(etag):
+    return bool(request.if_none_match) and request.if_none_match.contains_weak(etag)
+
+
+# Retorna a entrada da requisição nessa versão, executando a rota só se necessário.
+# Pedidos iguais simultâneos esperam pelo primeiro em vez de executar a rota de novo.
+# Uma resposta que não pode ser guardada (erro, por exemplo) é devolvida como Response.
+def _obter(chave, etag, produzir):
+    while True:
+        with _lock:
+            entrada = _entradas.get(chave)
+            if entrada is not None and entrada.etag == etag:
+                _entradas.move_to_end(chave)
+                return entrada
+            evento = _em_producao.get((chave, etag))
+            produtor = evento is None
+            if produtor:
+                evento = _em_producao[(chave, etag)] = threading.Event()
+        if not produtor:
+            # Quem chegou primeiro está gerando a resposta; se ela não for guardada, tenta de novo
+            evento.wait()
+            continue
+        try:
+            resposta = make_response(produzir())
+            if resposta.status_code != 200 or resposta.is_streamed:
+                return resposta
+            entrada = Entrada(etag, resposta.get_data(), resposta.mimetype)
+            with _lock:
+                _entradas[chave] = entrada
+                _entradas.move_to_end(chave)
+                while len(_entradas) > config.CACHE_RESPOSTAS:
+                    _entradas.popitem(last=False)
+            return entrada
+        finally:
+            with _lock:
+                _em_producao.pop((chave, etag), None)
+            evento.set()
+
+
+# Decorador das rotas GET cuja resposta só depende dos parâmetros, do IP local e
+# do conteúdo das tabelas informadas. Com condicao, o cache só é usado se condicao() for verdadeira.
+def em_cache(*tabelas, condicao=None):
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def rota(*args, **kwargs):
+            if config.CACHE_RESPOSTAS <= 0 or request.method != "GET" or (condicao and not condicao()):
+                return funcao(*args, **kwargs)
+
+            versao, _ = versoes(tabelas)
+            chave = _chave_requisicao()
+            etag = _calcular_etag(chave, versao)
+            if _nao_modificada(etag):
+                return _validadores(Response(status=304), etag)
+
+            entrada = _obter(chave, etag, lambda: funcao(*args, **kwargs))
+            if isinstance(entrada, Response):
+                return entrada
+            resposta = Response(entrada.corpo, mimetype=entrada.mimetype)
+            return _validadores(resposta, etag)
+        return rota
+    return decorador
+
+
+# Descarta todas as respostas guardadas
+def limpar():
+    with _lock:
+        _entradas.clear()
@@ -0,0 +1,245 @@
+# Configurações do backend, lidas de variáveis de ambiente com valores padrão
+import os
+
+
+def _int_env(nome, padrao):
+    try:
+        return int(os.environ.get(nome, padrao))
+    except ValueError:
+        return padrao
+
+
+def _float_env(nome, padrao):
+    try:
+        return float(os.environ.get(nome, padrao))
+    except ValueError:
+        return padrao
+
+
+# ==== DESCOBERTA DE HOSTS ====
+
+# Backend usado em escanear_rede: "async" (motor próprio) ou "nmap"
+BACKEND_VARREDURA = os.environ.get("MONITOR_BACKEND_VARREDURA", "async").lower()
+
+# Número máximo de hosts sondados ao mesmo tempo
+CONCORRENCIA_VARREDURA = _int_env("MONITOR_CONCORRENCIA_VARREDURA", 256)
+
+# Tempo limite (segundos) de cada sonda individual
+TIMEOUT_SONDA = _float_env("MONITOR_TIMEOUT_SONDA", 1.0)
+
+# Portas TCP usadas na sonda por conexão (RST também indica host ativo)
+PORTAS_SONDA_TCP = tuple(
+    int(p) for p in os.environ.get("MONITOR_PORTAS_SONDA", "80,443,22,445,139,53,8080,62078").split(",") if p.strip()
+)
+
+# ==== PLANEJAMENTO DA VARREDURA ====
+
+# Redes a varrer (CIDRs separados por vírgula); vazio = derivar das interfaces
+REDES_VARREDURA = [r.strip() for r in os.environ.get("MONITOR_REDES", "").split(",") if r.strip()]
+
+# Interfaces consideradas ao derivar as redes; vazio = todas as interfaces ativas
+INTERFACES_VARREDURA = [i.strip() for i in os.environ.get("MONITOR_INTERFACES", "").split(",") if i.strip()]
+
+# Tamanho (prefixo) de cada fatia varrida por um worker
+PREFIXO_FATIA = _int_env("MONITOR_PREFIXO_FATIA", 24)
+
+# Maior rede aceita; redes maiores são reduzidas a este prefixo em torno do IP local
+PREFIXO_MINIMO = _int_env("MONITOR_PREFIXO_MINIMO", 16)
+
+# Número de fatias varridas em paralelo
+WORKERS_VARREDURA = _int_env("MONITOR_WORKERS_VARREDURA", 4)
+
+# ==== RESOLUÇÃO DE HOSTNAMES ====
+
+# Threads usadas nas consultas de DNS reverso
+WORKERS_DNS = _int_env("MONITOR_WORKERS_DNS", 32)
+
+# Prazo máximo (segundos) de cada consulta de DNS reverso
+TIMEOUT_DNS = _float_env("MONITOR_TIMEOUT_DNS", 2.0)
+
+# Validade (segundos) de um hostname resolvido e de uma falha de resolução
+TTL_HOSTNAME = _int_env("MONITOR_TTL_HOSTNAME", 3600)
+TTL_HOSTNAME_NEGATIVO = _int_env("MONITOR_TTL_HOSTNAME_NEGATIVO", 300)
+
+# ==== TABELA DE VIZINHOS (ARP) ====
+
+# Intervalo mínimo (segundos) entre duas releituras da tabela ARP do sistema
+INTERVALO_TABELA_ARP = _float_env("MONITOR_INTERVALO_TABELA_ARP", 0.5)
+
+# Espera máxima (segundos) pela revalidação de uma entrada ARP antiga de um host que
+# não respondeu às sondas (o kernel espera 5 s em DELAY antes de sondar o vizinho)
+ESPERA_VIZINHO = _float_env("MONITOR_ESPERA_VIZINHO", 8.0)
+
+# ==== BASE DE FABRICANTES (OUI) ====
+
+# Índice gerado por importar_oui.py a partir dos registros MA-L/MA-M/MA-S do IEEE
+ARQUIVO_OUI = os.environ.get(
+    "MONITOR_ARQUIVO_OUI", os.path.join(os.path.dirname(os.path.abspath(__file__)), "dados", "oui.idx")
+)
+
+# ==== CONSULTA REMOTA DE FABRICANTES ====
+
+# URL da API de fabricantes; "{oui}" é substituído pelo prefixo (ex: AA:BB:CC)
+URL_API_FABRICANTES = os.environ.get("MONITOR_URL_API_FABRICANTES", "https://api.macvendors.com/{oui}")
+
+# Máximo de requisições por segundo à API (a API pública limita a 1-2 req/s)
+TAXA_API_FABRICANTES = _float_env("MONITOR_TAXA_API_FABRICANTES", 1.0)
+
+# Tempo limite (segundos) de cada requisição à API
+TIMEOUT_API_FABRICANTES = _float_env("MONITOR_TIMEOUT_API_FABRICANTES", 5.0)
+
+# Validade (segundos) de um fabricante encontrado, de um "não encontrado" e de uma falha
+TTL_FABRICANTE = _int_env("MONITOR_TTL_FABRICANTE", 30 * 24 * 3600)
+TTL_FABRICANTE_NEGATIVO = _int_env("MONITOR_TTL_FABRICANTE_NEGATIVO", 7 * 24 * 3600)
+TTL_FABRICANTE_FALHA = _int_env("MONITOR_TTL_FABRICANTE_FALHA", 600)
+
+# ==== PERSISTÊNCIA DA VARREDURA ====
+
+# Dispositivos sem mudanças só têm ultima_verificacao regravada após este intervalo (segundos)
+INTERVALO_MINIMO_VERIFICACAO = _int_env("MONITOR_INTERVALO_MINIMO_VERIFICACAO", 60)
+
+# ==== VARREDURAS EM SEGUNDO PLANO ====
+
+# Idade máxima (segundos) do último resultado antes de /devices disparar uma nova varredura
+IDADE_MAXIMA_VARREDURA = _int_env("MONITOR_IDADE_MAXIMA_VARREDURA", 120)
+
+# Tempo máximo (segundos) que /devices espera por uma varredura em andamento
+ESPERA_MAXIMA_VARREDURA = _float_env("MONITOR_ESPERA_MAXIMA_VARREDURA", 30.0)
+
+# Quantidade de tarefas concluídas mantidas para consulta de status
+HISTORICO_TAREFAS = _int_env("MONITOR_HISTORICO_TAREFAS", 100)
+
+# ==== PRESENÇA INCREMENTAL ====
+
+# Liga o motor de presença (sondas direcionadas aos dispositivos conhecidos)
+PRESENCA_ATIVA = os.environ.get("MONITOR_PRESENCA", "1") == "1"
+
+# Intervalo (segundos) entre sondas de um dispositivo: começa no mínimo e dobra enquanto ele estiver estável
+INTERVALO_PRESENCA_MIN = _float_env("MONITOR_INTERVALO_PRESENCA_MIN", 15.0)
+INTERVALO_PRESENCA_MAX = _float_env("MONITOR_INTERVALO_PRESENCA_MAX", 120.0)
+
+# Sondas seguidas sem resposta até um dispositivo suspeito ser considerado offline
+FALHAS_PARA_OFFLINE = _int_env("MONITOR_FALHAS_PARA_OFFLINE", 3)
+
+# Intervalo (segundos) entre varreduras completas de descoberta
+INTERVALO_VARREDURA_COMPLETA = _int_env("MONITOR_INTERVALO_VARREDURA_COMPLETA", 900)
+
+# Sem o motor de presença, dispositivos sem verificação há mais que isto (segundos) são dados como offline
+JANELA_PRESENCA = _int_env("MONITOR_JANELA_PRESENCA", 300)
+
+# ==== IDENTIDADE DA MÁQUINA LOCAL ====
+
+# Intervalo (segundos) entre verificações da impressão digital das interfaces
+INTERVALO_IDENTIDADE = _float_env("MONITOR_INTERVALO_IDENTIDADE", 5.0)
+
+# ==== BANCO DE DADOS ====
+
+# Caminho absoluto do banco SQLite (por padrão, ao lado deste arquivo)
+DB_PATH = os.path.abspath(os.environ.get(
+    "MONITOR_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "monitoramento.db")
+))
+
+# Tempo (segundos) que uma conexão espera por uma trava antes de falhar com "database is locked"
+TIMEOUT_BANCO = _float_env("MONITOR_TIMEOUT_BANCO", 10.0)
+
+# Tamanho do cache de páginas por conexão, em KiB
+CACHE_BANCO_KB = _int_env("MONITOR_CACHE_BANCO_KB", 16384)
+
+# Quantidade de instruções preparadas mantidas por conexão
+CACHE_INSTRUCOES = _int_env("MONITOR_CACHE_INSTRUCOES", 256)
+
+# ==== SÉRIE TEMPORAL DE TRÁFEGO ====
+
+# Quantidade máxima de amostras em cada bloco codificado da série bruta
+AMOSTRAS_POR_BLOCO = _int_env("MONITOR_AMOSTRAS_POR_BLOCO", 256)
+
+# Retenção (segundos) de cada nível da série; 0 guarda para sempre
+RETENCAO_BRUTO = _int_env("MONITOR_RETENCAO_BRUTO", 7 * 86400)
+RETENCAO_MINUTO = _int_env("MONITOR_RETENCAO_MINUTO", 30 * 86400)
+RETENCAO_HORA = _int_env("MONITOR_RETENCAO_HORA", 365 * 86400)
+RETENCAO_DIA = _int_env("MONITOR_RETENCAO_DIA", 0)
+
+# Quantidade de pontos desejada quando a consulta não informa a resolução
+PONTOS_SERIE = _int_env("MONITOR_PONTOS_SERIE", 500)
+
+# ==== PAGINAÇÃO E EXPORTAÇÃO ====
+
+# Tamanho padrão e máximo das páginas das rotas de histórico
+LIMITE_PAGINA = _int_env("MONITOR_LIMITE_PAGINA", 100)
+LIMITE_MAXIMO_PAGINA = _int_env("MONITOR_LIMITE_MAXIMO_PAGINA", 1000)
+
+# Linhas lidas do banco e enviadas por vez nas exportações
+LOTE_EXPORTACAO = _int_env("MONITOR_LOTE_EXPORTACAO", 500)
+
+# ==== RETENÇÃO ====
+
+# Idade máxima (segundos) e quantidade máxima de linhas por tabela; 0 desliga o limite
+RETENCAO_TRAFEGO = _int_env("MONITOR_RETENCAO_TRAFEGO", 30 * 86400)
+MAXIMO_LINHAS_TRAFEGO = _int_env("MONITOR_MAXIMO_LINHAS_TRAFEGO", 500000)
+RETENCAO_VELOCIDADE = _int_env("MONITOR_RETENCAO_VELOCIDADE", 365 * 86400)
+MAXIMO_LINHAS_VELOCIDADE = _int_env("MONITOR_MAXIMO_LINHAS_VELOCIDADE", 100000)
+RETENCAO_SESSOES = _int_env("MONITOR_RETENCAO_SESSOES", 365 * 86400)
+MAXIMO_LINHAS_SESSOES = _int_env("MONITOR_MAXIMO_LINHAS_SESSOES", 100000)
+
+# Intervalo (segundos) entre execuções da limpeza; 0 desliga a limpeza automática
+INTERVALO_RETENCAO = _int_env("MONITOR_INTERVALO_RETENCAO", 3600)
+
+# Linhas apagadas por transação e pausa (segundos) entre lotes, para não segurar a trava de escrita
+LOTE_RETENCAO = _int_env("MONITOR_LOTE_RETENCAO", 1000)
+PAUSA_RETENCAO = _float_env("MONITOR_PAUSA_RETENCAO", 0.05)
+
+# Páginas devolvidas ao sistema por passo do vacuum incremental
+PAGINAS_VACUO = _int_env("MONITOR_PAGINAS_VACUO", 256)
+
+# ==== BUFFER DE ESCRITA ====
+
+# Itens que cabem na fila antes de quem produz precisar esperar
+CAPACIDADE_BUFFER = _int_env("MONITOR_CAPACIDADE_BUFFER", 10000)
+
+# Itens gravados por transação e espera máxima (segundos) de um item na fila
+LOTE_BUFFER = _int_env("MONITOR_LOTE_BUFFER", 500)
+INTERVALO_BUFFER = _float_env("MONITOR_INTERVALO_BUFFER", 1.0)
+
+# Espera máxima (segundos) por espaço na fila cheia antes de descartar o item
+ESPERA_BUFFER = _float_env("MONITOR_ESPERA_BUFFER", 2.0)
+
+# ==== CACHE DE RESPOSTAS ====
+
+# Respostas serializadas mantidas em memória pelas rotas de leitura; 0 desliga o cache
+CACHE_RESPOSTAS = _int_env("MONITOR_CACHE_RESPOSTAS", 256)
+
+# ==== AMOSTRADOR DE TRÁFEGO ====
+
+# Intervalo (segundos) entre leituras dos contadores das interfaces; 0 desliga o amostrador
+INTERVALO_AMOSTRAGEM = _float_env("MONITOR_INTERVALO_AMOSTRAGEM", 1.0)
+
+# Taxas mantidas em memória por interface (com leituras a cada segundo, 3600 = uma hora)
+CAPACIDADE_AMOSTRADOR = _int_env("MONITOR_CAPACIDADE_AMOSTRADOR", 3600)
+
+# Intervalo (segundos) entre as amostras gravadas na série temporal
+PERSISTENCIA_AMOSTRADOR = _float_env("MONITOR_PERSISTENCIA_AMOSTRADOR", 10.0)
+
+# ==== EVENTOS EM TEMPO REAL (SSE) ====
+
+# Eventos pendentes por cliente; num cliente lento, os mais antigos são descartados
+FILA_EVENTOS = _int_env("MONITOR_FILA_EVENTOS", 64)
+
+# Clientes conectados ao mesmo tempo em /eventos. Cada conexão ocupa uma thread do
+# servidor: mantenha abaixo do --threads do gunicorn (Procfile) para sobrarem threads
+# às demais rotas.
+MAXIMO_CLIENTES_EVENTOS = _int_env("MONITOR_MAXIMO_CLIENTES_EVENTOS", 32)
+
+# Intervalo (segundos) entre comentários de keep-alive numa conexão sem eventos
+INTERVALO_PING_EVENTOS = _float_env("MONITOR_INTERVALO_PING_EVENTOS", 15.0)
+
+# ==== SESSÕES ATIVAS ====
+
+# Intervalo (segundos) entre releituras das sessões abertas do banco ao iniciar ou
+# encerrar uma sessão, para refletir escritas de outros processos; entre elas, o
+# registro em memória do processo é a referência
+INTERVALO_SINCRONIA_SESSOES = _float_env("MONITOR_INTERVALO_SINCRONIA_SESSOES", 60.0)
+
+# ==== IMPORTAÇÃO DE CAPTURAS ====
+
+# Amostras acumuladas antes de cada gravação em lote na série temporal
+LOTE_CAPTURA = _int_env("MONITOR_LOTE_CAPTURA", 5000)
@@ -0,0 +1,174 @@
+# Contabilidade de bytes por interface, resistente a reinícios dos contadores.
+#
+# Os contadores do sistema (psutil.net_io_counters) voltam a zero quando a
+# máquina reinicia ou uma interface é recriada. Aqui cada interface tem um
+# acumulador monotônico, em bytes inteiros, que soma apenas as diferenças
+# válidas entre leituras: um contador menor que o anterior é tratado como
+# reinício e conta só o que foi transferido desde então. O boot_time só é
+# comparado com o marco carregado na inicialização (ele oscila com ajustes do
+# relógio, NTP ou retomada de VM, e não serve para detectar reinícios com o
+# processo rodando). (Voltas de contadores de 32 bits já são corrigidas pelo
+# psutil, com nowrap.) O estado de cada interface é gravado como marco na tabela
+# contadores_interfaces e recarregado na inicialização, então o tráfego entre
+# duas execuções também é contado. O uso entre dois instantes é a diferença
+# dos acumuladores nesses instantes, sem reler as amostras.
+import threading
+import time
+
+import psutil
+
+import banco
+
+_estados = {}  # interface -> Estado
+_carregado = False
+_observado = False  # se já houve uma leitura dos contadores neste processo
+_lock = threading.Lock()
+
+
+class Estado:
+    """Última leitura bruta e acumuladores (bytes) de uma interface."""
+
+    __slots__ = ("boot", "bruto_recebidos", "bruto_enviados", "recebidos", "enviados",
+                 "reinicios", "atualizado_em", "alterado", "do_marco")
+
+    def __init__(self, boot, bruto_recebidos, bruto_enviados, recebidos, enviados,
+                 reinicios=0, atualizado_em=None, alterado=True, do_marco=False):
+        self.boot = boot
+        self.bruto_recebidos = bruto_recebidos
+        self.bruto_enviados = bruto_enviados
+        self.recebidos = recebidos
+        self.enviados = enviados
+        self.reinicios = reinicios
+        self.atualizado_em = atualizado_em
+        self.alterado = alterado
+        self.do_marco = do_marco  # veio do marco gravado e ainda não foi comparado com uma leitura
+
+
+def _carregar():
+    global _carregado
+    linhas = banco.obter_conexao().execute("""
+        SELECT interface, boot, bruto_recebidos, bruto_enviados, recebidos, enviados, reinicios, atualizado_em
+        FROM contadores_interfaces
+    """).fetchall()
+    for interface, *valores in linhas:
+        _estados[interface] = Estado(*valores, alterado=False, do_marco=True)
+    _carregado = True
+
+
+# Atualiza os acumuladores com uma leitura de psutil.net_io_counters(pernic=True)
+# (lida na hora se não informada) e retorna os totais (recebidos, enviados) em bytes
+def observar(contadores=None, agora=None):
+    global _observado
+    if contadores is None:
+        contadores = psutil.net_io_counters(pernic=True)
+    agora = agora or time.time()
+    boot = psutil.boot_time()
+
+    with _lock:
+        if not _carregado:
+            _carregar()
+        for interface, io in contadores.items():
+            estado = _estados.get(interface)
+            if estado is None:
+                # Interface nova: começa com o que o sistema já contou desde o boot
+                _estados[interface] = Estado(boot, io.bytes_recv, io.bytes_sent,
+                                             io.bytes_recv, io.bytes_sent, atualizado_em=agora)
+                continue
+            reiniciou = io.bytes_recv < estado.bruto_recebidos or io.bytes_sent < estado.bruto_enviados
+            if estado.do_marco:
+                # Primeira leitura após carregar o marco: um boot diferente (com tolerância
+                # ao arredondamento do relógio) indica que a máquina reiniciou entre as execuções
+                reiniciou = reiniciou or abs(boot - estado.boot) > 1
+                estado.do_marco = False
+            if reiniciou:
+                estado.recebidos += io.bytes_recv
+                estado.enviados += io.bytes_sent
+                estado.reinicios += 1
+            else:
+                estado.recebidos += io.bytes_recv - estado.bruto_recebidos
+                estado.enviados += io.bytes_sent - estado.bruto_enviados
+            estado.boot = boot
+            estado.bruto_recebidos = io.bytes_recv
+            estado.bruto_enviados = io.bytes_sent
+            estado.atualizado_em = agora
+            estado.alterado = True
+        _observado = True
+        return _totais()
+
+
+# Soma de todas as interfaces, como psutil.net_io_counters() sem pernic
+def _totais():
+    recebidos = enviados = 0
+    for estado in _estados.values():
+        recebidos += estado.recebidos
+        enviados += estado.enviados
+    return recebidos, enviados
+
+
+# Totais acumulados (recebidos, enviados) em bytes, lendo os contadores agora
+def totais():
+    return observar()
+
+
+# Totais da última leitura, sem ler os contadores (com o amostrador ativo, têm no máximo
+# INTERVALO_AMOSTRAGEM segundos); sem nenhuma leitura ainda, lê agora
+def ultimos_totais():
+    with _lock:
+        if _observado:
+            return _totais()
+    return observar()
+
+
+# Acumuladores de cada interface, sem nova leitura
+def por_interface():
+    with _lock:
+        if not _carregado:
+            _carregar()
+        return {
+            interface: {
+                "recebidos": estado.recebidos,
+                "enviados": estado.enviados,
+                "reinicios": estado.reinicios,
+                "atualizado_em": estado.atualizado_em,
+            }
+            for interface, estado in sorted(_estados.items())
+        }
+
+
+# Grava os marcos das interfaces alteradas desde a última gravação.
+# Com conn, participa da transação do chamador; sem conn, abre a sua.
+def salvar(conn=None):
+    with _lock:
+        alterados = [(interface, estado) for interface, estado in _estados.items() if estado.alterado]
+        linhas = [(interface, estado.boot, estado.bruto_recebidos, estado.bruto_enviados,
+                   estado.recebidos, estado.enviados, estado.reinicios, estado.atualizado_em)
+                  for interface, estado in alterados]
+        for _, estado in alterados:
+            estado.alterado = False
+    if not linhas:
+        return
+    sql = """
+        INSERT INTO contadores_interfaces
+            (interface, boot, bruto_recebidos, bruto_enviados, recebidos, enviados, reinicios, atualizado_em)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(interface) DO UPDATE SET
+            boot = excluded.boot,
+            bruto_recebidos = excluded.bruto_recebidos,
+            bruto_enviados = excluded.bruto_enviados,
+            recebidos = excluded.recebidos,
+            enviados = excluded.enviados,
+            reinicios = excluded.reinicios,
+            atualizado_em = excluded.atualizado_em
+    """
+    try:
+        if conn is not None:
+            conn.executemany(sql, linhas)
+        else:
+            with banco.transacao(imediata=True) as conn:
+                conn.executemany(sql, linhas)
+    except Exception:
+        # Marca de novo como alterados, para a próxima gravação
+        with _lock:
+            for _, estado in alterados:
+                estado.alterado = True
+        raise
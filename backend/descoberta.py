@@ -0,0 +1,260 @@
+# Motor assíncrono de descoberta de hosts na rede local.
+#
+# Cada endereço da faixa é sondado por ICMP (echo), por conexão TCP em portas
+# comuns e, se nada responder, pela tabela de vizinhos do kernel (a tentativa
+# de conexão já força a resolução ARP, então um host com firewall ainda
+# aparece). Só vale uma entrada confirmada (REACHABLE): uma entrada antiga
+# (STALE) usada pelas sondas é revalidada pelo kernel antes de contar.
+# A concorrência é limitada por um semáforo e cada host ativo é entregue assim
+# que responde, sem esperar o fim da varredura.
+import asyncio
+import ipaddress
+import os
+import queue
+import resource
+import socket
+import struct
+import threading
+import time
+
+import config
+import vizinhanca
+
+# nmap é opcional: só é necessário quando o backend "nmap" estiver configurado
+try:
+    import nmap
+except ImportError:
+    nmap = None
+
+# Marca de fim usada para sinalizar o término da varredura entre threads
+_FIM = object()
+
+
+# ==== SONDAS ====
+
+# Calcula o checksum de um pacote ICMP (RFC 1071)
+def _checksum(dados):
+    if len(dados) % 2:
+        dados += b"\x00"
+    soma = sum(struct.unpack(f"!{len(dados) // 2}H", dados))
+    soma = (soma >> 16) + (soma & 0xFFFF)
+    soma += soma >> 16
+    return ~soma & 0xFFFF
+
+
+# Cria um socket ICMP não bloqueante: datagrama (sem root) ou raw (root)
+def _criar_socket_icmp():
+    for tipo in (socket.SOCK_DGRAM, socket.SOCK_RAW):
+        try:
+            s = socket.socket(socket.AF_INET, tipo, socket.IPPROTO_ICMP)
+            s.setblocking(False)
+            return s, tipo == socket.SOCK_RAW
+        except (PermissionError, OSError):
+            continue
+    return None, False
+
+
+# Indica se este processo consegue enviar ICMP (testado uma única vez)
+_icmp_disponivel = None
+
+
+def _icmp_habilitado():
+    global _icmp_disponivel
+    if _icmp_disponivel is None:
+        s, _ = _criar_socket_icmp()
+        _icmp_disponivel = s is not None
+        if s:
+            s.close()
+    return _icmp_disponivel
+
+
+# Envia um echo request e aguarda o echo reply do próprio IP alvo
+async def sondar_icmp(ip, timeout):
+    if not _icmp_habilitado():
+        return False
+    s, raw = _criar_socket_icmp()
+    if s is None:
+        return False
+    loop = asyncio.get_running_loop()
+    identificador = os.getpid() & 0xFFFF
+    cabecalho = struct.pack("!BBHHH", 8, 0, 0, identificador, 1)
+    pacote = struct.pack("!BBHHH", 8, 0, _checksum(cabecalho), identificador, 1)
+    try:
+        await loop.sock_sendto(s, pacote, (ip, 0))
+
+        async def aguardar_resposta():
+            while True:
+                dados, (origem, _) = await loop.sock_recvfrom(s, 1024)
+                if origem != ip:
+                    continue
+                inicio = (dados[0] & 0x0F) * 4 if raw else 0
+                if dados[inicio:inicio + 1] == b"\x00":  # tipo 0 = echo reply
+                    return True
+
+        return await asyncio.wait_for(aguardar_resposta(), timeout)
+    except (asyncio.TimeoutError, OSError):
+        return False
+    finally:
+        s.close()
+
+
+# Tenta conectar via TCP; conexão aceita ou recusada (RST) indicam host ativo
+async def sondar_tcp(ip, porta, timeout):
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(ip, porta), timeout)
+        writer.close()
+        return True
+    except ConnectionRefusedError:
+        return True
+    except (asyncio.TimeoutError, OSError):
+        return False
+
+
+# Indica se o vizinho respondeu ao ARP. Uma entrada antiga usada pelas sondas passa por
+# DELAY/PROBE até o kernel revalidá-la (ou marcá-la FAILED); espera até ESPERA_VIZINHO
+# por isso. INCOMPLETE ao fim das sondas é um ARP sem resposta e não é esperado. Os
+# estados vêm da tabela compartilhada de vizinhanca (uma leitura por intervalo para
+# todas as sondas); sem estados, vale a presença na tabela ARP.
+async def _vizinho_confirmado(ip):
+    limite = time.monotonic() + config.ESPERA_VIZINHO
+    while True:
+        estado = vizinhanca.estado(ip)
+        if estado is None:
+            return vizinhanca.obter_mac(ip) is not None
+        if estado in ("REACHABLE", "PERMANENT", "NOARP"):
+            return True
+        if estado not in ("DELAY", "PROBE") or time.monotonic() >= limite:
+            return False
+        await asyncio.sleep(config.INTERVALO_TABELA_ARP)
+
+
+# Sonda um único host com todas as técnicas em paralelo; retorna True no primeiro sinal de vida.
+# Usada tanto pelas varreduras quanto pelo motor de presença, com a mesma regra para o ARP.
+async def sondar_host(ip, timeout=None, portas=None):
+    timeout = config.TIMEOUT_SONDA if timeout is None else timeout
+    portas = config.PORTAS_SONDA_TCP if portas is None else portas
+
+    tarefas = [asyncio.ensure_future(sondar_icmp(ip, timeout))]
+    tarefas += [asyncio.ensure_future(sondar_tcp(ip, p, timeout)) for p in portas]
+    try:
+        for proxima in asyncio.as_completed(tarefas):
+            if await proxima:
+                return True
+    finally:
+        for t in tarefas:
+            t.cancel()
+
+    # Nenhuma resposta: o host pode estar filtrando tudo, mas ter respondido ao ARP
+    return await _vizinho_confirmado(ip)
+
+
+# ==== VARREDURA ====
+
+# Eleva o limite de descritores abertos e retorna quantos hosts cabem em paralelo
+def concorrencia_maxima():
+    try:
+        atual, maximo = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if maximo == resource.RLIM_INFINITY:
+            maximo = 65536
+        if atual < maximo:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (maximo, maximo))
+            atual = maximo
+    except (ValueError, OSError):
+        atual = 1024
+    # Cada host usa um socket ICMP e um por porta TCP; reserva uma folga para o restante do processo
+    return max(1, (atual - 256) // (len(config.PORTAS_SONDA_TCP) + 1))
+
+
+# Gerador assíncrono que produz cada IP ativo da rede assim que ele responde
+async def descobrir_hosts(rede, concorrencia=None, timeout=None):
+    rede = ipaddress.ip_network(rede, strict=False)
+    concorrencia = min(concorrencia or config.CONCORRENCIA_VARREDURA, concorrencia_maxima())
+    semaforo = asyncio.Semaphore(concorrencia)
+    encontrados = asyncio.Queue()
+    enderecos = rede.hosts() if rede.num_addresses > 2 else iter(rede)
+    vizinhanca.atualizar()
+
+    async def verificar(ip):
+        try:
+            if await sondar_host(ip, timeout):
+                await encontrados.put(ip)
+        finally:
+            semaforo.release()
+
+    # Cria as sondas sob demanda, respeitando o limite do semáforo
+    async def produzir():
+        pendentes = set()
+        for endereco in enderecos:
+            await semaforo.acquire()
+            tarefa = asyncio.ensure_future(verificar(str(endereco)))
+            pendentes.add(tarefa)
+            tarefa.add_done_callback(pendentes.discard)
+        if pendentes:
+            await asyncio.gather(*pendentes, return_exceptions=True)
+        await encontrados.put(_FIM)
+
+    produtor = asyncio.ensure_future(produzir())
+    try:
+        while True:
+            ip = await encontrados.get()
+            if ip is _FIM:
+                break
+            yield ip
+    finally:
+        produtor.cancel()
+
+
+# Executa o motor assíncrono em uma thread própria e repassa os hosts a uma fila
+def _varrer_async(rede, saida, concorrencia=None):
+    async def consumir():
+        async for ip in descobrir_hosts(rede, concorrencia):
+            saida.put((ip, None))
+
+    try:
+        asyncio.run(consumir())
+    except Exception as e:
+        print(f"[ERRO] Falha na varredura assíncrona de {rede}: {e}")
+    finally:
+        saida.put(_FIM)
+
+
+# Varredura tradicional com nmap -sn (bloqueia até o fim)
+def _varrer_nmap(rede, saida, concorrencia=None):
+    try:
+        scanner = nmap.PortScanner()
+        scanner.scan(hosts=rede, arguments="-sn")
+        for ip in scanner.all_hosts():
+            saida.put((ip, scanner[ip]["addresses"].get("mac")))
+    except Exception as e:
+        print(f"[ERRO] Falha na varredura nmap de {rede}: {e}")
+    finally:
+        saida.put(_FIM)
+
+
+# Varre a rede e produz (ip, mac ou None) conforme os hosts são encontrados
+def varrer(rede, backend=None, concorrencia=None):
+    backend = backend or config.BACKEND_VARREDURA
+    if backend == "nmap" and nmap is None:
+        print("[AVISO] python-nmap não instalado; usando o motor assíncrono.")
+        backend = "async"
+
+    saida = queue.Queue()
+    alvo = _varrer_nmap if backend == "nmap" else _varrer_async
+    threading.Thread(target=alvo, args=(rede, saida, concorrencia), daemon=True).start()
+
+    while True:
+        item = saida.get()
+        if item is _FIM:
+            return
+        yield item
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    faixa = sys.argv[1] if len(sys.argv) > 1 else "192.168.0.0/24"
+    inicio = time.monotonic()
+    for ip, mac in varrer(faixa):
+        print(f"{time.monotonic() - inicio:7.3f}s  {ip}  {mac or ''}")
+    print(f"Varredura concluída em {time.monotonic() - inicio:.2f}s")
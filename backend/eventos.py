@@ -0,0 +1,170 @@
+# Eventos em tempo real (Server-Sent Events) para o frontend.
+#
+# Um único produtor por tipo de evento alimenta todos os clientes: o
+# amostrador publica as taxas de tráfego a cada leitura, o motor de presença
+# publica as transições online/offline e o registro de tarefas publica o
+# andamento das varreduras e exclusões. Cada evento é serializado uma vez e
+# entregue na fila limitada de cada cliente (FILA_EVENTOS). Num cliente lento,
+# uma taxa de tráfego ainda não enviada é substituída pela mais nova e, com a
+# fila cheia, os eventos mais antigos são descartados; o produtor nunca espera.
+# Assim, N painéis abertos custam um laço de medição, não N sequências de
+# requisições.
+#
+# Os produtores e os clientes vivem no mesmo processo: /eventos exige um único
+# processo servidor com threads (gunicorn -k gthread --workers 1, ver Procfile).
+# Com vários workers, o motor de presença só roda no que detém a trava, e os
+# clientes dos outros workers não receberiam as transições de presença nem o
+# andamento das tarefas iniciadas em outro processo. Um worker síncrono ficaria
+# preso a cada conexão aberta e seria reiniciado pelo timeout.
+import itertools
+import json
+import threading
+import time
+from collections import deque
+
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+
+import amostrador
+import config
+import presenca
+import tarefas
+import varreduras
+
+eventos_bp = Blueprint("eventos", __name__)
+
+TIPOS = ("trafego", "presenca", "tarefa", "varredura")
+
+# Tipos em que só o evento mais recente interessa: substituem o anterior ainda não enviado
+SUBSTITUIVEIS = {"trafego"}
+
+_clientes = set()
+_ultimos = {}  # tipo substituível -> último quadro, enviado a quem se conecta
+_ids = itertools.count(1)
+_lock = threading.Lock()
+_iniciado = False
+
+
+class Cliente:
+    """Fila limitada de quadros SSE de uma conexão."""
+
+    def __init__(self, tipos):
+        self.tipos = tipos
+        self.fila = deque(maxlen=config.FILA_EVENTOS)
+        self.descartados = 0
+        self.condicao = threading.Condition()
+
+    def entregar(self, tipo, quadro):
+        with self.condicao:
+            if tipo in SUBSTITUIVEIS:
+                # Troca o quadro do mesmo tipo ainda não enviado pelo mais novo
+                for i, (tipo_pendente, _) in enumerate(self.fila):
+                    if tipo_pendente == tipo:
+                        del self.fila[i]
+                        self.descartados += 1
+                        break
+            if len(self.fila) == self.fila.maxlen:
+                self.descartados += 1
+            self.fila.append((tipo, quadro))
+            self.condicao.notify()
+
+    # Retira os quadros pendentes, esperando até timeout segundos por algum
+    def retirar(self, timeout):
+        with self.condicao:
+            if not self.fila:
+                self.condicao.wait(timeout)
+            quadros = [quadro for _, quadro in self.fila]
+            self.fila.clear()
+            return quadros
+
+
+# Serializa um evento no formato SSE (id, event, data)
+def _quadro(tipo, dados):
+    corpo = json.dumps(dados, ensure_ascii=False, default=str)
+    return f"id: {next(_ids)}\nevent: {tipo}\ndata: {corpo}\n\n"
+
+
+# Publica um evento para todos os clientes inscritos no tipo
+def publicar(tipo, dados):
+    quadro = _quadro(tipo, dados)
+    with _lock:
+        if tipo in SUBSTITUIVEIS:
+            _ultimos[tipo] = quadro
+        clientes = [cliente for cliente in _clientes if tipo in cliente.tipos]
+    for cliente in clientes:
+        cliente.entregar(tipo, quadro)
+
+
+def quantidade_clientes():
+    with _lock:
+        return len(_clientes)
+
+
+# ==== PRODUTORES ====
+
+def _tarefa(tarefa):
+    if tarefa.tipo in ("varredura", "exclusao"):
+        publicar("tarefa", tarefa.para_dict())
+
+
+def _varredura(dispositivos):
+    publicar("varredura", {"total": len(dispositivos), "dispositivos": dispositivos})
+
+
+# Inscreve os produtores (uma vez por processo)
+def iniciar():
+    global _iniciado
+    with _lock:
+        if _iniciado:
+            return
+        _iniciado = True
+    amostrador.assinar(lambda leitura: publicar("trafego", leitura))
+    presenca.assinar(lambda evento: publicar("presenca", evento))
+    tarefas.assinar(_tarefa)
+    varreduras.assinar(_varredura)
+
+
+# ==== ROTA ====
+
+def _transmitir(cliente):
+    with _lock:
+        _clientes.add(cliente)
+    try:
+        yield "retry: 3000\n\n"
+        # Quem chega recebe logo o estado mais recente dos tipos substituíveis
+        with _lock:
+            iniciais = [quadro for tipo, quadro in _ultimos.items() if tipo in cliente.tipos]
+        for quadro in iniciais:
+            yield quadro
+        ultimo_envio = time.monotonic()
+        while True:
+            quadros = cliente.retirar(config.INTERVALO_PING_EVENTOS)
+            if quadros:
+                yield "".join(quadros)
+                ultimo_envio = time.monotonic()
+            elif time.monotonic() - ultimo_envio >= config.INTERVALO_PING_EVENTOS:
+                # Comentário de keep-alive: mantém proxies e o navegador conectados
+                yield ": ping\n\n"
+                ultimo_envio = time.monotonic()
+    finally:
+        with _lock:
+            _clientes.discard(cliente)
+
+
+@eventos_bp.route("/eventos", methods=["GET"])
+def eventos():
+    """
+    Fluxo SSE com as taxas de tráfego, as transições de presença e o andamento
+    das varreduras. "tipos" (separados por vírgula) restringe os eventos.
+    """
+    tipos = request.args.get("tipos")
+    tipos = set(TIPOS) if not tipos else {tipo.strip() for tipo in tipos.split(",") if tipo.strip()}
+    desconhecidos = tipos - set(TIPOS)
+    if desconhecidos:
+        return jsonify({"erro": f"Tipos de evento inválidos: {', '.join(sorted(desconhecidos))}"}), 400
+
+    if quantidade_clientes() >= config.MAXIMO_CLIENTES_EVENTOS:
+        return jsonify({"erro": "Limite de clientes de eventos atingido"}), 503
+
+    cliente = Cliente(tipos)
+    cabecalhos = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(_transmitir(cliente)), mimetype="text/event-stream", headers=cabecalhos)
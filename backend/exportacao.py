@@ -0,0 +1,169 @@
+# Exportação do histórico em NDJSON ou CSV, transmitida em partes.
+#
+# As linhas saem do cursor em lotes de LOTE_EXPORTACAO (fetchmany) e cada lote
+# é serializado e enviado antes do próximo ser lido, por uma resposta Flask
+# baseada em gerador. A memória usada fica constante, independentemente de
+# quantas linhas o histórico tenha.
+import csv
+import io
+import json
+from datetime import datetime
+
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+
+import banco
+import config
+import identidade
+import paginacao
+import serie_temporal
+
+exportacao_bp = Blueprint("exportacao", __name__)
+
+FORMATOS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+# Retorna o ID da máquina local no banco, ou None se ainda não registrada
+def _dispositivo_local_id():
+    linha = banco.obter_conexao().execute(
+        "SELECT id FROM dispositivos WHERE ip = ?", (identidade.ip_local(),)
+    ).fetchone()
+    return linha[0] if linha else None
+
+
+# Lê as linhas de um cursor em lotes de tamanho fixo, fechando-o ao final
+def _lotes_do_cursor(cursor):
+    try:
+        while True:
+            lote = cursor.fetchmany(config.LOTE_EXPORTACAO)
+            if not lote:
+                return
+            yield lote
+    finally:
+        cursor.close()
+
+
+# Agrupa um iterador de linhas em lotes de tamanho fixo
+def _lotes_do_iterador(linhas):
+    lote = []
+    for linha in linhas:
+        lote.append(linha)
+        if len(lote) >= config.LOTE_EXPORTACAO:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+# Serializa cada lote no formato pedido; o CSV começa pelo cabeçalho
+def _serializar(colunas, lotes, formato):
+    if formato == "csv":
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        escritor.writerow(colunas)
+        for lote in lotes:
+            escritor.writerows(lote)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+    else:
+        for lote in lotes:
+            yield "".join(json.dumps(dict(zip(colunas, linha)), ensure_ascii=False) + "\n" for linha in lote)
+
+
+# Monta a resposta transmitida em partes, com o nome de arquivo sugerido
+def _responder(nome, colunas, lotes, formato):
+    cabecalhos = {"Content-Disposition": f"attachment; filename={nome}.{formato}"}
+    return Response(
+        stream_with_context(_serializar(colunas, lotes, formato)),
+        mimetype=FORMATOS[formato],
+        headers=cabecalhos,
+    )
+
+
+# Lê formato, from e to dos parâmetros; ValueError se inválidos
+def _ler_parametros():
+    formato = request.args.get("formato", "ndjson").lower()
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato inválido: {formato} (use ndjson ou csv)")
+    inicio = paginacao.ler_instante(request.args.get("from"))
+    fim = paginacao.ler_instante(request.args.get("to"))
+    return formato, inicio, fim
+
+
+# Filtros SQL de intervalo sobre uma coluna de data em texto
+def _filtros_intervalo(coluna, inicio, fim):
+    condicoes, parametros = [], []
+    if inicio is not None:
+        condicoes.append(f"{coluna} >= ?")
+        parametros.append(paginacao.instante_texto(inicio))
+    if fim is not None:
+        condicoes.append(f"{coluna} <= ?")
+        parametros.append(paginacao.instante_texto(fim))
+    return "".join(f" AND {c}" for c in condicoes), parametros
+
+
+@exportacao_bp.route("/exportar/trafego", methods=["GET"])
+def exportar_trafego():
+    """Exporta as amostras brutas de tráfego da máquina local (contadores em bytes), em ordem cronológica."""
+    try:
+        formato, inicio, fim = _ler_parametros()
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
+    dispositivo_id = _dispositivo_local_id()
+    if dispositivo_id is None:
+        return jsonify({"erro": "Máquina local ainda não registrada"}), 404
+
+    linhas = (
+        (datetime.fromtimestamp(ts).strftime(paginacao.FORMATO_DATA), download, upload)
+        for ts, download, upload in serie_temporal.amostras(dispositivo_id, inicio, fim)
+    )
+    colunas = ["timestamp", "download_bytes", "upload_bytes"]
+    return _responder("trafego", colunas, _lotes_do_iterador(linhas), formato)
+
+
+@exportacao_bp.route("/exportar/speedtest", methods=["GET"])
+def exportar_speedtest():
+    """Exporta o histórico de testes de velocidade da máquina local, em ordem cronológica."""
+    try:
+        formato, inicio, fim = _ler_parametros()
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
+    dispositivo_id = _dispositivo_local_id()
+    if dispositivo_id is None:
+        return jsonify({"erro": "Máquina local ainda não registrada"}), 404
+
+    filtros, parametros = _filtros_intervalo("timestamp", inicio, fim)
+    cursor = banco.obter_conexao().execute(f"""
+        SELECT timestamp, ping_ms, download_mb, upload_mb
+        FROM velocidade
+        WHERE dispositivo_id = ?{filtros}
+        ORDER BY timestamp, id
+    """, (dispositivo_id, *parametros))
+    colunas = ["timestamp", "ping_ms", "download_mb", "upload_mb"]
+    return _responder("speedtest", colunas, _lotes_do_cursor(cursor), formato)
+
+
+@exportacao_bp.route("/exportar/sessoes", methods=["GET"])
+def exportar_sessoes():
+    """Exporta as sessões de tráfego encerradas, em ordem cronológica de início."""
+    try:
+        formato, inicio, fim = _ler_parametros()
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
+
+    filtros, parametros = _filtros_intervalo("inicio", inicio, fim)
+    cursor = banco.obter_conexao().execute(f"""
+        SELECT id, dispositivo_id, inicio, fim, download_usado_mb, upload_usado_mb,
+               ROUND(download_usado_mb + upload_usado_mb, 2), NULLIF(nome, ''), tag
+        FROM sessoes
+        WHERE fim IS NOT NULL{filtros}
+        ORDER BY inicio, id
+    """, parametros)
+    colunas = ["id", "dispositivo_id", "inicio", "fim", "download_usado_mb", "upload_usado_mb", "total_usado_mb",
+               "nome", "tag"]
+    return _responder("sessoes", colunas, _lotes_do_cursor(cursor), formato)
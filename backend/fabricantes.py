@@ -0,0 +1,177 @@
+# Base offline de fabricantes (OUI) com busca pelo prefixo mais longo.
+#
+# O índice é gerado por importar_oui.py e mapeado em memória (mmap). Layout
+# (inteiros na ordem de bytes nativa da máquina que gerou o arquivo):
+#   cabeçalho: b"OUI1", n24, n28, n36, n_nomes (uint32)
+#   chaves de 24, 28 e 36 bits, ordenadas (uint64)
+#   índice do nome de cada chave, na mesma ordem (uint32)
+#   deslocamento de cada nome no bloco de texto (n_nomes + 1 x uint32)
+#   bloco de texto com os nomes em UTF-8
+# A busca é uma bisseção por nível (36, 28 e 24 bits), sem carregar nada na memória.
+import mmap
+import os
+import struct
+import threading
+from bisect import bisect_left
+
+import config
+
+MAGICO = b"OUI1"
+CABECALHO = struct.Struct("=4s4I")
+NIVEIS = (36, 28, 24)  # do prefixo mais longo (MA-S) ao mais curto (MA-L)
+
+# Palavras-chave do nome do fabricante -> tipo de dispositivo (primeira correspondência vence)
+TIPOS_POR_FABRICANTE = (
+    ("raspberry", "Dispositivo IoT"),
+    ("espressif", "Dispositivo IoT"),
+    ("tuya", "Dispositivo IoT"),
+    ("shelly", "Dispositivo IoT"),
+    ("sonoff", "Dispositivo IoT"),
+    ("canon", "Impressora"),
+    ("epson", "Impressora"),
+    ("seiko epson", "Impressora"),
+    ("brother", "Impressora"),
+    ("lexmark", "Impressora"),
+    ("kyocera", "Impressora"),
+    ("ricoh", "Impressora"),
+    ("xerox", "Impressora"),
+    ("cisco", "Roteador"),
+    ("tp-link", "Roteador"),
+    ("netgear", "Roteador"),
+    ("d-link", "Roteador"),
+    ("ubiquiti", "Roteador"),
+    ("mikrotik", "Roteador"),
+    ("routerboard", "Roteador"),
+    ("juniper", "Roteador"),
+    ("arris", "Roteador"),
+    ("tenda", "Roteador"),
+    ("zte", "Roteador"),
+    ("linksys", "Roteador"),
+    ("intelbras", "Roteador"),
+    ("roku", "Smart TV"),
+    ("tcl", "Smart TV"),
+    ("hisense", "Smart TV"),
+    ("vizio", "Smart TV"),
+    ("lg electronics", "Smart TV"),
+    ("apple", "Dispositivo Apple"),
+    ("samsung", "Telefone"),
+    ("huawei", "Telefone"),
+    ("xiaomi", "Telefone"),
+    ("motorola", "Telefone"),
+    ("realme", "Telefone"),
+    ("oneplus", "Telefone"),
+    ("oppo", "Telefone"),
+    ("vivo mobile", "Telefone"),
+    ("htc", "Telefone"),
+    ("nokia", "Telefone"),
+    ("dell", "PC"),
+    ("lenovo", "PC"),
+    ("hewlett packard", "PC"),
+    ("acer", "PC"),
+    ("asustek", "PC"),
+    ("toshiba", "PC"),
+    ("micro-star", "PC"),
+    ("gigabyte", "PC"),
+    ("intel corporate", "PC"),
+)
+
+
+class IndiceOUI:
+    """Índice de OUIs mapeado em memória, com busca pelo prefixo mais longo."""
+
+    def __init__(self, caminho):
+        with open(caminho, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magico, n24, n28, n36, n_nomes = CABECALHO.unpack_from(self._mmap, 0)
+        if magico != MAGICO:
+            raise ValueError(f"Arquivo de OUI inválido: {caminho}")
+
+        visao = memoryview(self._mmap)
+        pos = CABECALHO.size
+        self._chaves = {}
+        for bits, n in ((24, n24), (28, n28), (36, n36)):
+            self._chaves[bits] = visao[pos:pos + 8 * n].cast("Q")
+            pos += 8 * n
+        self._nomes_idx = {}
+        for bits, n in ((24, n24), (28, n28), (36, n36)):
+            self._nomes_idx[bits] = visao[pos:pos + 4 * n].cast("I")
+            pos += 4 * n
+        self._deslocamentos = visao[pos:pos + 4 * (n_nomes + 1)].cast("I")
+        pos += 4 * (n_nomes + 1)
+        self._texto = visao[pos:]
+        self.total = n24 + n28 + n36
+
+    def _nome(self, indice):
+        return bytes(self._texto[self._deslocamentos[indice]:self._deslocamentos[indice + 1]]).decode("utf-8")
+
+    def buscar(self, mac_int):
+        """Retorna o fabricante do MAC (inteiro de 48 bits) ou None."""
+        for bits in NIVEIS:
+            chaves = self._chaves[bits]
+            chave = mac_int >> (48 - bits)
+            i = bisect_left(chaves, chave)
+            if i < len(chaves) and chaves[i] == chave:
+                return self._nome(self._nomes_idx[bits][i])
+        return None
+
+
+_indice = None
+_indice_carregado = False
+_lock = threading.Lock()
+
+
+# Carrega o índice na primeira consulta; sem arquivo, a base offline fica desativada
+def _obter_indice():
+    global _indice, _indice_carregado
+    if _indice_carregado:
+        return _indice
+    with _lock:
+        if not _indice_carregado:
+            if os.path.exists(config.ARQUIVO_OUI):
+                try:
+                    _indice = IndiceOUI(config.ARQUIVO_OUI)
+                    print(f"[INFO] Base de fabricantes carregada: {_indice.total} prefixos")
+                except (OSError, ValueError) as e:
+                    print(f"[ERRO] Falha ao carregar base de fabricantes: {e}")
+            else:
+                print(f"[AVISO] Base de fabricantes não encontrada em {config.ARQUIVO_OUI}; "
+                      "gere-a com importar_oui.py")
+            _indice_carregado = True
+    return _indice
+
+
+# Descarta o índice carregado (ex.: após reimportar o arquivo)
+def recarregar():
+    global _indice, _indice_carregado
+    with _lock:
+        _indice = None
+        _indice_carregado = False
+
+
+# Converte "AA:BB:CC:DD:EE:FF" (ou com "-") em inteiro de 48 bits; None se inválido
+def mac_para_int(mac):
+    digitos = mac.replace(":", "").replace("-", "").replace(".", "")
+    if len(digitos) != 12:
+        return None
+    try:
+        return int(digitos, 16)
+    except ValueError:
+        return None
+
+
+# Retorna o nome do fabricante do MAC pela base offline, ou None
+def buscar_fabricante(mac):
+    indice = _obter_indice()
+    valor = mac_para_int(mac) if mac else None
+    if indice is None or valor is None:
+        return None
+    return indice.buscar(valor)
+
+
+# Deduz o tipo de dispositivo a partir do nome do fabricante
+def tipo_por_fabricante(fabricante):
+    nome = (fabricante or "").lower()
+    for palavra, tipo in TIPOS_POR_FABRICANTE:
+        if palavra in nome:
+            return tipo
+    return "Desconhecido"
@@ -0,0 +1,141 @@
+# Identidade da máquina local (IP, MAC, hostname e interface), calculada uma vez
+# e compartilhada por todos os módulos.
+#
+# O cache é invalidado quando as interfaces mudam: no Linux, por mensagens de
+# netlink (link, endereço ou rota alterados); nos demais sistemas, por uma
+# impressão digital das interfaces conferida no máximo a cada INTERVALO_IDENTIDADE
+# segundos.
+import socket
+import threading
+import time
+
+import psutil
+
+import config
+
+# Grupos netlink de interesse: mudanças de link, de endereço IPv4 e de rotas IPv4
+_RTMGRP_LINK = 0x1
+_RTMGRP_IPV4_IFADDR = 0x10
+_RTMGRP_IPV4_ROUTE = 0x40
+
+_identidade = None
+_impressao = None
+_conferida_em = 0.0
+_netlink_ativo = False
+_lock = threading.Lock()
+
+
+# Retorna o IP usado para sair da máquina (a rota padrão), sem enviar pacotes
+def _ip_de_saida():
+    try:
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            s.connect(("8.8.8.8", 80))
+            return s.getsockname()[0]
+        finally:
+            s.close()
+    except OSError:
+        pass
+    try:
+        ip = socket.gethostbyname(socket.gethostname())
+        return None if ip.startswith("127.") else ip
+    except OSError:
+        return None
+
+
+# Resume as interfaces (nomes e endereços IPv4) para detectar mudanças
+def _impressao_digital():
+    return tuple(sorted(
+        (interface, tuple(sorted(a.address for a in addrs if a.family == socket.AF_INET)))
+        for interface, addrs in psutil.net_if_addrs().items()
+    ))
+
+
+# Calcula a identidade completa a partir do IP de saída e das interfaces
+def _calcular():
+    ip = _ip_de_saida()
+    interface = None
+    mac = None
+    for nome, addrs in psutil.net_if_addrs().items():
+        if ip and any(a.family == socket.AF_INET and a.address == ip for a in addrs):
+            interface = nome
+            for addr in addrs:
+                if (hasattr(psutil, "AF_LINK") and addr.family == psutil.AF_LINK) or \
+                        (hasattr(socket, "AF_PACKET") and addr.family == socket.AF_PACKET):
+                    mac = addr.address.upper().replace("-", ":")
+                    break
+            break
+    return {
+        "ip": ip,
+        "mac": mac,
+        "hostname": socket.gethostname(),
+        "interface": interface,
+    }
+
+
+# Escuta eventos de netlink e invalida o cache a cada mudança de interface
+def _escutar_netlink(sock):
+    while True:
+        try:
+            if sock.recv(65536):
+                invalidar()
+        except OSError:
+            return
+
+
+def _iniciar_netlink():
+    global _netlink_ativo
+    if not hasattr(socket, "AF_NETLINK"):
+        return
+    try:
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+        sock.bind((0, _RTMGRP_LINK | _RTMGRP_IPV4_IFADDR | _RTMGRP_IPV4_ROUTE))
+    except OSError:
+        return
+    threading.Thread(target=_escutar_netlink, args=(sock,), name="identidade-netlink", daemon=True).start()
+    _netlink_ativo = True
+
+
+# Descarta a identidade em cache; a próxima consulta recalcula
+def invalidar():
+    global _identidade
+    with _lock:
+        _identidade = None
+
+
+# Retorna a identidade da máquina: {"ip", "mac", "hostname", "interface"}
+def obter_identidade():
+    global _identidade, _impressao, _conferida_em
+    with _lock:
+        if _identidade is None and _impressao is None:
+            _iniciar_netlink()
+
+        agora = time.monotonic()
+        # Sem netlink, confere periodicamente se as interfaces mudaram
+        if _identidade is not None and not _netlink_ativo and agora - _conferida_em >= config.INTERVALO_IDENTIDADE:
+            _conferida_em = agora
+            impressao = _impressao_digital()
+            if impressao != _impressao:
+                _identidade = None
+
+        if _identidade is None:
+            _impressao = _impressao_digital()
+            _conferida_em = agora
+            _identidade = _calcular()
+        return dict(_identidade)
+
+
+def ip_local():
+    return obter_identidade()["ip"]
+
+
+def mac_local():
+    return obter_identidade()["mac"]
+
+
+def hostname_local():
+    return obter_identidade()["hostname"]
+
+
+if __name__ == "__main__":
+    print(obter_identidade())
@@ -0,0 +1,481 @@
+# Importação de capturas de pacotes (pcap e pcapng) para o histórico de tráfego.
+#
+# Lê capturas de uma porta espelhada ou os arquivos rotacionados do tcpdump
+# (-C/-G) e soma os bytes e pacotes de cada dispositivo conhecido, gravando-os
+# na série temporal (trafego_blocos) como contadores acumulados, uma amostra
+# por segundo. Os arquivos são mapeados em memória e os cabeçalhos lidos no
+# lugar com struct.unpack_from, sem copiar os pacotes; as amostras são
+# gravadas em lotes de LOTE_CAPTURA, cada lote em uma única transação.
+#
+# Uso:
+#   python importar_capturas.py captura.pcap [mais.pcapng ...] [diretorio/]
+#   python importar_capturas.py /var/log/capturas --incluir-local --forcar
+#   python importar_capturas.py antiga.pcap --sobrepor
+#
+# Pacotes IPv4 são atribuídos pelo IP de origem (envio) e de destino
+# (recebimento); os demais (IPv6, ARP...) pelos endereços MAC, já que num
+# pacote roteado o MAC é o do roteador. Cada arquivo importado fica registrado
+# na tabela capturas e não é lido de novo. A série só cresce para a frente: uma
+# captura com pacotes em segundos já gravados na série de um dispositivo é
+# recusada, a menos que se peça --sobrepor (ou --forcar, numa reimportação);
+# nesse caso esses pacotes são descartados e contados no resumo, e nada é
+# contado duas vezes.
+import argparse
+import mmap
+import os
+import socket
+import struct
+import time
+
+import banco
+import config
+import identidade
+import serie_temporal
+
+# Tipos de enlace (LINKTYPE_*) suportados
+ETHERNET = 1
+RAW = 101
+LINUX_SLL = 113
+IPV4 = 228
+LINUX_SLL2 = 276
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPES_VLAN = (0x8100, 0x88A8, 0x9100)
+
+# pcap: número mágico (microssegundos ou nanossegundos) -> ordem dos bytes
+MAGICOS_PCAP = {
+    b"\xd4\xc3\xb2\xa1": "<",
+    b"\xa1\xb2\xc3\xd4": ">",
+    b"\x4d\x3c\xb2\xa1": "<",
+    b"\xa1\xb2\x3c\x4d": ">",
+}
+
+# pcapng: tipos de bloco
+BLOCO_SECAO = 0x0A0D0D0A
+BLOCO_INTERFACE = 1
+BLOCO_PACOTE_OBSOLETO = 2
+BLOCO_PACOTE_ESTENDIDO = 6
+OPCAO_RESOLUCAO = 9  # if_tsresol
+
+ENDERECO_IPV4 = struct.Struct(">I")
+
+
+def _formato(caminho):
+    with open(caminho, "rb") as f:
+        magico = f.read(4)
+    if magico in MAGICOS_PCAP:
+        return "pcap"
+    if magico == b"\x0a\x0d\x0d\x0a":
+        return "pcapng"
+    return None
+
+
+# ==== LEITURA ====
+
+# Pacotes de um pcap: (segundo, tipo de enlace, deslocamento, bytes capturados, bytes no fio).
+# Um registro truncado no fim (captura ainda em andamento) encerra a leitura.
+def _pacotes_pcap(mm):
+    ordem = MAGICOS_PCAP[mm[:4]]
+    tipo_enlace = struct.unpack_from(ordem + "I", mm, 20)[0] & 0x0FFFFFFF
+    registro = struct.Struct(ordem + "IIII")
+    tamanho = len(mm)
+    posicao = 24
+    while posicao + 16 <= tamanho:
+        segundo, _, capturados, no_fio = registro.unpack_from(mm, posicao)
+        inicio = posicao + 16
+        posicao = inicio + capturados
+        if posicao > tamanho:
+            return
+        yield segundo, tipo_enlace, inicio, capturados, no_fio
+
+
+# Unidades de tempo por segundo de uma interface pcapng (opção if_tsresol, padrão 10^-6)
+def _resolucao(mm, ordem, posicao, fim):
+    opcao = struct.Struct(ordem + "HH")
+    while posicao + 4 <= fim:
+        codigo, tamanho = opcao.unpack_from(mm, posicao)
+        if codigo == 0:
+            break
+        if codigo == OPCAO_RESOLUCAO and tamanho >= 1:
+            valor = mm[posicao + 4]
+            return 2 ** (valor & 0x7F) if valor & 0x80 else 10 ** valor
+        posicao += 4 + (tamanho + 3) // 4 * 4
+    return 1_000_000
+
+
+# Pacotes de um pcapng, no mesmo formato de _pacotes_pcap. Cada seção tem sua
+# ordem de bytes e sua lista de interfaces (tipo de enlace e resolução do relógio).
+def _pacotes_pcapng(mm):
+    tamanho = len(mm)
+    posicao = 0
+    ordem = "<"
+    interfaces = []
+    while posicao + 12 <= tamanho:
+        # O tipo do bloco de seção é o mesmo nas duas ordens de bytes
+        tipo = struct.unpack_from(ordem + "I", mm, posicao)[0]
+        if tipo == BLOCO_SECAO:
+            ordem = "<" if mm[posicao + 8:posicao + 12] == b"\x4d\x3c\x2b\x1a" else ">"
+            interfaces = []
+        comprimento = struct.unpack_from(ordem + "I", mm, posicao + 4)[0]
+        if comprimento < 12 or posicao + comprimento > tamanho:
+            return
+        if tipo == BLOCO_INTERFACE:
+            tipo_enlace = struct.unpack_from(ordem + "H", mm, posicao + 8)[0]
+            interfaces.append((tipo_enlace, _resolucao(mm, ordem, posicao + 16, posicao + comprimento - 4)))
+        elif tipo in (BLOCO_PACOTE_ESTENDIDO, BLOCO_PACOTE_OBSOLETO):
+            if tipo == BLOCO_PACOTE_ESTENDIDO:
+                interface, alto, baixo, capturados, no_fio = struct.unpack_from(ordem + "IIIII", mm, posicao + 8)
+            else:
+                interface, _, alto, baixo, capturados, no_fio = struct.unpack_from(ordem + "HHIIII", mm, posicao + 8)
+            if interface < len(interfaces):
+                tipo_enlace, resolucao = interfaces[interface]
+                yield ((alto << 32) | baixo) // resolucao, tipo_enlace, posicao + 28, capturados, no_fio
+        posicao += comprimento
+
+
+# ==== ENDEREÇOS ====
+
+# Endereços de um pacote: (MAC de origem, MAC de destino, IPv4 de origem, IPv4 de destino),
+# com None no que o enlace não informa ou o pacote não tem
+def _enderecos(mm, tipo_enlace, inicio, capturados):
+    mac_origem = mac_destino = None
+    if tipo_enlace == ETHERNET:
+        if capturados < 14:
+            return None, None, None, None
+        mac_destino = mm[inicio:inicio + 6]
+        mac_origem = mm[inicio + 6:inicio + 12]
+        rede = inicio + 14
+        protocolo = (mm[inicio + 12] << 8) | mm[inicio + 13]
+        while protocolo in ETHERTYPES_VLAN and rede + 4 <= inicio + capturados:
+            protocolo = (mm[rede + 2] << 8) | mm[rede + 3]
+            rede += 4
+    elif tipo_enlace == LINUX_SLL:
+        if capturados < 16:
+            return None, None, None, None
+        if mm[inicio + 4] == 0 and mm[inicio + 5] == 6:
+            mac_origem = mm[inicio + 6:inicio + 12]
+        protocolo = (mm[inicio + 14] << 8) | mm[inicio + 15]
+        rede = inicio + 16
+    elif tipo_enlace == LINUX_SLL2:
+        if capturados < 20:
+            return None, None, None, None
+        if mm[inicio + 11] == 6:
+            mac_origem = mm[inicio + 12:inicio + 18]
+        protocolo = (mm[inicio] << 8) | mm[inicio + 1]
+        rede = inicio + 20
+    elif tipo_enlace in (RAW, IPV4):
+        protocolo = ETHERTYPE_IPV4 if capturados and mm[inicio] >> 4 == 4 else None
+        rede = inicio
+    else:
+        return None, None, None, None
+
+    if protocolo == ETHERTYPE_IPV4 and rede + 20 <= inicio + capturados and mm[rede] >> 4 == 4:
+        return (mac_origem, mac_destino,
+                ENDERECO_IPV4.unpack_from(mm, rede + 12)[0], ENDERECO_IPV4.unpack_from(mm, rede + 16)[0])
+    return mac_origem, mac_destino, None, None
+
+
+def _mac_em_bytes(mac):
+    try:
+        valor = bytes.fromhex((mac or "").replace(":", "").replace("-", ""))
+    except ValueError:
+        return None
+    return valor if len(valor) == 6 else None
+
+
+def _ipv4_em_inteiro(ip):
+    try:
+        return ENDERECO_IPV4.unpack(socket.inet_aton(ip))[0]
+    except (OSError, TypeError):
+        return None
+
+
+# ==== IMPORTAÇÃO ====
+
+class Contagem:
+    """Série de um dispositivo em construção: acumulados em bytes e o segundo em aberto."""
+
+    __slots__ = ("limite", "fim", "download", "upload", "segundo", "aberto",
+                 "pacotes_recebidos", "pacotes_enviados", "bytes_recebidos", "bytes_enviados")
+
+    def __init__(self, limite, download, upload):
+        self.limite = limite  # último segundo já gravado antes desta importação
+        self.fim = limite  # último segundo já emitido
+        self.download = download
+        self.upload = upload
+        self.segundo = None
+        self.aberto = False
+        self.zerar_arquivo()
+
+    def zerar_arquivo(self):
+        self.pacotes_recebidos = self.pacotes_enviados = 0
+        self.bytes_recebidos = self.bytes_enviados = 0
+
+
+class Importador:
+    """Soma o tráfego das capturas por dispositivo e grava a série em lotes."""
+
+    def __init__(self, incluir_local=False, tamanho_lote=None):
+        self.tamanho_lote = tamanho_lote or config.LOTE_CAPTURA
+        self.contagens = {}  # dispositivo_id -> Contagem
+        self.pendentes = {}  # dispositivo_id -> [(segundo, download, upload), ...]
+        self.quantidade_pendente = 0
+        self._carregar_dispositivos(incluir_local)
+
+    # Índices MAC (6 bytes) -> ID e IPv4 (inteiro) -> ID dos dispositivos conhecidos.
+    # O dispositivo local fica de fora por padrão: sua série vem dos contadores do sistema.
+    def _carregar_dispositivos(self, incluir_local):
+        ip_local = identidade.ip_local()
+        mac_local = (identidade.mac_local() or "").upper()
+        self.por_mac = {}
+        self.por_ip = {}
+        # Com IPs repetidos (DHCP), vale o dispositivo visto por último
+        linhas = banco.obter_conexao().execute("SELECT id, ip, mac FROM dispositivos ORDER BY ultima_verificacao")
+        for dispositivo_id, ip, mac in linhas:
+            if not incluir_local and (ip == ip_local or (mac_local and (mac or "").upper() == mac_local)):
+                continue
+            mac = _mac_em_bytes(mac)
+            if mac is not None:
+                self.por_mac[mac] = dispositivo_id
+            ip = _ipv4_em_inteiro(ip)
+            if ip is not None:
+                self.por_ip[ip] = dispositivo_id
+
+    # Contagem do dispositivo, continuando a série a partir do último ponto gravado
+    def _contagem(self, dispositivo_id):
+        contagem = self.contagens.get(dispositivo_id)
+        if contagem is None:
+            linha = banco.obter_conexao().execute("""
+                SELECT fim, ultimo_download, ultimo_upload FROM trafego_blocos
+                WHERE dispositivo_id = ? ORDER BY inicio DESC LIMIT 1
+            """, (dispositivo_id,)).fetchone()
+            contagem = Contagem(*(linha or (None, 0, 0)))
+            self.contagens[dispositivo_id] = contagem
+        return contagem
+
+    # Soma um pacote ao dispositivo; retorna False se o segundo já estava gravado
+    def _somar(self, dispositivo_id, segundo, recebidos, enviados):
+        contagem = self._contagem(dispositivo_id)
+        if contagem.limite is not None and segundo <= contagem.limite:
+            return False
+        if contagem.segundo is None:
+            # Sem série anterior, um ponto zerado no segundo anterior marca o início
+            if contagem.fim is None:
+                self._emitir(dispositivo_id, contagem, segundo - 1)
+            contagem.segundo = segundo
+        elif segundo > contagem.segundo:
+            if contagem.aberto:
+                self._emitir(dispositivo_id, contagem, contagem.segundo)
+            contagem.segundo = segundo
+        # Pacotes fora de ordem, de um segundo já emitido, entram no segundo em aberto
+        if contagem.fim is not None and contagem.segundo <= contagem.fim:
+            contagem.segundo = contagem.fim + 1
+        contagem.download += recebidos
+        contagem.upload += enviados
+        contagem.aberto = True
+        if recebidos:
+            contagem.pacotes_recebidos += 1
+            contagem.bytes_recebidos += recebidos
+        if enviados:
+            contagem.pacotes_enviados += 1
+            contagem.bytes_enviados += enviados
+        return True
+
+    def _emitir(self, dispositivo_id, contagem, segundo):
+        self.pendentes.setdefault(dispositivo_id, []).append((segundo, contagem.download, contagem.upload))
+        self.quantidade_pendente += 1
+        contagem.fim = segundo
+        contagem.aberto = False
+        if self.quantidade_pendente >= self.tamanho_lote:
+            with banco.transacao(imediata=True) as conn:
+                self._gravar_pendentes(conn)
+
+    def _gravar_pendentes(self, conn):
+        for dispositivo_id, amostras in self.pendentes.items():
+            serie_temporal.gravar(conn, dispositivo_id, amostras)
+        self.pendentes = {}
+        self.quantidade_pendente = 0
+
+    # Último segundo gravado na série de cada dispositivo conhecido antes desta importação
+    # (o mesmo limite usado por _somar para descartar pacotes)
+    def _limites(self):
+        conhecidos = set(self.por_mac.values()) | set(self.por_ip.values())
+        limites = {dispositivo_id: fim for dispositivo_id, fim in banco.obter_conexao().execute(
+            "SELECT dispositivo_id, MAX(fim) FROM trafego_blocos GROUP BY dispositivo_id"
+        ) if dispositivo_id in conhecidos}
+        for dispositivo_id, contagem in self.contagens.items():
+            if contagem.limite is None:
+                limites.pop(dispositivo_id, None)
+            else:
+                limites[dispositivo_id] = contagem.limite
+        return limites
+
+    # Pacotes de dispositivos conhecidos em segundos já gravados nas suas séries:
+    # (quantidade, IDs dos dispositivos). Capturas são gravadas em ordem de tempo: se a
+    # primeira começa depois de todas as séries, o arquivo não é relido (algum pacote
+    # fora de ordem ainda seria descartado, e contado, pela importação).
+    def _sobreposicao(self, mm, leitor):
+        limites = self._limites()
+        primeiro = next(leitor(mm), None)
+        if not limites or primeiro is None:
+            return 0, set()
+        maior = max(limites.values())
+        if primeiro[0] > maior:
+            return 0, set()
+        quantidade = 0
+        dispositivos = set()
+        for segundo, tipo_enlace, posicao, capturados, _ in leitor(mm):
+            if segundo > maior:
+                continue
+            mac_origem, mac_destino, ip_origem, ip_destino = _enderecos(mm, tipo_enlace, posicao, capturados)
+            if ip_origem is not None:
+                envolvidos = (self.por_ip.get(ip_origem), self.por_ip.get(ip_destino))
+            else:
+                envolvidos = (self.por_mac.get(mac_origem) if mac_origem else None,
+                              self.por_mac.get(mac_destino) if mac_destino else None)
+            sobrepostos = [d for d in envolvidos if d is not None and segundo <= limites.get(d, -1)]
+            if sobrepostos:
+                quantidade += 1
+                dispositivos.update(sobrepostos)
+        return quantidade, dispositivos
+
+    # Importa um arquivo; retorna o resumo, ou None se ele já tinha sido importado.
+    # ValueError se a captura cair em segundos já gravados e nem sobrepor nem forcar forem pedidos.
+    def importar(self, caminho, forcar=False, sobrepor=False):
+        caminho = os.path.abspath(caminho)
+        formato = _formato(caminho)
+        if formato is None:
+            raise ValueError(f"{caminho} não é um arquivo pcap ou pcapng")
+        info = os.stat(caminho)
+        identificacao = (caminho, info.st_size, info.st_mtime)
+        conn = banco.obter_conexao()
+        anterior = conn.execute(
+            "SELECT id FROM capturas WHERE caminho = ? AND tamanho = ? AND modificado_em = ?", identificacao
+        ).fetchone()
+        if anterior and not forcar:
+            return None
+
+        pacotes = ignorados = descartados = total_bytes = 0
+        inicio = fim = None
+        leitor = _pacotes_pcap if formato == "pcap" else _pacotes_pcapng
+        por_mac = self.por_mac
+        por_ip = self.por_ip
+        comeco = time.monotonic()
+        with open(caminho, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if hasattr(mm, "madvise"):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            if not (forcar or sobrepor):
+                sobrepostos, dispositivos = self._sobreposicao(mm, leitor)
+                if sobrepostos:
+                    raise ValueError(
+                        f"{sobrepostos} pacotes de {len(dispositivos)} dispositivo(s) caem em segundos já "
+                        f"gravados no histórico de tráfego; use --sobrepor para importar descartando-os"
+                    )
+            for segundo, tipo_enlace, posicao, capturados, no_fio in leitor(mm):
+                pacotes += 1
+                total_bytes += no_fio
+                if inicio is None or segundo < inicio:
+                    inicio = segundo
+                if fim is None or segundo > fim:
+                    fim = segundo
+
+                mac_origem, mac_destino, ip_origem, ip_destino = _enderecos(mm, tipo_enlace, posicao, capturados)
+                if ip_origem is not None:
+                    origem = por_ip.get(ip_origem)
+                    destino = por_ip.get(ip_destino)
+                else:
+                    origem = por_mac.get(mac_origem) if mac_origem else None
+                    destino = por_mac.get(mac_destino) if mac_destino else None
+                if origem is None and destino is None:
+                    ignorados += 1
+                    continue
+                contado = False
+                if origem is not None:
+                    contado = self._somar(origem, segundo, 0, no_fio)
+                if destino is not None:
+                    contado = self._somar(destino, segundo, no_fio, 0) or contado
+                if not contado:
+                    descartados += 1
+
+        # Fecha os segundos em aberto e grava o arquivo junto com o último lote
+        for dispositivo_id, contagem in self.contagens.items():
+            if contagem.aberto:
+                self._emitir(dispositivo_id, contagem, contagem.segundo)
+        dispositivos = [(dispositivo_id, contagem.pacotes_recebidos, contagem.pacotes_enviados,
+                         contagem.bytes_recebidos, contagem.bytes_enviados)
+                        for dispositivo_id, contagem in self.contagens.items()
+                        if contagem.pacotes_recebidos or contagem.pacotes_enviados]
+        with banco.transacao(imediata=True) as conn:
+            self._gravar_pendentes(conn)
+            if anterior:
+                conn.execute("DELETE FROM capturas_dispositivos WHERE captura_id = ?", (anterior[0],))
+                conn.execute("DELETE FROM capturas WHERE id = ?", (anterior[0],))
+            cursor = conn.execute("""
+                INSERT INTO capturas
+                    (caminho, tamanho, modificado_em, formato, pacotes, pacotes_ignorados, bytes, inicio, fim, importada_em)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (*identificacao, formato, pacotes, ignorados + descartados, total_bytes, inicio, fim, time.time()))
+            captura_id = cursor.lastrowid
+            conn.executemany("""
+                INSERT INTO capturas_dispositivos
+                    (captura_id, dispositivo_id, pacotes_recebidos, pacotes_enviados, bytes_recebidos, bytes_enviados)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, [(captura_id, *linha) for linha in dispositivos])
+        for contagem in self.contagens.values():
+            contagem.zerar_arquivo()
+
+        return {
+            "caminho": caminho,
+            "formato": formato,
+            "pacotes": pacotes,
+            "ignorados": ignorados,
+            "descartados": descartados,
+            "bytes": total_bytes,
+            "dispositivos": len(dispositivos),
+            "segundos": round(time.monotonic() - comeco, 3),
+        }
+
+
+# Arquivos de captura dos caminhos informados; diretórios são percorridos e os
+# arquivos lidos em ordem de modificação (a ordem da rotação do tcpdump)
+def listar_arquivos(caminhos):
+    arquivos = []
+    for caminho in caminhos:
+        if os.path.isdir(caminho):
+            for raiz, _, nomes in os.walk(caminho):
+                for nome in nomes:
+                    completo = os.path.join(raiz, nome)
+                    if _formato(completo):
+                        arquivos.append(completo)
+        else:
+            arquivos.append(caminho)
+    return sorted(arquivos, key=lambda arquivo: (os.path.getmtime(arquivo), arquivo))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importa capturas pcap/pcapng para o histórico de tráfego.")
+    parser.add_argument("caminhos", nargs="+", help="arquivos .pcap/.pcapng ou diretórios com capturas")
+    parser.add_argument("--incluir-local", action="store_true",
+                        help="atribui pacotes também ao dispositivo local (cuja série vem dos contadores do sistema)")
+    parser.add_argument("--forcar", action="store_true", help="reimporta arquivos já importados")
+    parser.add_argument("--sobrepor", action="store_true",
+                        help="importa capturas que caem em segundos já gravados, descartando esses pacotes")
+    args = parser.parse_args()
+
+    importador = Importador(incluir_local=args.incluir_local)
+    importados = 0
+    for arquivo in listar_arquivos(args.caminhos):
+        try:
+            resumo = importador.importar(arquivo, forcar=args.forcar, sobrepor=args.sobrepor)
+        except (OSError, ValueError) as e:
+            print(f"[ERRO] {arquivo}: {e}")
+            continue
+        if resumo is None:
+            print(f"[INFO] {arquivo}: já importado")
+            continue
+        importados += 1
+        velocidade = os.path.getsize(arquivo) / 1048576 / max(resumo["segundos"], 0.001)
+        print(f"[INFO] {arquivo}: {resumo['pacotes']} pacotes ({resumo['ignorados']} ignorados, "
+              f"{resumo['descartados']} descartados por sobreposição), "
+              f"{resumo['dispositivos']} dispositivos, {resumo['segundos']} s ({velocidade:.1f} MB/s)")
+    print(f"{importados} capturas importadas")
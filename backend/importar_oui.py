@@ -0,0 +1,81 @@
+# Ferramenta de importação da base de fabricantes do IEEE.
+#
+# Converte os CSVs públicos dos registros MA-L (oui.csv), MA-M (mam.csv) e
+# MA-S (oui36.csv) no índice compacto lido por fabricantes.py.
+#
+# Uso:
+#   python importar_oui.py oui.csv mam.csv oui36.csv [-o dados/oui.idx]
+#
+# Os arquivos podem ser baixados de https://standards-oui.ieee.org/
+import argparse
+import csv
+import os
+from array import array
+
+import config
+import fabricantes
+
+# Número de dígitos hexadecimais da atribuição -> tamanho do prefixo em bits
+BITS_POR_DIGITOS = {6: 24, 7: 28, 9: 36}
+
+
+# Lê um CSV do IEEE e produz (bits, prefixo, fabricante) para cada atribuição válida
+def ler_registros(caminho):
+    with open(caminho, newline="", encoding="utf-8-sig") as f:
+        for linha in csv.DictReader(f):
+            atribuicao = (linha.get("Assignment") or "").strip().upper()
+            nome = " ".join((linha.get("Organization Name") or "").split())
+            bits = BITS_POR_DIGITOS.get(len(atribuicao))
+            if not bits or not nome:
+                continue
+            try:
+                yield bits, int(atribuicao, 16), nome
+            except ValueError:
+                continue
+
+
+# Monta o índice binário a partir dos registros e grava no destino
+def gerar_indice(arquivos, destino):
+    chaves = {24: {}, 28: {}, 36: {}}
+    for caminho in arquivos:
+        for bits, prefixo, nome in ler_registros(caminho):
+            chaves[bits][prefixo] = nome
+
+    # Nomes repetidos (um fabricante com vários prefixos) são armazenados uma vez só
+    nomes = sorted({nome for nivel in chaves.values() for nome in nivel.values()})
+    posicao_nome = {nome: i for i, nome in enumerate(nomes)}
+
+    secoes_chaves = []
+    secoes_nomes = []
+    for bits in (24, 28, 36):
+        ordenadas = sorted(chaves[bits])
+        secoes_chaves.append(array("Q", ordenadas))
+        secoes_nomes.append(array("I", (posicao_nome[chaves[bits][p]] for p in ordenadas)))
+
+    texto = bytearray()
+    deslocamentos = array("I", [0])
+    for nome in nomes:
+        texto += nome.encode("utf-8")
+        deslocamentos.append(len(texto))
+
+    os.makedirs(os.path.dirname(os.path.abspath(destino)), exist_ok=True)
+    temporario = destino + ".tmp"
+    with open(temporario, "wb") as f:
+        f.write(fabricantes.CABECALHO.pack(fabricantes.MAGICO, *(len(c) for c in secoes_chaves), len(nomes)))
+        for secao in secoes_chaves + secoes_nomes + [deslocamentos]:
+            f.write(secao.tobytes())
+        f.write(texto)
+    os.replace(temporario, destino)
+
+    return {bits: len(chaves[bits]) for bits in chaves}, len(nomes)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importa os registros OUI do IEEE para o índice local.")
+    parser.add_argument("arquivos", nargs="+", help="CSVs do IEEE (oui.csv, mam.csv, oui36.csv)")
+    parser.add_argument("-o", "--saida", default=config.ARQUIVO_OUI, help="arquivo de índice gerado")
+    args = parser.parse_args()
+
+    totais, n_nomes = gerar_indice(args.arquivos, args.saida)
+    print(f"Índice gravado em {args.saida}: "
+          f"{totais[24]} MA-L, {totais[28]} MA-M, {totais[36]} MA-S, {n_nomes} fabricantes")
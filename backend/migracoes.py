@@ -0,0 +1,395 @@
+# Migrações versionadas do esquema do banco.
+#
+# A versão aplicada fica em PRAGMA user_version. Na primeira conexão de cada
+# processo, banco.py chama aplicar(), que executa em ordem as migrações ainda
+# não aplicadas, cada uma em sua própria transação (BEGIN IMMEDIATE, para que
+# dois processos iniciando juntos não migrem ao mesmo tempo). Toda migração é
+# idempotente: pode rodar sobre um banco que já tenha parte das mudanças.
+
+
+# Verifica se a tabela já possui a coluna
+def _coluna_existe(conn, tabela, coluna):
+    return any(linha[1] == coluna for linha in conn.execute(f"PRAGMA table_xinfo({tabela})"))
+
+
+# Expressão SQL que converte o IP textual (a.b.c.d) em inteiro de 32 bits
+def _expressao_ip_numerico(coluna):
+    r1 = f"substr({coluna}, instr({coluna}, '.') + 1)"
+    r2 = f"substr({r1}, instr({r1}, '.') + 1)"
+    r3 = f"substr({r2}, instr({r2}, '.') + 1)"
+    return (
+        f"CASE WHEN {coluna} GLOB '[0-9]*.[0-9]*.[0-9]*.[0-9]*' THEN "
+        f"CAST({coluna} AS INTEGER) * 16777216 + CAST({r1} AS INTEGER) * 65536 + "
+        f"CAST({r2} AS INTEGER) * 256 + CAST({r3} AS INTEGER) END"
+    )
+
+
+# Linhas lidas por vez nas migrações que copiam dados entre tabelas
+LOTE_MIGRACAO = 5000
+
+
+# ==== MIGRAÇÕES ====
+
+# 1: esquema base (antes só existia no arquivo .db) e tabelas de cache
+def _m001_esquema_base(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS dispositivos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ip TEXT NOT NULL,
+            mac TEXT NOT NULL UNIQUE,
+            hostname TEXT,
+            fabricante TEXT,
+            tipo TEXT,
+            ultima_verificacao DATETIME DEFAULT CURRENT_TIMESTAMP,
+            online INTEGER CHECK (online IN (0,1))
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS trafego (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            dispositivo_id INTEGER NOT NULL,
+            download_mb REAL CHECK (download_mb >= 0) NOT NULL,
+            upload_mb REAL CHECK (upload_mb >= 0) NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (dispositivo_id) REFERENCES dispositivos(id) ON DELETE CASCADE
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sessoes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            dispositivo_id INTEGER NOT NULL,
+            inicio DATETIME NOT NULL,
+            fim DATETIME DEFAULT NULL,
+            download_inicial REAL CHECK (download_inicial >= 0) NOT NULL,
+            upload_inicial REAL CHECK (upload_inicial >= 0) NOT NULL,
+            download_final REAL CHECK (download_final >= 0) NOT NULL,
+            upload_final REAL CHECK (upload_final >= 0) NOT NULL,
+            FOREIGN KEY (dispositivo_id) REFERENCES dispositivos(id) ON DELETE CASCADE
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS velocidade (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            dispositivo_id INTEGER NOT NULL,
+            ping_ms REAL CHECK (ping_ms >= 0) NOT NULL,
+            download_mb REAL CHECK (download_mb >= 0) NOT NULL,
+            upload_mb REAL CHECK (upload_mb >= 0) NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (dispositivo_id) REFERENCES dispositivos(id) ON DELETE CASCADE
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS cache_hostnames (
+            ip TEXT PRIMARY KEY,
+            hostname TEXT,
+            expira_em REAL NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS cache_fabricantes (
+            oui TEXT PRIMARY KEY,
+            fabricante TEXT,
+            expira_em REAL NOT NULL
+        )
+    """)
+
+
+# 2: índices das consultas de histórico e de dispositivos
+def _m002_indices_consultas(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_dispositivos_ip ON dispositivos (ip)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_trafego_dispositivo_timestamp ON trafego (dispositivo_id, timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_velocidade_dispositivo_timestamp ON velocidade (dispositivo_id, timestamp)")
+    # Sessão aberta de um dispositivo: índice parcial só com as sessões sem fim
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sessoes_abertas ON sessoes (dispositivo_id) WHERE fim IS NULL")
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_sessoes_encerradas ON sessoes (dispositivo_id, inicio)
+        WHERE fim IS NOT NULL
+    """)
+
+
+# 3: IP numérico (coluna gerada) para que filtros de sub-rede virem buscas por intervalo
+def _m003_ip_numerico(conn):
+    if not _coluna_existe(conn, "dispositivos", "ip_num"):
+        conn.execute(
+            f"ALTER TABLE dispositivos ADD COLUMN ip_num INTEGER "
+            f"GENERATED ALWAYS AS ({_expressao_ip_numerico('ip')}) VIRTUAL"
+        )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_dispositivos_ip_num ON dispositivos (ip_num)")
+
+
+# 4: série temporal do tráfego (blocos codificados em delta e agregados por nível)
+def _m004_serie_trafego(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS trafego_blocos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            dispositivo_id INTEGER NOT NULL,
+            inicio INTEGER NOT NULL,
+            fim INTEGER NOT NULL,
+            amostras INTEGER NOT NULL,
+            dados BLOB NOT NULL,
+            ultimo_download INTEGER NOT NULL,
+            ultimo_upload INTEGER NOT NULL,
+            FOREIGN KEY (dispositivo_id) REFERENCES dispositivos(id) ON DELETE CASCADE
+        )
+    """)
+    conn.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_trafego_blocos_dispositivo_inicio
+        ON trafego_blocos (dispositivo_id, inicio)
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_trafego_blocos_fim ON trafego_blocos (fim)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS trafego_agregados (
+            dispositivo_id INTEGER NOT NULL,
+            nivel INTEGER NOT NULL,
+            balde INTEGER NOT NULL,
+            download_bytes INTEGER NOT NULL CHECK (download_bytes >= 0),
+            upload_bytes INTEGER NOT NULL CHECK (upload_bytes >= 0),
+            amostras INTEGER NOT NULL,
+            download_total INTEGER NOT NULL,
+            upload_total INTEGER NOT NULL,
+            PRIMARY KEY (dispositivo_id, nivel, balde)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_trafego_agregados_nivel_balde ON trafego_agregados (nivel, balde)")
+
+
+# 5: copia o histórico antigo da tabela trafego (MB cumulativos) para a série temporal,
+# um dispositivo por vez e em lotes de LOTE_MIGRACAO linhas, sem carregar a tabela inteira
+def _m005_importar_trafego(conn):
+    import serie_temporal
+    from datetime import datetime
+
+    # Séries já existentes não são reimportadas
+    importados = {linha[0] for linha in conn.execute("SELECT DISTINCT dispositivo_id FROM trafego_blocos")}
+    dispositivos = [linha[0] for linha in conn.execute("SELECT DISTINCT dispositivo_id FROM trafego")]
+    for dispositivo_id in dispositivos:
+        if dispositivo_id in importados:
+            continue
+        cursor = conn.execute("""
+            SELECT download_mb, upload_mb, timestamp FROM trafego
+            WHERE dispositivo_id = ? ORDER BY timestamp
+        """, (dispositivo_id,))
+        while True:
+            linhas = cursor.fetchmany(LOTE_MIGRACAO)
+            if not linhas:
+                break
+            amostras = []
+            for download_mb, upload_mb, timestamp in linhas:
+                try:
+                    ts = int(datetime.strptime(str(timestamp)[:19], "%Y-%m-%d %H:%M:%S").timestamp())
+                except ValueError:
+                    continue
+                amostras.append((ts, int(download_mb * 1024 * 1024), int(upload_mb * 1024 * 1024)))
+            serie_temporal.gravar(conn, dispositivo_id, amostras)
+
+
+# 6: índices da paginação por chave (o desempate por id vem do rowid, presente em todo índice)
+def _m006_indices_paginacao(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sessoes_encerradas_inicio ON sessoes (inicio) WHERE fim IS NOT NULL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_dispositivos_ultima_verificacao ON dispositivos (ultima_verificacao)")
+
+
+# 7: índice para as exclusões de sessões por dispositivo (os índices parciais não cobrem todas)
+def _m007_indice_sessoes_dispositivo(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sessoes_dispositivo ON sessoes (dispositivo_id)")
+
+
+# 8: vacuum incremental. Num banco novo, auto_vacuum = INCREMENTAL é definido na conexão
+# (banco.py) antes da primeira tabela. Num banco existente a mudança exige um VACUUM completo, que
+# reescreve o arquivo inteiro com a trava exclusiva; por isso ela não roda aqui, e sim como
+# manutenção opcional: python retencao.py --ativar-vacuo-incremental
+def _m008_vacuo_incremental(conn):
+    pass
+
+
+# 9: uso de cada sessão gravado na própria linha e resumo diário por dispositivo.
+# O uso da sessão é atribuído ao dia em que ela começou.
+def _m009_resumo_sessoes(conn):
+    for coluna in ("download_usado_mb", "upload_usado_mb"):
+        if not _coluna_existe(conn, "sessoes", coluna):
+            conn.execute(f"ALTER TABLE sessoes ADD COLUMN {coluna} REAL")
+    conn.execute("""
+        UPDATE sessoes
+        SET download_usado_mb = ROUND(download_final - download_inicial, 2),
+            upload_usado_mb = ROUND(upload_final - upload_inicial, 2)
+        WHERE fim IS NOT NULL AND download_usado_mb IS NULL
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS uso_diario (
+            dispositivo_id INTEGER NOT NULL,
+            dia TEXT NOT NULL,
+            sessoes INTEGER NOT NULL DEFAULT 0,
+            download_mb REAL NOT NULL DEFAULT 0,
+            upload_mb REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (dispositivo_id, dia)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_uso_diario_dia ON uso_diario (dia)")
+    conn.execute("DELETE FROM uso_diario")
+    conn.execute("""
+        INSERT INTO uso_diario (dispositivo_id, dia, sessoes, download_mb, upload_mb)
+        SELECT dispositivo_id, date(inicio), COUNT(*),
+               ROUND(SUM(download_usado_mb), 2), ROUND(SUM(upload_usado_mb), 2)
+        FROM sessoes
+        WHERE fim IS NOT NULL
+        GROUP BY dispositivo_id, date(inicio)
+    """)
+
+
+# 10: contadores de alteração por tabela, incrementados por gatilhos a cada linha
+# inserida, alterada ou apagada (base do cache de respostas, ver cache_respostas.py)
+def _m010_versoes_tabelas(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS versoes (
+            tabela TEXT PRIMARY KEY,
+            versao INTEGER NOT NULL DEFAULT 0,
+            alterada_em REAL NOT NULL
+        ) WITHOUT ROWID
+    """)
+    agora = "(julianday('now') - 2440587.5) * 86400.0"
+    for tabela in ("dispositivos", "trafego", "trafego_blocos", "velocidade", "sessoes", "uso_diario"):
+        conn.execute(f"INSERT OR IGNORE INTO versoes (tabela, versao, alterada_em) VALUES (?, 0, {agora})",
+                     (tabela,))
+        for operacao in ("INSERT", "UPDATE", "DELETE"):
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS versao_{tabela}_{operacao.lower()}
+                AFTER {operacao} ON {tabela}
+                BEGIN
+                    UPDATE versoes SET versao = versao + 1, alterada_em = {agora} WHERE tabela = '{tabela}';
+                END
+            """)
+
+
+# 11: marcos da contabilidade por interface (ver contabilidade.py) e uso das sessões em bytes
+def _m011_contabilidade_bytes(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS contadores_interfaces (
+            interface TEXT PRIMARY KEY,
+            boot REAL NOT NULL,
+            bruto_recebidos INTEGER NOT NULL,
+            bruto_enviados INTEGER NOT NULL,
+            recebidos INTEGER NOT NULL,
+            enviados INTEGER NOT NULL,
+            reinicios INTEGER NOT NULL DEFAULT 0,
+            atualizado_em REAL
+        ) WITHOUT ROWID
+    """)
+    for coluna in ("download_inicial_bytes", "upload_inicial_bytes", "download_final_bytes", "upload_final_bytes"):
+        if not _coluna_existe(conn, "sessoes", coluna):
+            conn.execute(f"ALTER TABLE sessoes ADD COLUMN {coluna} INTEGER")
+    for coluna in ("download_bytes", "upload_bytes"):
+        if not _coluna_existe(conn, "uso_diario", coluna):
+            conn.execute(f"ALTER TABLE uso_diario ADD COLUMN {coluna} INTEGER NOT NULL DEFAULT 0")
+    conn.execute("""
+        UPDATE uso_diario
+        SET download_bytes = CAST(ROUND(download_mb * 1048576) AS INTEGER),
+            upload_bytes = CAST(ROUND(upload_mb * 1048576) AS INTEGER)
+        WHERE download_bytes = 0 AND upload_bytes = 0
+    """)
+
+
+# 12: arquivos de captura (pcap/pcapng) importados e o total de cada dispositivo em cada um
+def _m012_capturas(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS capturas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            caminho TEXT NOT NULL,
+            tamanho INTEGER NOT NULL,
+            modificado_em REAL NOT NULL,
+            formato TEXT NOT NULL,
+            pacotes INTEGER NOT NULL,
+            pacotes_ignorados INTEGER NOT NULL,
+            bytes INTEGER NOT NULL,
+            inicio REAL,
+            fim REAL,
+            importada_em REAL NOT NULL,
+            UNIQUE (caminho, tamanho, modificado_em)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS capturas_dispositivos (
+            captura_id INTEGER NOT NULL,
+            dispositivo_id INTEGER NOT NULL,
+            pacotes_recebidos INTEGER NOT NULL,
+            pacotes_enviados INTEGER NOT NULL,
+            bytes_recebidos INTEGER NOT NULL,
+            bytes_enviados INTEGER NOT NULL,
+            PRIMARY KEY (captura_id, dispositivo_id),
+            FOREIGN KEY (captura_id) REFERENCES capturas(id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+    """)
+
+
+# 13: sessões nomeadas e etiquetadas, várias abertas ao mesmo tempo por dispositivo.
+# Só pode haver uma sessão aberta com cada nome ("" é a sessão sem nome) em cada dispositivo.
+def _m013_sessoes_nomeadas(conn):
+    if not _coluna_existe(conn, "sessoes", "nome"):
+        conn.execute("ALTER TABLE sessoes ADD COLUMN nome TEXT NOT NULL DEFAULT ''")
+    if not _coluna_existe(conn, "sessoes", "tag"):
+        conn.execute("ALTER TABLE sessoes ADD COLUMN tag TEXT")
+    # Sessões abertas repetidas de um dispositivo nunca seriam encerradas (o encerramento
+    # sempre pegava a mais recente): são fechadas no próprio início, sem uso
+    conn.execute("""
+        UPDATE sessoes
+        SET fim = inicio, download_final = download_inicial, upload_final = upload_inicial,
+            download_final_bytes = download_inicial_bytes, upload_final_bytes = upload_inicial_bytes,
+            download_usado_mb = 0, upload_usado_mb = 0
+        WHERE fim IS NULL AND id NOT IN (
+            SELECT MAX(id) FROM sessoes WHERE fim IS NULL GROUP BY dispositivo_id, nome
+        )
+    """)
+    # Substitui o índice parcial da migração 2 (só por dispositivo) por um único com o nome
+    conn.execute("DROP INDEX IF EXISTS idx_sessoes_abertas")
+    conn.execute("CREATE UNIQUE INDEX idx_sessoes_abertas ON sessoes (dispositivo_id, nome) WHERE fim IS NULL")
+
+
+# Lista ordenada: (versão, descrição, função[, transacional]). Migrações não
+# transacionais rodam fora de BEGIN e precisam ser idempotentes.
+MIGRACOES = [
+    (1, "esquema base e tabelas de cache", _m001_esquema_base),
+    (2, "índices das consultas de histórico", _m002_indices_consultas),
+    (3, "coluna ip_num para filtros de sub-rede", _m003_ip_numerico),
+    (4, "série temporal do tráfego", _m004_serie_trafego),
+    (5, "importação do histórico de tráfego para a série", _m005_importar_trafego),
+    (6, "índices da paginação por chave", _m006_indices_paginacao),
+    (7, "índice de sessões por dispositivo", _m007_indice_sessoes_dispositivo),
+    (8, "vacuum incremental", _m008_vacuo_incremental),
+    (9, "uso por sessão e resumo diário", _m009_resumo_sessoes),
+    (10, "contadores de alteração por tabela", _m010_versoes_tabelas),
+    (11, "contabilidade de bytes por interface", _m011_contabilidade_bytes),
+    (12, "importação de capturas de pacotes", _m012_capturas),
+    (13, "sessões nomeadas simultâneas", _m013_sessoes_nomeadas),
+]
+
+
+# Retorna a versão do esquema gravada no banco
+def versao_atual(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+# Aplica, em ordem, as migrações com versão maior que a atual
+def aplicar(conn):
+    if conn.in_transaction:
+        conn.commit()
+    for versao, descricao, migracao, *opcoes in MIGRACOES:
+        if versao <= versao_atual(conn):
+            continue
+        if opcoes and not opcoes[0]:
+            migracao(conn)
+            conn.execute(f"PRAGMA user_version = {int(versao)}")
+            print(f"[INFO] Migração {versao} aplicada: {descricao}")
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Outro processo pode ter aplicado a migração enquanto esperávamos a trava
+            if versao_atual(conn) >= versao:
+                conn.rollback()
+                continue
+            migracao(conn)
+            conn.execute(f"PRAGMA user_version = {int(versao)}")
+            conn.commit()
+            print(f"[INFO] Migração {versao} aplicada: {descricao}")
+        except BaseException:
+            conn.rollback()
+            raise
+    return versao_atual(conn)
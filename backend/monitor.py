@@ -1,31 +1,38 @@
-# Importa o módulo nmap para escaneamento de rede
-import nmap
+# Camada compartilhada de acesso ao banco SQLite
+import banco
 
-# Módulo para interação com banco de dados SQLite
-import sqlite3
+# Manipulação de endereços e redes IP (CIDR)
+import ipaddress
 
-# Permite execução de comandos do sistema (usado para acessar ARP)
-import subprocess
+# Manipulação de data e hora
+from datetime import datetime, timedelta
 
-# Expressões regulares, útil para filtrar MAC address
-import re
+# Planejador da varredura (redes reais das interfaces, divididas em fatias paralelas)
+import planejador
 
-# Usado para operações de rede como hostname e IP
-import socket
+# Resolvedor de DNS reverso concorrente com cache
+import resolvedor
 
-# Usado para obter informações sobre as interfaces de rede
-import psutil
+# Instantâneo da tabela de vizinhos (IP -> MAC) do sistema
+import vizinhanca
 
-# Manipulação de data e hora
-from datetime import datetime, timedelta
+# Base offline de fabricantes (registros OUI do IEEE)
+import fabricantes
+
+# Cache da consulta remota de fabricantes, resolvida em segundo plano
+import cache_fabricantes
 
-# Requisições HTTP (usado para buscar fabricante por API)
-import requests
+# Configurações do backend
+import config
 
-# Caminho do banco de dados SQLite
-DB_PATH = "monitoramento.db"
+# Identidade da máquina local (IP, MAC, hostname e interface) em cache
+import identidade
 
-# Dicionário com prefixos de MAC (OUI), fabricantes e tipo de dispositivo
+# Exclusão em lotes (transações curtas) do subsistema de retenção
+import retencao
+
+# Dicionário com prefixos de MAC (OUI), fabricantes e tipo de dispositivo;
+# tem prioridade sobre a base do IEEE por trazer tipos mais específicos
 FABRICANTES = {
     "00:1E:65": ("Dell", "PC"),
     "F0:79:59": ("Lenovo", "PC"),
@@ -51,16 +58,11 @@ FABRICANTES = {
     "F4:F2:6D": ("LG", "Smart TV")
 }
 
-# Consulta API pública para obter fabricante a partir do MAC
+# Consulta API pública para obter fabricante a partir do MAC (bloqueante, com cache por OUI)
 def buscar_fabricante_por_api(mac):
-    try:
-        url = f"https://api.macvendors.com/{mac}"
-        response = requests.get(url, timeout=5)
-        if response.status_code == 200:
-            fabricante = response.text.strip()
-            return fabricante
-    except Exception as e:
-        print(f"[Erro API fabricante]: {e}")
+    fabricante = cache_fabricantes.resolver(mac)
+    if fabricante and fabricante != cache_fabricantes.PENDENTE:
+        return fabricante
     return "Desconhecido"
 
 # Identifica fabricante e tipo de dispositivo a partir do MAC address
@@ -75,130 +77,144 @@ def identificar_fabricante(mac):
     if prefixo in FABRICANTES:
         return FABRICANTES[prefixo]
 
-    # Caso contrário, tenta buscar pela API
-    fabricante = buscar_fabricante_por_api(mac_formatado)
-    if fabricante != "Desconhecido":
-        return (fabricante, "Desconhecido")
+    # Caso contrário, consulta a base offline do IEEE (sem acesso à rede)
+    fabricante = fabricantes.buscar_fabricante(mac_formatado)
+    if fabricante:
+        return (fabricante, fabricantes.tipo_por_fabricante(fabricante))
+
+    # Por fim, o cache da API remota; OUIs novos ficam "Pendente" e são resolvidos em segundo plano
+    fabricante = cache_fabricantes.consultar(mac_formatado)
+    if fabricante == cache_fabricantes.PENDENTE:
+        return (cache_fabricantes.PENDENTE, "Desconhecido")
+    if fabricante:
+        return (fabricante, fabricantes.tipo_por_fabricante(fabricante))
 
     return ("Desconhecido", "Desconhecido")
 
 # Retorna o MAC address da interface de rede da própria máquina
 def obter_mac_real_da_maquina():
-    ip_local = obter_ip_local()
-    for interface, addrs in psutil.net_if_addrs().items():
-        for addr in addrs:
-            if addr.family == socket.AF_INET and addr.address == ip_local:
-                for addr in addrs:
-                    if hasattr(psutil, 'AF_LINK') and addr.family == psutil.AF_LINK:
-                        return addr.address.upper().replace("-", ":")
-                    elif hasattr(socket, 'AF_PACKET') and addr.family == socket.AF_PACKET:
-                        return addr.address.upper().replace("-", ":")
-    return "Desconhecido"
+    return identidade.mac_local() or "Desconhecido"
 
-# Obtém o MAC address de um IP da rede via tabela ARP
+# Obtém o MAC address de um IP da rede via instantâneo da tabela de vizinhos
 def obter_mac_via_arp(ip_alvo):
-    try:
-        output = subprocess.check_output("arp -a", shell=True).decode(errors="ignore")
-        for linha in output.splitlines():
-            if ip_alvo in linha:
-                match = re.search(r"([0-9A-Fa-f]{2}[-:]){5}[0-9A-Fa-f]{2}", linha)
-                if match:
-                    mac = match.group(0).upper().replace("-", ":")
-                    return mac
-    except subprocess.SubprocessError as e:
-        print(f"[ERRO] Falha ao executar comando ARP: {e}")
-    except Exception as e:
-        print(f"[ERRO] Erro inesperado ao obter MAC via ARP: {e}")
-    return "Desconhecido"
+    return vizinhanca.obter_mac(ip_alvo) or "Desconhecido"
 
-# Retorna o IP local da máquina
+# Retorna o IP local da máquina (identidade compartilhada, recalculada só quando as interfaces mudam)
 def obter_ip_local():
-    try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        ip = s.getsockname()[0]
-        s.close()
-        return ip
-    except Exception:
-        return None
-
-# Tenta obter o nome da máquina (hostname) pelo IP
+    return identidade.ip_local()
+
+# Tenta obter o nome da máquina (hostname) pelo IP, usando o cache do resolvedor
 def obter_hostname(ip):
-    try:
-        return socket.gethostbyaddr(ip)[0]
-    except socket.herror:
-        return "Desconhecido"
+    return resolvedor.resolver(ip)
 
-# Retorna o range de IP da rede (ex: 192.168.1.0/24)
+# Retorna a rede da interface do IP local com a máscara real (ex: 192.168.0.0/22)
 def obter_faixa_ip():
-    try:
-        ip_local = obter_ip_local()
-        return "".join(ip_local.rsplit(".", 1)[0]) + ".0/24"
-    except Exception:
-        return "192.168.0.0/24"
+    ip_local = obter_ip_local()
+    for rede in planejador.obter_redes_locais(interfaces=[]):
+        if ip_local and ipaddress.ip_address(ip_local) in rede:
+            return str(rede)
+    return "192.168.0.0/24"
+
+# Grava o lote da varredura em uma única transação: upsert em massa a partir de uma
+# tabela temporária (pulando linhas sem mudança e verificadas há pouco) e marcação
+# dos ausentes como offline por junção, em vez de uma lista NOT IN gigante
+def salvar_varredura(dispositivos):
+    if not dispositivos:
+        return
+
+    agora = datetime.now()
+    timestamp = agora.strftime("%Y-%m-%d %H:%M:%S")
+    limite_verificacao = (agora - timedelta(seconds=config.INTERVALO_MINIMO_VERIFICACAO)).strftime("%Y-%m-%d %H:%M:%S")
+
+    with banco.transacao(imediata=True) as conn:
+        conn.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS varredura_atual (
+                mac TEXT PRIMARY KEY,
+                ip TEXT NOT NULL,
+                hostname TEXT,
+                fabricante TEXT,
+                tipo TEXT
+            )
+        """)
+        conn.execute("DELETE FROM temp.varredura_atual")
+        conn.executemany("""
+            INSERT OR REPLACE INTO temp.varredura_atual (mac, ip, hostname, fabricante, tipo)
+            VALUES (:mac, :ip, :hostname, :fabricante, :tipo)
+        """, dispositivos)
+
+        # Um fabricante "Pendente" nunca sobrescreve um já conhecido
+        conn.execute("""
+            INSERT INTO dispositivos (ip, mac, online, ultima_verificacao, fabricante, tipo, hostname)
+            SELECT ip, mac, 1, :timestamp, fabricante, tipo, hostname FROM temp.varredura_atual WHERE true
+            ON CONFLICT(mac) DO UPDATE SET
+                ip = excluded.ip,
+                hostname = excluded.hostname,
+                fabricante = CASE WHEN excluded.fabricante = :pendente THEN dispositivos.fabricante
+                                  ELSE excluded.fabricante END,
+                tipo = CASE WHEN excluded.fabricante = :pendente THEN dispositivos.tipo
+                            ELSE excluded.tipo END,
+                online = 1,
+                ultima_verificacao = excluded.ultima_verificacao
+            WHERE dispositivos.ip IS NOT excluded.ip
+               OR dispositivos.hostname IS NOT excluded.hostname
+               OR (excluded.fabricante <> :pendente AND (dispositivos.fabricante IS NOT excluded.fabricante
+                                                          OR dispositivos.tipo IS NOT excluded.tipo))
+               OR dispositivos.online IS NOT 1
+               OR dispositivos.ultima_verificacao IS NULL
+               OR dispositivos.ultima_verificacao < :limite
+        """, {"timestamp": timestamp, "pendente": cache_fabricantes.PENDENTE, "limite": limite_verificacao})
+
+        conn.execute("""
+            UPDATE dispositivos SET online = 0
+            WHERE online = 1
+              AND NOT EXISTS (SELECT 1 FROM temp.varredura_atual v WHERE v.mac = dispositivos.mac)
+        """)
 
 # Realiza escaneamento da rede, salva no banco e retorna os dispositivos
 def escanear_rede():
-    rede = obter_faixa_ip()
-    print(f"Escaneando rede: {rede}")
+    redes = planejador.planejar_redes()
+    print(f"Escaneando redes: {', '.join(map(str, redes))}")
 
-    scanner = nmap.PortScanner()
-    scanner.scan(hosts=rede, arguments="-sn")
-
-    dispositivos = []
-    macs_detectados = set()
     ip_local = obter_ip_local()
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
 
-    for ip in scanner.all_hosts():
-        hostname = obter_hostname(ip)
+    # Cada host é processado assim que responde, enquanto a varredura continua;
+    # a resolução do hostname começa em segundo plano no mesmo instante
+    encontrados = []
+    vizinhanca.recarregar()
+    for ip, mac in planejador.varrer_plano(redes):
+        resolvedor.antecipar(ip)
 
         if ip == ip_local:
             mac = obter_mac_real_da_maquina()
-        else:
-            mac = scanner[ip]['addresses'].get('mac', 'Desconhecido')
-            if mac == 'Desconhecido':
-                mac = obter_mac_via_arp(ip)
+        elif not mac:
+            mac = obter_mac_via_arp(ip)
 
-        macs_detectados.add(mac)
+        encontrados.append((ip, mac))
 
-        fabricante, tipo = identificar_fabricante(mac)
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-        cursor.execute("SELECT id FROM dispositivos WHERE mac = ?", (mac,))
-        if cursor.fetchone():
-            cursor.execute("""
-                UPDATE dispositivos SET ip=?, hostname=?, fabricante=?, tipo=?, ultima_verificacao=?, online=1
-                WHERE mac=?
-            """, (ip, hostname, fabricante, tipo, timestamp, mac))
-        else:
-            cursor.execute("""
-                INSERT INTO dispositivos (ip, mac, online, ultima_verificacao, fabricante, tipo, hostname)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (ip, mac, 1, timestamp, fabricante, tipo, hostname))
+    hostnames = resolvedor.resolver_varios([ip for ip, _ in encontrados])
 
+    dispositivos = []
+    for ip, mac in encontrados:
+        fabricante, tipo = identificar_fabricante(mac)
         dispositivos.append({
             "ip": ip,
             "mac": mac,
-            "hostname": hostname,
+            "hostname": hostnames[ip],
             "fabricante": fabricante,
             "tipo": tipo,
             "online": True
         })
 
-    if macs_detectados:
-        placeholders = ','.join('?' for _ in macs_detectados)
-        cursor.execute(f"""
-            UPDATE dispositivos
-            SET online = 0
-            WHERE mac NOT IN ({placeholders})
-        """, tuple(macs_detectados))
-
-    conn.commit()
-    conn.close()
+    salvar_varredura(dispositivos)
     return dispositivos
 
+# Retorna o primeiro e o último IP (numéricos) da subrede do IP informado, com o prefixo
+# real da interface (/24 se nenhuma interface tiver o IP), para consultas por intervalo
+# na coluna indexada ip_num
+def intervalo_subrede(ip):
+    rede = planejador.rede_do_ip(ip) or ipaddress.ip_network(f"{ip}/24", strict=False)
+    return int(rede.network_address), int(rede.broadcast_address)
+
 # Lista os dispositivos salvos no banco que estão na mesma subrede
 def listar_dispositivos_mesma_rede():
     ip_local = obter_ip_local()
@@ -206,62 +222,59 @@ def listar_dispositivos_mesma_rede():
         print("IP local não encontrado.")
         return []
 
-    subrede = ".".join(ip_local.split('.')[:3])
+    inicio, fim = intervalo_subrede(ip_local)
     agora = datetime.now()
 
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        SELECT id, ip, mac, hostname, fabricante, tipo, ultima_verificacao, online
-        FROM dispositivos
-        WHERE ip LIKE ?
-    """, (f"{subrede}.%",))
-
-    dispositivos = []
-    for row in cursor.fetchall():
-        dispositivo_id = row[0]
-        ultima_verificacao_str = row[6]
-        online = bool(row[7])
-
-        try:
-            ultima_verificacao_dt = datetime.strptime(ultima_verificacao_str, "%Y-%m-%d %H:%M:%S")
-        except ValueError:
-            ultima_verificacao_dt = agora - timedelta(minutes=5)
-
-        if abs((agora - ultima_verificacao_dt).total_seconds()) > 300 and online:
-            cursor.execute("UPDATE dispositivos SET online = 0 WHERE id = ?", (dispositivo_id,))
-            online = False
-
-        dispositivos.append({
-            "ip": row[1],
-            "mac": row[2],
-            "hostname": row[3],
-            "fabricante": row[4],
-            "tipo": row[5],
-            "ultima_verificacao": row[6],
-            "online": online
-        })
+    with banco.transacao() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            SELECT id, ip, mac, hostname, fabricante, tipo, ultima_verificacao, online
+            FROM dispositivos
+            WHERE ip_num BETWEEN ? AND ?
+        """, (inicio, fim))
+
+        dispositivos = []
+        for row in cursor.fetchall():
+            dispositivo_id = row[0]
+            ultima_verificacao_str = row[6]
+            online = bool(row[7])
+
+            try:
+                ultima_verificacao_dt = datetime.strptime(ultima_verificacao_str, "%Y-%m-%d %H:%M:%S")
+            except ValueError:
+                ultima_verificacao_dt = agora - timedelta(minutes=5)
+
+            # Com o motor de presença ativo, o estado online já é mantido por ele
+            if not config.PRESENCA_ATIVA and online and \
+                    abs((agora - ultima_verificacao_dt).total_seconds()) > config.JANELA_PRESENCA:
+                cursor.execute("UPDATE dispositivos SET online = 0 WHERE id = ?", (dispositivo_id,))
+                online = False
+
+            dispositivos.append({
+                "ip": row[1],
+                "mac": row[2],
+                "hostname": row[3],
+                "fabricante": row[4],
+                "tipo": row[5],
+                "ultima_verificacao": row[6],
+                "online": online
+            })
 
-    conn.commit()
-    conn.close()
     return dispositivos
 
-# Remove do banco os dispositivos da mesma subrede
+# Remove do banco os dispositivos da mesma subrede, em lotes
 def deletar_dispositivos_mesma_rede():
     ip_local = obter_ip_local()
     if not ip_local:
         print("IP local não encontrado.")
         return False
 
-    subrede = ".".join(ip_local.split('.')[:3])
+    inicio, fim = intervalo_subrede(ip_local)
 
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM dispositivos WHERE ip LIKE ?", (f"{subrede}.%",))
-            conn.commit()
-            return True
+        retencao.apagar_em_lotes("dispositivos", "ip_num BETWEEN ? AND ?", (inicio, fim))
+        return True
     except Exception as e:
         print("Erro ao deletar dispositivos:", e)
         return False
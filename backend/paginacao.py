@@ -0,0 +1,106 @@
+# Paginação por chave (keyset) e filtros de intervalo de tempo das rotas de histórico.
+#
+# Cada página termina com um cursor opaco que codifica a chave de ordenação da
+# última linha entregue (por exemplo, timestamp e id). A página seguinte é
+# buscada com "(chave) < (cursor) ORDER BY chave DESC LIMIT n" sobre um
+# índice, então o custo de uma página não depende do tamanho do histórico.
+import base64
+import binascii
+import json
+from datetime import datetime
+
+import config
+
+# Formato das datas gravadas em texto no banco
+FORMATO_DATA = "%Y-%m-%d %H:%M:%S"
+
+
+# Converte um parâmetro de tempo (epoch em segundos ou data ISO) em epoch; None se ausente
+def ler_instante(valor):
+    if valor in (None, ""):
+        return None
+    try:
+        return float(valor)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(valor).timestamp()
+    except ValueError:
+        raise ValueError(f"Instante inválido: {valor}")
+
+
+# Converte um epoch para o formato de data usado nas colunas de texto
+def instante_texto(epoch):
+    return datetime.fromtimestamp(epoch).strftime(FORMATO_DATA)
+
+
+# Codifica a chave da última linha em um cursor opaco (base64 de uma lista JSON)
+def codificar_cursor(chave):
+    dados = json.dumps(list(chave), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(dados).decode().rstrip("=")
+
+
+# Decodifica um cursor gerado por codificar_cursor
+def decodificar_cursor(cursor):
+    try:
+        dados = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        chave = json.loads(dados)
+    except (binascii.Error, ValueError):
+        raise ValueError("Cursor inválido")
+    if not isinstance(chave, list) or not chave:
+        raise ValueError("Cursor inválido")
+    return chave
+
+
+class Pagina:
+    """Parâmetros de uma página: intervalo de tempo (epoch), tamanho e cursor."""
+
+    def __init__(self, inicio=None, fim=None, limite=None, cursor=None):
+        self.inicio = inicio
+        self.fim = fim
+        self.limite = max(1, min(limite or config.LIMITE_PAGINA, config.LIMITE_MAXIMO_PAGINA))
+        self.cursor = decodificar_cursor(cursor) if cursor else None
+
+    # Monta os filtros SQL de intervalo e de cursor para a ordenação "chave DESC".
+    # coluna_tempo guarda datas em texto; colunas_chave termina com uma coluna única (id).
+    def condicoes(self, coluna_tempo, colunas_chave):
+        condicoes, parametros = [], []
+        if self.inicio is not None:
+            condicoes.append(f"{coluna_tempo} >= ?")
+            parametros.append(instante_texto(self.inicio))
+        if self.fim is not None:
+            condicoes.append(f"{coluna_tempo} <= ?")
+            parametros.append(instante_texto(self.fim))
+        if self.cursor is not None:
+            if len(self.cursor) != len(colunas_chave):
+                raise ValueError("Cursor inválido")
+            marcadores = ", ".join("?" * len(colunas_chave))
+            condicoes.append(f"({', '.join(colunas_chave)}) < ({marcadores})")
+            parametros.extend(self.cursor)
+        return condicoes, parametros
+
+    # Recebe até limite + 1 itens e retorna (itens da página, cursor da próxima ou None)
+    def fatiar(self, itens, chave):
+        itens = list(itens)
+        if len(itens) <= self.limite:
+            return itens, None
+        itens = itens[:self.limite]
+        return itens, codificar_cursor(chave(itens[-1]))
+
+
+# Lê "from", "to", "limit" e "cursor" dos parâmetros da requisição; ValueError se inválidos
+def ler_pagina(args):
+    limite = args.get("limit")
+    if limite not in (None, ""):
+        try:
+            limite = int(limite)
+        except ValueError:
+            raise ValueError(f"Limite inválido: {limite}")
+        if limite < 1:
+            raise ValueError(f"Limite inválido: {limite}")
+    return Pagina(
+        inicio=ler_instante(args.get("from")),
+        fim=ler_instante(args.get("to")),
+        limite=limite or None,
+        cursor=args.get("cursor") or None,
+    )
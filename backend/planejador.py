@@ -0,0 +1,135 @@
+# Planejador de varreduras: descobre as redes reais das interfaces locais,
+# divide faixas grandes em fatias e varre as fatias em workers paralelos.
+import ipaddress
+import queue
+import socket
+from concurrent.futures import ThreadPoolExecutor
+
+import psutil
+
+import config
+import descoberta
+
+# Marca de fim de uma fatia na fila de resultados
+_FATIA_CONCLUIDA = object()
+
+
+# Retorna as redes IPv4 (com a máscara real) de cada interface ativa
+def obter_redes_locais(interfaces=None):
+    interfaces = interfaces if interfaces is not None else config.INTERFACES_VARREDURA
+    estados = psutil.net_if_stats()
+    redes = []
+
+    for interface, addrs in psutil.net_if_addrs().items():
+        if interfaces and interface not in interfaces:
+            continue
+        if interface in estados and not estados[interface].isup:
+            continue
+        for addr in addrs:
+            if addr.family != socket.AF_INET or not addr.netmask:
+                continue
+            try:
+                rede = ipaddress.ip_network(f"{addr.address}/{addr.netmask}", strict=False)
+            except ValueError:
+                continue
+            if rede.is_loopback or rede.is_link_local:
+                continue
+            rede = limitar_rede(rede, ipaddress.ip_address(addr.address))
+            if rede not in redes:
+                redes.append(rede)
+    return redes
+
+
+# Reduz redes maiores que PREFIXO_MINIMO à sub-rede que contém o IP de referência
+def limitar_rede(rede, ip_referencia=None):
+    if rede.prefixlen >= config.PREFIXO_MINIMO:
+        return rede
+    base = ip_referencia or rede.network_address
+    reduzida = ipaddress.ip_network(f"{base}/{config.PREFIXO_MINIMO}", strict=False)
+    print(f"[AVISO] Rede {rede} é grande demais; varrendo apenas {reduzida}")
+    return reduzida
+
+
+# Retorna a rede (com a máscara real) da interface que tem o IP informado, reduzida a
+# PREFIXO_MINIMO como nas varreduras; None se nenhuma interface tiver esse IP
+def rede_do_ip(ip):
+    for addrs in psutil.net_if_addrs().values():
+        for addr in addrs:
+            if addr.family != socket.AF_INET or addr.address != ip or not addr.netmask:
+                continue
+            try:
+                rede = ipaddress.ip_network(f"{ip}/{addr.netmask}", strict=False)
+            except ValueError:
+                return None
+            if rede.prefixlen < config.PREFIXO_MINIMO:
+                rede = ipaddress.ip_network(f"{ip}/{config.PREFIXO_MINIMO}", strict=False)
+            return rede
+    return None
+
+
+# Define as redes a varrer: as configuradas em MONITOR_REDES ou as das interfaces
+def planejar_redes():
+    if config.REDES_VARREDURA:
+        redes = []
+        for cidr in config.REDES_VARREDURA:
+            try:
+                rede = limitar_rede(ipaddress.ip_network(cidr, strict=False))
+            except ValueError:
+                print(f"[AVISO] Rede configurada inválida ignorada: {cidr}")
+                continue
+            if rede not in redes:
+                redes.append(rede)
+        return redes
+    return obter_redes_locais()
+
+
+# Divide cada rede em fatias de tamanho PREFIXO_FATIA, eliminando sobreposições
+def dividir_em_fatias(redes, prefixo=None):
+    prefixo = prefixo or config.PREFIXO_FATIA
+    fatias = []
+    for rede in ipaddress.collapse_addresses(redes):
+        if rede.prefixlen >= prefixo:
+            fatias.append(rede)
+        else:
+            fatias.extend(rede.subnets(new_prefix=prefixo))
+    return fatias
+
+
+# Varre uma fatia e envia cada host encontrado para a fila compartilhada
+def _varrer_fatia(fatia, saida, concorrencia):
+    try:
+        for ip, mac in descoberta.varrer(str(fatia), concorrencia=concorrencia):
+            saida.put((ip, mac))
+    finally:
+        saida.put(_FATIA_CONCLUIDA)
+
+
+# Executa o plano: varre as fatias em paralelo e produz (ip, mac) à medida que chegam
+def varrer_plano(redes=None, workers=None):
+    redes = planejar_redes() if redes is None else redes
+    fatias = dividir_em_fatias(redes)
+    if not fatias:
+        return
+
+    workers = max(1, min(workers or config.WORKERS_VARREDURA, len(fatias)))
+    # O orçamento de sockets é dividido entre os workers para não esgotar os descritores
+    concorrencia = max(16, min(config.CONCORRENCIA_VARREDURA, descoberta.concorrencia_maxima() // workers))
+    print(f"[INFO] Varrendo {len(fatias)} fatia(s) de {', '.join(map(str, redes))} com {workers} worker(s)")
+
+    saida = queue.Queue()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="varredura") as executor:
+        for fatia in fatias:
+            executor.submit(_varrer_fatia, fatia, saida, concorrencia)
+
+        restantes = len(fatias)
+        while restantes:
+            item = saida.get()
+            if item is _FATIA_CONCLUIDA:
+                restantes -= 1
+                continue
+            yield item
+
+
+if __name__ == "__main__":
+    for rede in planejar_redes():
+        print(rede, "->", len(dividir_em_fatias([rede])), "fatia(s)")
@@ -0,0 +1,291 @@
+# Motor de presença incremental dos dispositivos conhecidos.
+#
+# Em vez de varrer a faixa inteira a cada consulta, cada dispositivo online é
+# sondado individualmente (ICMP/TCP/ARP) em intervalos que começam em
+# INTERVALO_PRESENCA_MIN e dobram, até INTERVALO_PRESENCA_MAX, enquanto ele
+# continua respondendo. Uma falha leva o dispositivo a "suspeito" (sondado de
+# novo no intervalo mínimo); FALHAS_PARA_OFFLINE falhas seguidas o levam a
+# "offline". Varreduras completas, que encontram dispositivos novos, só rodam
+# a cada INTERVALO_VARREDURA_COMPLETA segundos. Cada mudança de estado é
+# gravada no banco e repassada aos assinantes como um evento.
+import asyncio
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+import banco
+import config
+import descoberta
+import varreduras
+import vizinhanca
+
+# fcntl só existe em sistemas POSIX; sem ele, cada processo roda seu próprio motor
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+ONLINE = "online"
+SUSPEITO = "suspeito"
+OFFLINE = "offline"
+
+
+class EstadoDispositivo:
+    """Estado de presença de um dispositivo e agenda da próxima sonda."""
+
+    def __init__(self, mac, ip, estado=ONLINE):
+        self.mac = mac
+        self.ip = ip
+        self.estado = estado
+        self.intervalo = config.INTERVALO_PRESENCA_MIN
+        self.falhas = 0
+        self.proxima = time.monotonic()
+        self.visto_em = None
+
+    def para_dict(self):
+        return {
+            "mac": self.mac,
+            "ip": self.ip,
+            "estado": self.estado,
+            "falhas": self.falhas,
+            "intervalo_segundos": self.intervalo,
+            "visto_em": self.visto_em,
+        }
+
+
+_dispositivos = {}  # mac -> EstadoDispositivo
+_assinantes = []
+_lock = threading.Lock()
+_thread = None
+_parar = threading.Event()
+_arquivo_trava = None
+
+
+# ==== EVENTOS ====
+
+# Registra uma função chamada a cada transição com um dict {mac, ip, de, para, em}
+def assinar(callback):
+    with _lock:
+        _assinantes.append(callback)
+
+
+def cancelar_assinatura(callback):
+    with _lock:
+        if callback in _assinantes:
+            _assinantes.remove(callback)
+
+
+def _emitir(evento):
+    with _lock:
+        assinantes = list(_assinantes)
+    for callback in assinantes:
+        try:
+            callback(evento)
+        except Exception as e:
+            print(f"[ERRO] Assinante de presença falhou: {e}")
+
+
+# ==== MÁQUINA DE ESTADOS ====
+
+# Aplica o resultado de uma sonda; retorna o evento de transição ou None
+def _aplicar(dispositivo, respondeu, agora):
+    anterior = dispositivo.estado
+    if respondeu:
+        dispositivo.falhas = 0
+        dispositivo.visto_em = agora
+        if anterior == ONLINE:
+            dispositivo.intervalo = min(dispositivo.intervalo * 2, config.INTERVALO_PRESENCA_MAX)
+        else:
+            dispositivo.estado = ONLINE
+            dispositivo.intervalo = config.INTERVALO_PRESENCA_MIN
+    else:
+        dispositivo.falhas += 1
+        dispositivo.intervalo = config.INTERVALO_PRESENCA_MIN
+        if dispositivo.falhas >= config.FALHAS_PARA_OFFLINE:
+            dispositivo.estado = OFFLINE
+        else:
+            dispositivo.estado = SUSPEITO
+    dispositivo.proxima = time.monotonic() + dispositivo.intervalo
+
+    if dispositivo.estado == anterior:
+        return None
+    return {"mac": dispositivo.mac, "ip": dispositivo.ip, "de": anterior, "para": dispositivo.estado, "em": agora}
+
+
+# Grava no banco as transições e as confirmações de presença de um ciclo
+def _persistir(transicoes, confirmados):
+    if not transicoes and not confirmados:
+        return
+    agora = datetime.now()
+    timestamp = agora.strftime("%Y-%m-%d %H:%M:%S")
+    limite = (agora - timedelta(seconds=config.INTERVALO_MINIMO_VERIFICACAO)).strftime("%Y-%m-%d %H:%M:%S")
+    try:
+        with banco.transacao() as conn:
+            # "suspeito" continua online no banco até ser confirmado offline
+            conn.executemany(
+                "UPDATE dispositivos SET online = ? WHERE mac = ?",
+                [(0 if t["para"] == OFFLINE else 1, t["mac"]) for t in transicoes]
+            )
+            conn.executemany("""
+                UPDATE dispositivos SET ultima_verificacao = ?, online = 1
+                WHERE mac = ? AND (ultima_verificacao IS NULL OR ultima_verificacao < ? OR online = 0)
+            """, [(timestamp, mac, limite) for mac in confirmados])
+    except sqlite3.Error as e:
+        print(f"[ERRO] Falha ao gravar presença: {e}")
+
+
+# ==== SINCRONIZAÇÃO COM O BANCO E AS VARREDURAS ====
+
+# Carrega os dispositivos online do banco para o acompanhamento
+def carregar_do_banco():
+    try:
+        with banco.transacao() as conn:
+            linhas = conn.execute(
+                "SELECT mac, ip FROM dispositivos WHERE online = 1 AND mac <> 'Desconhecido'"
+            ).fetchall()
+    except sqlite3.Error as e:
+        print(f"[ERRO] Falha ao carregar dispositivos para presença: {e}")
+        return
+    with _lock:
+        for mac, ip in linhas:
+            if mac not in _dispositivos:
+                _dispositivos[mac] = EstadoDispositivo(mac, ip)
+
+
+# Incorpora o resultado de uma varredura completa (dispositivos encontrados = online)
+def registrar_varredura(encontrados):
+    agora = time.time()
+    transicoes = []
+    vistos = set()
+    with _lock:
+        for d in encontrados:
+            mac = d.get("mac")
+            if not mac or mac == "Desconhecido":
+                continue
+            vistos.add(mac)
+            dispositivo = _dispositivos.get(mac)
+            if dispositivo is None:
+                dispositivo = _dispositivos[mac] = EstadoDispositivo(mac, d["ip"], OFFLINE)
+            dispositivo.ip = d["ip"]
+            evento = _aplicar(dispositivo, True, agora)
+            if evento:
+                transicoes.append(evento)
+        # A varredura já marcou os ausentes como offline no banco
+        for mac, dispositivo in _dispositivos.items():
+            if mac not in vistos and dispositivo.estado != OFFLINE:
+                anterior = dispositivo.estado
+                dispositivo.estado = OFFLINE
+                dispositivo.falhas = config.FALHAS_PARA_OFFLINE
+                transicoes.append({"mac": mac, "ip": dispositivo.ip, "de": anterior, "para": OFFLINE, "em": agora})
+    for evento in transicoes:
+        _emitir(evento)
+
+
+# ==== CICLO DE SONDAGEM ====
+
+# Sonda em paralelo os dispositivos cuja próxima verificação já venceu
+async def _sondar_lote(lote):
+    semaforo = asyncio.Semaphore(config.CONCORRENCIA_VARREDURA)
+
+    async def sondar(dispositivo):
+        async with semaforo:
+            return await descoberta.sondar_host(dispositivo.ip)
+
+    return await asyncio.gather(*(sondar(d) for d in lote))
+
+
+def _ciclo():
+    agora_mono = time.monotonic()
+    with _lock:
+        lote = [d for d in _dispositivos.values() if d.estado != OFFLINE and d.proxima <= agora_mono]
+    if not lote:
+        return
+
+    # A tabela ARP reflete o veredito do kernel sobre as sondas do ciclo anterior
+    vizinhanca.recarregar()
+    resultados = asyncio.run(_sondar_lote(lote))
+
+    agora = time.time()
+    transicoes = []
+    confirmados = []
+    with _lock:
+        for dispositivo, respondeu in zip(lote, resultados):
+            evento = _aplicar(dispositivo, respondeu, agora)
+            if evento:
+                transicoes.append(evento)
+            if respondeu:
+                confirmados.append(dispositivo.mac)
+
+    _persistir(transicoes, confirmados)
+    for evento in transicoes:
+        _emitir(evento)
+
+
+# Espera até a próxima sonda vencer (ou o mínimo, se não houver nenhuma)
+def _tempo_ate_proxima():
+    with _lock:
+        proximas = [d.proxima for d in _dispositivos.values() if d.estado != OFFLINE]
+    if not proximas:
+        return config.INTERVALO_PRESENCA_MIN
+    return max(0.5, min(min(proximas) - time.monotonic(), config.INTERVALO_PRESENCA_MIN))
+
+
+def _executar():
+    carregar_do_banco()
+    ultima_varredura = 0.0
+    while not _parar.is_set():
+        try:
+            if time.monotonic() - ultima_varredura >= config.INTERVALO_VARREDURA_COMPLETA:
+                ultima_varredura = time.monotonic()
+                # O resultado chega por registrar_varredura, assinado em iniciar()
+                varreduras.iniciar_varredura().aguardar()
+            _ciclo()
+        except Exception as e:
+            print(f"[ERRO] Falha no ciclo de presença: {e}")
+        _parar.wait(_tempo_ate_proxima())
+
+
+# Em servidores com vários processos (gunicorn), só o dono da trava roda o motor
+def _obter_trava():
+    global _arquivo_trava
+    if fcntl is None:
+        return True
+    try:
+        _arquivo_trava = open(config.DB_PATH + ".presenca.lock", "w")
+        fcntl.flock(_arquivo_trava, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        if _arquivo_trava:
+            _arquivo_trava.close()
+            _arquivo_trava = None
+        return False
+
+
+# Inicia o motor em segundo plano; retorna False se outro processo já o executa
+def iniciar():
+    global _thread
+    if _thread is not None and _thread.is_alive():
+        return True
+    if not _obter_trava():
+        return False
+    _parar.clear()
+    varreduras.assinar(registrar_varredura)
+    _thread = threading.Thread(target=_executar, name="presenca", daemon=True)
+    _thread.start()
+    return True
+
+
+def parar():
+    _parar.set()
+
+
+# Indica se o motor está rodando neste processo
+def ativo():
+    return _thread is not None and _thread.is_alive()
+
+
+# Retorna o estado de presença de todos os dispositivos acompanhados
+def listar_estados():
+    with _lock:
+        return [d.para_dict() for d in _dispositivos.values()]
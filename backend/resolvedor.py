@@ -0,0 +1,140 @@
+# Resolvedor de DNS reverso concorrente com cache em memória e no SQLite.
+#
+# As consultas rodam em um pool de threads com prazo máximo por consulta;
+# nomes resolvidos ficam em cache por TTL_HOSTNAME e falhas (sem PTR ou
+# prazo esgotado) por TTL_HOSTNAME_NEGATIVO, sobrevivendo a reinícios.
+import socket
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+
+import banco
+import config
+
+
+# Valor devolvido quando o IP não tem hostname
+DESCONHECIDO = "Desconhecido"
+
+_executor = ThreadPoolExecutor(max_workers=config.WORKERS_DNS, thread_name_prefix="dns")
+_cache = {}  # ip -> (hostname ou None, expira_em)
+_em_andamento = {}  # ip -> consulta ainda em execução no pool
+_lock = threading.RLock()
+_cache_carregado = False
+
+
+# Carrega as entradas ainda válidas para a memória
+def _carregar_cache():
+    global _cache_carregado
+    if _cache_carregado:
+        return
+    try:
+        linhas = banco.obter_conexao().execute(
+            "SELECT ip, hostname, expira_em FROM cache_hostnames WHERE expira_em > ?", (time.time(),)
+        ).fetchall()
+        with _lock:
+            for ip, hostname, expira_em in linhas:
+                _cache.setdefault(ip, (hostname, expira_em))
+    except sqlite3.Error as e:
+        print(f"[ERRO] Falha ao carregar cache de hostnames: {e}")
+    _cache_carregado = True
+
+
+# Persiste um lote de entradas (ip, hostname, expira_em) no SQLite
+def _persistir(entradas):
+    if not entradas:
+        return
+    try:
+        with banco.transacao() as conn:
+            conn.executemany("""
+                INSERT INTO cache_hostnames (ip, hostname, expira_em) VALUES (?, ?, ?)
+                ON CONFLICT(ip) DO UPDATE SET hostname = excluded.hostname, expira_em = excluded.expira_em
+            """, entradas)
+    except sqlite3.Error as e:
+        print(f"[ERRO] Falha ao salvar cache de hostnames: {e}")
+
+
+# Consulta no cache; retorna (encontrado, hostname ou None)
+def _consultar_cache(ip):
+    with _lock:
+        entrada = _cache.get(ip)
+    if entrada and entrada[1] > time.time():
+        return True, entrada[0]
+    return False, None
+
+
+# Consulta bloqueante de DNS reverso (executada no pool)
+def _gethostbyaddr(ip):
+    try:
+        return socket.gethostbyaddr(ip)[0]
+    except (socket.herror, socket.gaierror, OSError):
+        return None
+
+
+# Envia a consulta ao pool, reaproveitando uma consulta já em andamento para o mesmo IP
+def _submeter(ip):
+    with _lock:
+        futuro = _em_andamento.get(ip)
+        if futuro is None:
+            futuro = _executor.submit(_gethostbyaddr, ip)
+            _em_andamento[ip] = futuro
+            futuro.add_done_callback(lambda _f: _remover_em_andamento(ip, _f))
+        return futuro
+
+
+def _remover_em_andamento(ip, futuro):
+    with _lock:
+        if _em_andamento.get(ip) is futuro:
+            del _em_andamento[ip]
+
+
+# Inicia a resolução de um IP em segundo plano (ex.: assim que a varredura o encontra)
+def antecipar(ip):
+    _carregar_cache()
+    encontrado, _ = _consultar_cache(ip)
+    if not encontrado:
+        _submeter(ip)
+
+
+# Aguarda a consulta até o prazo e registra o resultado no cache em memória
+def _concluir(ip, futuro, prazo):
+    try:
+        hostname = futuro.result(timeout=max(0, prazo - time.monotonic()))
+    except FuturesTimeoutError:
+        hostname = None
+    ttl = config.TTL_HOSTNAME if hostname else config.TTL_HOSTNAME_NEGATIVO
+    entrada = (ip, hostname, time.time() + ttl)
+    with _lock:
+        _cache[ip] = entrada[1:]
+    return entrada
+
+
+# Resolve vários IPs em paralelo; retorna {ip: hostname}
+def resolver_varios(ips, timeout=None):
+    _carregar_cache()
+    timeout = config.TIMEOUT_DNS if timeout is None else timeout
+    resultado = {}
+    pendentes = {}
+
+    for ip in set(ips):
+        encontrado, hostname = _consultar_cache(ip)
+        if encontrado:
+            resultado[ip] = hostname or DESCONHECIDO
+        else:
+            pendentes[ip] = _submeter(ip)
+
+    # Todas as consultas compartilham o mesmo prazo, contado a partir do envio
+    prazo = time.monotonic() + timeout
+    novas = [_concluir(ip, futuro, prazo) for ip, futuro in pendentes.items()]
+    for ip, hostname, _ in novas:
+        resultado[ip] = hostname or DESCONHECIDO
+
+    _persistir(novas)
+    return resultado
+
+
+# Resolve um único IP (usa o cache quando possível)
+def resolver(ip, timeout=None):
+    if not ip:
+        return DESCONHECIDO
+    return resolver_varios([ip], timeout)[ip]
@@ -0,0 +1,234 @@
+# Retenção do histórico: políticas por tabela e limpeza em lotes.
+#
+# Cada política limita a idade e/ou a quantidade de linhas de uma tabela
+# (opcionalmente restrita por um filtro). A limpeza apaga no máximo
+# LOTE_RETENCAO linhas por transação, com uma pausa entre os lotes para que
+# outras escritas consigam a trava, e termina com um vacuum incremental que
+# devolve as páginas livres ao sistema. Uma thread aplica as políticas a cada
+# INTERVALO_RETENCAO segundos; as exclusões das rotas /deletar/* usam o mesmo
+# caminho em lotes. Bancos criados antes do vacuum incremental são convertidos
+# só sob demanda, com python retencao.py --ativar-vacuo-incremental.
+import threading
+import time
+
+import banco
+import config
+import paginacao
+import serie_temporal
+
+# fcntl só existe em sistemas POSIX; sem ele, cada processo faz sua própria limpeza
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+_thread = None
+_parar = threading.Event()
+_lock_execucao = threading.Lock()
+
+
+class Politica:
+    """Limites de idade (segundos) e de linhas de uma tabela; 0 desliga o limite."""
+
+    def __init__(self, tabela, coluna_tempo, idade_maxima=0, maximo_linhas=0,
+                 filtro="1", parametros=(), epoch=False, chave="rowid"):
+        self.tabela = tabela
+        self.coluna_tempo = coluna_tempo
+        self.idade_maxima = idade_maxima
+        self.maximo_linhas = maximo_linhas
+        self.filtro = filtro
+        self.parametros = tuple(parametros)
+        self.epoch = epoch  # coluna em epoch (inteiro) em vez de data em texto
+        self.chave = chave  # colunas que identificam a linha (tabelas WITHOUT ROWID não têm rowid)
+
+    # Valor da coluna de tempo a partir do qual as linhas ainda são mantidas
+    def limite(self, agora):
+        corte = agora - self.idade_maxima
+        return int(corte) if self.epoch else paginacao.instante_texto(corte)
+
+
+# Políticas atuais, lidas da configuração. O resumo diário das sessões (uso_diario)
+# não tem política: uma linha por dispositivo e dia, mantida após a limpeza das sessões.
+# O registro das capturas importadas (capturas) também não: é ele que evita reimportá-las.
+def politicas():
+    lista = [
+        Politica("trafego", "timestamp", config.RETENCAO_TRAFEGO, config.MAXIMO_LINHAS_TRAFEGO),
+        Politica("velocidade", "timestamp", config.RETENCAO_VELOCIDADE, config.MAXIMO_LINHAS_VELOCIDADE),
+        Politica("sessoes", "inicio", config.RETENCAO_SESSOES, config.MAXIMO_LINHAS_SESSOES,
+                 filtro="fim IS NOT NULL"),
+        Politica("trafego_blocos", "fim", serie_temporal.retencao(serie_temporal.BRUTO), epoch=True),
+    ]
+    for nivel in serie_temporal.NIVEIS:
+        lista.append(Politica("trafego_agregados", "balde", serie_temporal.retencao(nivel),
+                              filtro="nivel = ?", parametros=(nivel,), epoch=True,
+                              chave="dispositivo_id, nivel, balde"))
+    return lista
+
+
+# ==== EXCLUSÃO EM LOTES ====
+
+# Apaga, em transações curtas de até LOTE_RETENCAO linhas, as linhas que satisfazem a condição.
+# Com ordem e limite_total, apaga só as primeiras limite_total linhas nessa ordem.
+# Retorna a quantidade de linhas apagadas.
+def apagar_em_lotes(tabela, condicao, parametros=(), chave="rowid", ordem=None, limite_total=None):
+    ordenacao = f" ORDER BY {ordem}" if ordem else ""
+    total = 0
+    while limite_total is None or total < limite_total:
+        lote = config.LOTE_RETENCAO if limite_total is None else min(config.LOTE_RETENCAO, limite_total - total)
+        with banco.transacao(imediata=True) as conn:
+            apagadas = conn.execute(f"""
+                DELETE FROM {tabela} WHERE ({chave}) IN (
+                    SELECT {chave} FROM {tabela} WHERE {condicao}{ordenacao} LIMIT ?
+                )
+            """, (*parametros, lote)).rowcount
+        total += apagadas
+        if apagadas < lote:
+            break
+        # Libera a trava entre os lotes para as demais escritas
+        time.sleep(config.PAUSA_RETENCAO)
+    return total
+
+
+# Aplica uma política: primeiro a idade máxima, depois o limite de linhas (apagando as mais antigas)
+def aplicar_politica(politica, agora=None):
+    agora = agora or time.time()
+    apagadas = 0
+    if politica.idade_maxima:
+        apagadas += apagar_em_lotes(
+            politica.tabela,
+            f"{politica.filtro} AND {politica.coluna_tempo} < ?",
+            (*politica.parametros, politica.limite(agora)),
+            chave=politica.chave,
+        )
+    if politica.maximo_linhas:
+        quantidade = banco.obter_conexao().execute(
+            f"SELECT COUNT(*) FROM {politica.tabela} WHERE {politica.filtro}", politica.parametros
+        ).fetchone()[0]
+        excesso = quantidade - politica.maximo_linhas
+        if excesso > 0:
+            apagadas += apagar_em_lotes(politica.tabela, politica.filtro, politica.parametros,
+                                        chave=politica.chave, ordem=politica.coluna_tempo,
+                                        limite_total=excesso)
+    return apagadas
+
+
+# ==== VACUUM INCREMENTAL ====
+
+# Devolve as páginas livres ao sistema em passos de PAGINAS_VACUO; retorna quantas foram liberadas
+def vacuo_incremental():
+    conn = banco.obter_conexao()
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:  # 2 = INCREMENTAL
+        return 0
+    liberadas = 0
+    livres = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    while livres:
+        conn.execute(f"PRAGMA incremental_vacuum({int(config.PAGINAS_VACUO)})").fetchall()
+        restantes = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if restantes >= livres:
+            break
+        liberadas += livres - restantes
+        livres = restantes
+        time.sleep(config.PAUSA_RETENCAO)
+    return liberadas
+
+
+# Liga o vacuum incremental num banco criado sem ele. Exige um VACUUM completo: reescreve o
+# arquivo inteiro (precisa de espaço livre igual ao tamanho do banco) e bloqueia as demais
+# conexões até terminar, por isso só roda quando pedido (--ativar-vacuo-incremental).
+# Retorna False se o banco já usava o vacuum incremental.
+def ativar_vacuo_incremental():
+    conn = banco.obter_conexao()
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return False
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    return True
+
+
+# ==== EXECUÇÃO ====
+
+# Em servidores com vários processos, só um deles limpa por vez
+def _trava_entre_processos():
+    if fcntl is None:
+        return True, None
+    arquivo = open(config.DB_PATH + ".retencao.lock", "w")
+    try:
+        fcntl.flock(arquivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True, arquivo
+    except OSError:
+        arquivo.close()
+        return False, None
+
+
+# Aplica todas as políticas e o vacuum incremental; retorna {tabela: linhas apagadas, "paginas_liberadas": n}
+def executar():
+    with _lock_execucao:
+        obtida, arquivo = _trava_entre_processos()
+        if not obtida:
+            print("[INFO] Limpeza de retenção já em execução em outro processo")
+            return None
+        try:
+            agora = time.time()
+            resultado = {}
+            for politica in politicas():
+                try:
+                    apagadas = aplicar_politica(politica, agora)
+                except Exception as e:
+                    print(f"[ERRO] Falha ao aplicar retenção em {politica.tabela}: {e}")
+                    continue
+                resultado[politica.tabela] = resultado.get(politica.tabela, 0) + apagadas
+            resultado["paginas_liberadas"] = vacuo_incremental()
+            if any(resultado.values()):
+                print(f"[INFO] Retenção aplicada: {resultado}")
+            return resultado
+        finally:
+            if arquivo:
+                arquivo.close()
+
+
+# Laço da thread de limpeza; a primeira execução acontece pouco depois da inicialização
+def _executar_periodicamente():
+    espera = min(60, config.INTERVALO_RETENCAO)
+    while not _parar.wait(espera):
+        try:
+            executar()
+        except Exception as e:
+            print(f"[ERRO] Falha na limpeza de retenção: {e}")
+        espera = config.INTERVALO_RETENCAO
+
+
+# Inicia a limpeza periódica em segundo plano (INTERVALO_RETENCAO = 0 desliga)
+def iniciar():
+    global _thread
+    if config.INTERVALO_RETENCAO <= 0 or (_thread is not None and _thread.is_alive()):
+        return
+    _parar.clear()
+    _thread = threading.Thread(target=_executar_periodicamente, name="retencao", daemon=True)
+    _thread.start()
+
+
+def parar():
+    _parar.set()
+
+
+# Uso:
+#   python retencao.py                              aplica as políticas uma vez
+#   python retencao.py --ativar-vacuo-incremental   converte um banco antigo (VACUUM completo)
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Manutenção do histórico: retenção e vacuum incremental.")
+    parser.add_argument("--ativar-vacuo-incremental", action="store_true",
+                        help="liga o vacuum incremental com um VACUUM completo (pare o servidor antes)")
+    args = parser.parse_args()
+
+    if args.ativar_vacuo_incremental:
+        inicio = time.monotonic()
+        if ativar_vacuo_incremental():
+            print(f"[INFO] Vacuum incremental ativado em {time.monotonic() - inicio:.1f}s")
+        else:
+            print("[INFO] O banco já usa vacuum incremental")
+    else:
+        print(f"[INFO] Retenção: {executar()}")
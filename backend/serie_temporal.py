@@ -0,0 +1,267 @@
+# Armazenamento em série temporal das amostras de tráfego.
+#
+# Cada amostra é (timestamp epoch, bytes recebidos, bytes enviados), com os
+# contadores da interface guardados como inteiros. As amostras ficam em blocos
+# (trafego_blocos) codificados em delta: cada amostra guarda apenas a diferença
+# para a anterior, em varints zigzag, e novas amostras são acrescentadas ao
+# BLOB do bloco aberto (até AMOSTRAS_POR_BLOCO). A cada amostra, os agregados
+# de 1 minuto, 1 hora e 1 dia (trafego_agregados) recebem o volume transferido
+# desde a amostra anterior. Cada nível tem sua retenção (aplicada por
+# retencao.py), e as consultas usam o nível mais grosso que ainda atende à
+# resolução pedida.
+import time
+
+import banco
+import config
+
+# Níveis da série, identificados pela duração do balde em segundos (0 = amostras brutas)
+BRUTO = 0
+MINUTO = 60
+HORA = 3600
+DIA = 86400
+NIVEIS = (MINUTO, HORA, DIA)
+
+
+# Retenção configurada (segundos) de um nível; 0 guarda para sempre
+def retencao(nivel):
+    return {
+        BRUTO: config.RETENCAO_BRUTO,
+        MINUTO: config.RETENCAO_MINUTO,
+        HORA: config.RETENCAO_HORA,
+        DIA: config.RETENCAO_DIA,
+    }[nivel]
+
+
+# ==== CODIFICAÇÃO DOS BLOCOS ====
+
+# Mapeia inteiros com sinal em inteiros sem sinal (0, -1, 1, -2, ... -> 0, 1, 2, 3, ...)
+def _zigzag(n):
+    return n << 1 if n >= 0 else ((-n) << 1) - 1
+
+
+def _desfazer_zigzag(z):
+    return z >> 1 if not z & 1 else -((z + 1) >> 1)
+
+
+# Acrescenta um varint (7 bits por byte, bit alto indica continuação)
+def _escrever_varint(saida, n):
+    while n >= 0x80:
+        saida.append((n & 0x7F) | 0x80)
+        n >>= 7
+    saida.append(n)
+
+
+# Codifica amostras (ts, download, upload) como deltas em relação à amostra anterior
+def codificar(amostras, anterior=(0, 0, 0)):
+    saida = bytearray()
+    for amostra in amostras:
+        for valor, base in zip(amostra, anterior):
+            _escrever_varint(saida, _zigzag(valor - base))
+        anterior = amostra
+    return bytes(saida)
+
+
+# Decodifica um bloco completo em uma lista de amostras (ts, download, upload)
+def decodificar(dados):
+    valores = []
+    n = deslocamento = 0
+    for byte in dados:
+        n |= (byte & 0x7F) << deslocamento
+        if byte & 0x80:
+            deslocamento += 7
+            continue
+        valores.append(_desfazer_zigzag(n))
+        n = deslocamento = 0
+
+    amostras = []
+    ts = download = upload = 0
+    for i in range(0, len(valores) - 2, 3):
+        ts += valores[i]
+        download += valores[i + 1]
+        upload += valores[i + 2]
+        amostras.append((ts, download, upload))
+    return amostras
+
+
+# ==== GRAVAÇÃO ====
+
+# Volume transferido entre dois contadores; um contador menor indica reinício da interface
+def _volume(atual, anterior):
+    return atual - anterior if atual >= anterior else atual
+
+
+# Início do balde de um nível; baldes diários seguem a meia-noite local
+def _inicio_balde(ts, nivel):
+    if nivel == DIA:
+        deslocamento = time.localtime(ts).tm_gmtoff
+        return ts - (ts + deslocamento) % DIA
+    return ts - ts % nivel
+
+
+# Grava amostras (ts, download, upload) de um dispositivo na conexão informada,
+# atualizando o bloco aberto e os agregados. A resolução é de um segundo: amostras que não
+# sejam posteriores à última gravada são ignoradas (o volume delas entra na amostra seguinte).
+def gravar(conn, dispositivo_id, amostras):
+    linha = conn.execute("""
+        SELECT id, inicio, fim, amostras, dados, ultimo_download, ultimo_upload
+        FROM trafego_blocos WHERE dispositivo_id = ?
+        ORDER BY inicio DESC LIMIT 1
+    """, (dispositivo_id,)).fetchone()
+
+    blocos = []
+    anterior = None
+    if linha:
+        bloco_id, inicio, fim, quantidade, dados, ultimo_download, ultimo_upload = linha
+        anterior = (fim, ultimo_download, ultimo_upload)
+        if quantidade < config.AMOSTRAS_POR_BLOCO:
+            blocos.append({"id": bloco_id, "inicio": inicio, "amostras": quantidade,
+                           "dados": bytearray(dados), "ultima": anterior, "alterado": False})
+
+    agregados = {}
+    for amostra in sorted((int(ts), int(dl), int(ul)) for ts, dl, ul in amostras):
+        ts, download, upload = amostra
+        if anterior and ts <= anterior[0]:
+            continue
+
+        if not blocos or blocos[-1]["amostras"] >= config.AMOSTRAS_POR_BLOCO:
+            blocos.append({"id": None, "inicio": ts, "amostras": 0, "dados": bytearray(),
+                           "ultima": (0, 0, 0), "alterado": False})
+        bloco = blocos[-1]
+        bloco["dados"] += codificar([amostra], bloco["ultima"])
+        bloco["alterado"] = True
+        bloco["ultima"] = amostra
+        bloco["amostras"] += 1
+
+        volume_download = _volume(download, anterior[1]) if anterior else 0
+        volume_upload = _volume(upload, anterior[2]) if anterior else 0
+        for nivel in NIVEIS:
+            chave = (nivel, _inicio_balde(ts, nivel))
+            acumulado = agregados.setdefault(chave, [0, 0, 0, 0, 0])
+            acumulado[0] += volume_download
+            acumulado[1] += volume_upload
+            acumulado[2] += 1
+            acumulado[3], acumulado[4] = download, upload
+        anterior = amostra
+
+    for bloco in blocos:
+        if not bloco["alterado"]:
+            continue
+        fim, ultimo_download, ultimo_upload = bloco["ultima"]
+        if bloco["id"] is None:
+            conn.execute("""
+                INSERT INTO trafego_blocos
+                    (dispositivo_id, inicio, fim, amostras, dados, ultimo_download, ultimo_upload)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (dispositivo_id, bloco["inicio"], fim, bloco["amostras"], bytes(bloco["dados"]),
+                  ultimo_download, ultimo_upload))
+        else:
+            conn.execute("""
+                UPDATE trafego_blocos
+                SET dados = ?, fim = ?, amostras = ?, ultimo_download = ?, ultimo_upload = ?
+                WHERE id = ?
+            """, (bytes(bloco["dados"]), fim, bloco["amostras"], ultimo_download, ultimo_upload, bloco["id"]))
+
+    conn.executemany("""
+        INSERT INTO trafego_agregados
+            (dispositivo_id, nivel, balde, download_bytes, upload_bytes, amostras, download_total, upload_total)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(dispositivo_id, nivel, balde) DO UPDATE SET
+            download_bytes = download_bytes + excluded.download_bytes,
+            upload_bytes = upload_bytes + excluded.upload_bytes,
+            amostras = amostras + excluded.amostras,
+            download_total = excluded.download_total,
+            upload_total = excluded.upload_total
+    """, [(dispositivo_id, nivel, balde, *valores) for (nivel, balde), valores in agregados.items()])
+
+
+# Registra amostras (ts, download_bytes, upload_bytes) de um dispositivo.
+# Com conn, participa da transação do chamador; sem conn, abre a sua.
+def registrar(dispositivo_id, amostras, conn=None):
+    if conn is not None:
+        gravar(conn, dispositivo_id, amostras)
+    else:
+        with banco.transacao(imediata=True) as conn:
+            gravar(conn, dispositivo_id, amostras)
+
+
+# ==== CONSULTA ====
+
+# Percorre as amostras brutas de um dispositivo no intervalo [inicio, fim], em ordem
+# crescente ou decrescente, decodificando apenas os blocos que cobrem o intervalo
+def amostras(dispositivo_id, inicio=None, fim=None, decrescente=False):
+    inicio = 0 if inicio is None else int(inicio)
+    fim = int(time.time()) if fim is None else int(fim)
+    conn = banco.obter_conexao()
+    # O primeiro bloco relevante é o último que começa antes do início do intervalo
+    primeiro = conn.execute("""
+        SELECT COALESCE(MAX(inicio), 0) FROM trafego_blocos WHERE dispositivo_id = ? AND inicio <= ?
+    """, (dispositivo_id, inicio)).fetchone()[0]
+    ordem = "DESC" if decrescente else "ASC"
+    cursor = conn.execute(f"""
+        SELECT dados FROM trafego_blocos
+        WHERE dispositivo_id = ? AND inicio >= ? AND inicio <= ?
+        ORDER BY inicio {ordem}
+    """, (dispositivo_id, primeiro, fim))
+
+    for (dados,) in cursor:
+        decodificadas = decodificar(dados)
+        if decrescente:
+            decodificadas.reverse()
+        for amostra in decodificadas:
+            if inicio <= amostra[0] <= fim:
+                yield amostra
+
+
+# Escolhe o nível mais grosso com balde <= resolução cuja retenção ainda cobre o início;
+# se nenhum cobrir, usa o primeiro nível mais grosso que cubra
+def escolher_nivel(resolucao, inicio, agora=None):
+    agora = agora or time.time()
+    escolhido = BRUTO
+    for nivel in NIVEIS:
+        if nivel <= resolucao:
+            escolhido = nivel
+    for nivel in (BRUTO,) + NIVEIS:
+        if nivel >= escolhido and (not retencao(nivel) or inicio >= agora - retencao(nivel)):
+            return nivel
+    return DIA
+
+
+# Consulta a série de um dispositivo entre inicio e fim (epoch). A resolução (segundos)
+# pode ser informada diretamente ou derivada da quantidade de pontos desejada.
+def consultar(dispositivo_id, inicio=None, fim=None, resolucao=None, pontos=None):
+    fim = int(time.time()) if fim is None else int(fim)
+    inicio = fim - DIA if inicio is None else int(inicio)
+    if resolucao is None:
+        resolucao = (fim - inicio) / max(1, pontos or config.PONTOS_SERIE)
+    nivel = escolher_nivel(resolucao, inicio)
+
+    serie = []
+    if nivel == BRUTO:
+        anterior = None
+        for ts, download, upload in amostras(dispositivo_id, inicio, fim):
+            serie.append({
+                "timestamp": ts,
+                "download_bytes": _volume(download, anterior[1]) if anterior else 0,
+                "upload_bytes": _volume(upload, anterior[2]) if anterior else 0,
+                "download_total": download,
+                "upload_total": upload,
+            })
+            anterior = (ts, download, upload)
+    else:
+        cursor = banco.obter_conexao().execute("""
+            SELECT balde, download_bytes, upload_bytes, amostras, download_total, upload_total
+            FROM trafego_agregados
+            WHERE dispositivo_id = ? AND nivel = ? AND balde BETWEEN ? AND ?
+            ORDER BY balde
+        """, (dispositivo_id, nivel, _inicio_balde(inicio, nivel), fim))
+        for balde, download, upload, quantidade, download_total, upload_total in cursor:
+            serie.append({
+                "timestamp": balde,
+                "download_bytes": download,
+                "upload_bytes": upload,
+                "amostras": quantidade,
+                "download_total": download_total,
+                "upload_total": upload_total,
+            })
+
+    return {"nivel": nivel, "inicio": inicio, "fim": fim, "pontos": serie}
@@ -1,165 +1,125 @@
-import sqlite3
-import psutil
-import socket
 from datetime import datetime
 from flask import Blueprint, jsonify, request
+import identidade
+import amostrador
+import banco
+import cache_respostas
+import paginacao
+import retencao
+import sessoes_ativas
 
-DB_PATH = "monitoramento.db"
 
 # Definição do Blueprint para gerenciamento das sessões
 sessoes_bp = Blueprint("sessoes", __name__)
 
-# Função para obter o tráfego de rede atual em MB
-def get_rede_atual_mb():
-    io = psutil.net_io_counters()
-    return round(io.bytes_recv / (1024 * 1024), 2), round(io.bytes_sent / (1024 * 1024), 2)
-
-
-# Obtém dados da máquina local (IP e MAC)
+# Obtém dados da máquina local (IP e MAC) da identidade compartilhada
 def obter_ip_maquina_local():
-    try:
-        ip_local = socket.gethostbyname(socket.gethostname())
-
-        return {"ip": ip_local}
-    except Exception as e:
-        print("Erro ao obter ip da máquina local:", e)
+    dados = identidade.obter_identidade()
+    if not dados["ip"]:
+        print("Erro ao obter ip da máquina local")
         return None
+    return {"ip": dados["ip"], "mac": dados["mac"], "hostname": dados["hostname"]}
 
-# Registra o dispositivo local no banco de dados
-def registrar_dispositivo_local():
-    dados = obter_ip_maquina_local()
-    if not dados:
-        return None  # Se não foi possível obter os dados, retorna None
-    
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT id FROM dispositivos WHERE ip = ?", (dados["ip"],))
-        resultado = cursor.fetchone()
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")  # Formato ISO 8601
-
-        if resultado:
-            # Se o dispositivo já está registrado, apenas atualiza o IP e última verificação
-            cursor.execute("""
-                UPDATE dispositivos SET ip=?, ultima_verificacao=?
-                WHERE ip=?
-            """, (dados["ip"], timestamp, dados["ip"]))
-            dispositivo_id = resultado[0]
-        else:
-            # Caso contrário, insere um novo registro para o dispositivo
-            cursor.execute("""
-                INSERT INTO dispositivos (ip, online, ultima_verificacao)
-                VALUES (?, ?, ?)
-            """, (dados["ip"], 1, timestamp))
-            dispositivo_id = cursor.lastrowid
-        conn.commit()
-    
-    return dispositivo_id
-
-# Obtém o ID do dispositivo atual
-def obter_dispositivo_id():
-    return registrar_dispositivo_local()
+# Nome e tag da sessão, do corpo JSON ou da query string
+def _ler_sessao():
+    dados = request.get_json(silent=True) or {}
+    nome = sessoes_ativas.ler_nome(dados.get("nome", request.args.get("nome")))
+    tag = dados.get("tag", request.args.get("tag")) or None
+    if tag is not None and not isinstance(tag, str):
+        raise ValueError("Tag de sessão inválida")
+    return nome, tag
 
 # Rota para iniciar uma sessão de monitoramento de tráfego
 @sessoes_bp.route("/trafego/sessao/iniciar", methods=["POST"])
 def iniciar_sessao():
-    dispositivo_id = obter_dispositivo_id()
-    if not dispositivo_id:
-        return jsonify({"erro": "Falha ao registrar ou obter dispositivo"}), 400
-    print({"erro": "Falha ao registrar ou obter dispositivo"})
-
-    download, upload = get_rede_atual_mb()
-    inicio = datetime.now()
-
+    """
+    Inicia uma sessão da máquina local. "nome" (opcional) permite várias
+    sessões abertas ao mesmo tempo e "tag" (opcional) as agrupa.
+    """
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            
-            # Verifica se já existe uma sessão ativa para o dispositivo
-            cursor.execute("SELECT id FROM sessoes WHERE dispositivo_id = ? AND fim IS NULL", (dispositivo_id,))
-            if cursor.fetchone():
-                return jsonify({"erro": "Já existe uma sessão ativa para este dispositivo"}), 400
-            
-            # Insere uma nova sessão no banco de dados
-            cursor.execute("""
-                INSERT INTO sessoes (dispositivo_id, inicio, download_inicial, upload_inicial, download_final, upload_final)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (dispositivo_id, inicio, download, upload, "null", "null"))
-            conn.commit()
-        
-        return jsonify({
-            "status": "Sessão iniciada",
-            "dispositivo_id": dispositivo_id,
-            "inicio": str(inicio),
-            "download_inicial": download,
-            "upload_inicial": upload
-        })
+        nome, tag = _ler_sessao()
+        sessao = sessoes_ativas.iniciar(nome, tag)
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
     except Exception as e:
         return jsonify({"erro": str(e)}), 500
 
+    return jsonify({
+        "status": "Sessão iniciada",
+        "id": sessao.id,
+        "dispositivo_id": sessao.dispositivo_id,
+        "nome": sessao.nome or None,
+        "tag": sessao.tag,
+        "inicio": str(sessao.inicio),
+        "download_inicial": sessao.download_inicial,
+        "upload_inicial": sessao.upload_inicial
+    })
+
 # Rota para finalizar uma sessão de monitoramento de tráfego
 @sessoes_bp.route("/trafego/sessao/finalizar", methods=["POST"])
 def finalizar_sessao():
-    dispositivo_id = obter_dispositivo_id()
-    if not dispositivo_id:
-        return jsonify({"erro": "Dispositivo não registrado no banco de dados"}), 400
-    
-    download_final, upload_final = get_rede_atual_mb()
-    fim = datetime.now()
+    """Finaliza a sessão aberta da máquina local com o "nome" informado (ou a sem nome)."""
+    try:
+        nome, _ = _ler_sessao()
+        sessao = sessoes_ativas.finalizar(nome)
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
+    except Exception as e:
+        return jsonify({"erro": str(e)}), 500
+
+    return jsonify({"status": "Sessão finalizada", **sessao})
+
+# Rota para listar as sessões abertas com o uso até agora
+@sessoes_bp.route("/trafego/sessoes/ativas", methods=["GET"])
+def listar_sessoes_ativas():
+    """
+    Lista as sessões abertas com o uso desde o início, calculado em memória a
+    partir da última amostragem (parâmetros opcionais dispositivo_id e tag).
+    """
+    dispositivo_id = request.args.get("dispositivo_id")
+    try:
+        dispositivo_id = int(dispositivo_id) if dispositivo_id not in (None, "") else None
+    except ValueError:
+        return jsonify({"erro": f"dispositivo_id inválido: {dispositivo_id}"}), 400
 
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            
-            # Obtém a sessão ativa para o dispositivo
-            cursor.execute("""
-                SELECT id, download_inicial, upload_inicial, inicio 
-                FROM sessoes 
-                WHERE dispositivo_id = ? AND fim IS NULL 
-                ORDER BY id DESC LIMIT 1
-            """, (dispositivo_id,))
-            sessao = cursor.fetchone()
-
-            if not sessao:
-                return jsonify({"erro": "Nenhuma sessão iniciada encontrada para este dispositivo"}), 400
-
-            sessao_id, d_ini, u_ini, inicio = sessao
-            total_download = round(download_final - d_ini, 2)
-            total_upload = round(upload_final - u_ini, 2)
-
-            # Finaliza a sessão atualizando os valores finais no banco de dados
-            cursor.execute("""
-                UPDATE sessoes
-                SET fim = ?, download_final = ?, upload_final = ?
-                WHERE id = ?
-            """, (fim, download_final, upload_final, sessao_id))
-            conn.commit()
-        
-        return jsonify({
-            "status": "Sessão finalizada",
-            "dispositivo_id": dispositivo_id,
-            "inicio": inicio,
-            "fim": str(fim),
-            "download_usado_mb": total_download,
-            "upload_usado_mb": total_upload,
-            "total_usado_mb": round(total_download + total_upload, 2)
-        })
+        sessoes = sessoes_ativas.ativas(dispositivo_id, request.args.get("tag") or None)
     except Exception as e:
         return jsonify({"erro": str(e)}), 500
 
-# Rota para listar todas as sessões encerradas
+    leitura = amostrador.leitura_atual() if amostrador.ativo() else None
+    return jsonify({
+        "sessoes": sessoes,
+        "download_bps": leitura["download_bps"] if leitura else None,
+        "upload_bps": leitura["upload_bps"] if leitura else None
+    })
+
+# Rota para listar as sessões encerradas, paginadas da mais recente para a mais antiga
 @sessoes_bp.route("/trafego/sessoes", methods=["GET"])
+@cache_respostas.em_cache("sessoes")
 def listar_sessoes():
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        pagina = paginacao.ler_pagina(request.args)
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
+
+    try:
+        with banco.transacao() as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT id, dispositivo_id, inicio, fim,
-                       ROUND(download_final - download_inicial, 2) as download_usado,
-                       ROUND(upload_final - upload_inicial, 2) as upload_usado
+            condicoes, parametros = pagina.condicoes("inicio", ["inicio", "id"])
+            tag = request.args.get("tag")
+            if tag:
+                condicoes.append("tag = ?")
+                parametros.append(tag)
+            filtros = "".join(f" AND {c}" for c in condicoes)
+            cursor.execute(f"""
+                SELECT id, dispositivo_id, inicio, fim, download_usado_mb, upload_usado_mb, nome, tag
                 FROM sessoes
-                WHERE fim IS NOT NULL
-                ORDER BY id DESC
-            """)
+                WHERE fim IS NOT NULL{filtros}
+                ORDER BY inicio DESC, id DESC
+                LIMIT ?
+            """, (*parametros, pagina.limite + 1))
+            linhas, proximo_cursor = pagina.fatiar(cursor.fetchall(), lambda row: (row[2], row[0]))
             sessoes = [{
                 "id": row[0],
                 "dispositivo_id": row[1],
@@ -167,30 +127,37 @@ def listar_sessoes():
                 "fim": row[3],
                 "download_usado_mb": row[4],
                 "upload_usado_mb": row[5],
-                "total_usado_mb": round(row[4] + row[5], 2)
-            } for row in cursor.fetchall()]
+                "total_usado_mb": round(row[4] + row[5], 2),
+                "nome": row[6] or None,
+                "tag": row[7]
+            } for row in linhas]
 
-        # Iterar sobre a lista de sessões e imprimir corretamente
-        for sessao in sessoes:
-            print(f"[INFO] ID: {sessao['dispositivo_id']} - INICIO: {sessao['inicio']} | FIM: {sessao['fim']} | DOWNLOAD_USADO: {sessao['download_usado_mb']} | UPLOAD_USADO: {sessao['upload_usado_mb']} | TOTAL_USADO: {sessao['total_usado_mb']} ")
-
-        return jsonify({"sessoes": sessoes})
+        return jsonify({"sessoes": sessoes, "proximo_cursor": proximo_cursor})
     
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
     except Exception as e:
         return jsonify({"erro": str(e)}), 500
     
     # Rota para listar sessões por dispositivo (com base no IP da máquina local)
 @sessoes_bp.route("/trafego/sessoes/dispositivo", methods=["GET"])
+@cache_respostas.em_cache("sessoes")
 def listar_sessoes_por_dispositivo():
     """
-    Lista todas as sessões encerradas associadas à máquina local.
+    Lista as sessões encerradas associadas à máquina local, paginadas da mais
+    recente para a mais antiga (parâmetros from, to, limit e cursor).
     """
+    try:
+        pagina = paginacao.ler_pagina(request.args)
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
+
     dados = obter_ip_maquina_local()
     if not dados:
         return jsonify({"erro": "IP local não encontrado."}), 400
 
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with banco.transacao() as conn:
             cursor = conn.cursor()
 
             # Buscar ID do dispositivo com base no IP
@@ -202,43 +169,169 @@ def listar_sessoes_por_dispositivo():
 
             dispositivo_id = resultado[0]
 
-            # Buscar sessões finalizadas para esse dispositivo
-            cursor.execute("""
-                SELECT inicio, fim,
-                       ROUND(download_final - download_inicial, 2),
-                       ROUND(upload_final - upload_inicial, 2)
+            # Buscar uma página das sessões finalizadas para esse dispositivo
+            condicoes, parametros = pagina.condicoes("inicio", ["inicio", "id"])
+            filtros = "".join(f" AND {c}" for c in condicoes)
+            cursor.execute(f"""
+                SELECT inicio, fim, download_usado_mb, upload_usado_mb, id, nome, tag
                 FROM sessoes
-                WHERE dispositivo_id = ? AND fim IS NOT NULL
-                ORDER BY inicio DESC
-            """, (dispositivo_id,))
+                WHERE dispositivo_id = ? AND fim IS NOT NULL{filtros}
+                ORDER BY inicio DESC, id DESC
+                LIMIT ?
+            """, (dispositivo_id, *parametros, pagina.limite + 1))
 
+            linhas, proximo_cursor = pagina.fatiar(cursor.fetchall(), lambda row: (row[0], row[4]))
             registros = []
-            for row in cursor.fetchall():
+            for row in linhas:
                 total = row[2] + row[3]
                 registros.append({
                     "inicio": row[0],
                     "fim": row[1],
                     "download_usado_mb": row[2],
                     "upload_usado_mb": row[3],
-                    "total_usado_mb": round(total, 2)
+                    "total_usado_mb": round(total, 2),
+                    "nome": row[5] or None,
+                    "tag": row[6]
                 })
 
-        return jsonify({"sessoes": registros})
+        return jsonify({"sessoes": registros, "proximo_cursor": proximo_cursor})
     
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
+    except Exception as e:
+        return jsonify({"erro": str(e)}), 500
+
+# ==== RESUMOS DE USO ====
+
+# Filtros de uso_diario a partir de from, to (epoch ou ISO) e dispositivo_id; ValueError se inválidos
+def _filtros_resumo(args):
+    condicoes, parametros = [], []
+    inicio = paginacao.ler_instante(args.get("from"))
+    fim = paginacao.ler_instante(args.get("to"))
+    if inicio is not None:
+        condicoes.append("dia >= ?")
+        parametros.append(datetime.fromtimestamp(inicio).strftime("%Y-%m-%d"))
+    if fim is not None:
+        condicoes.append("dia <= ?")
+        parametros.append(datetime.fromtimestamp(fim).strftime("%Y-%m-%d"))
+    dispositivo_id = args.get("dispositivo_id")
+    if dispositivo_id not in (None, ""):
+        try:
+            dispositivo_id = int(dispositivo_id)
+        except ValueError:
+            raise ValueError(f"dispositivo_id inválido: {dispositivo_id}")
+        condicoes.append("dispositivo_id = ?")
+        parametros.append(dispositivo_id)
+    filtros = " WHERE " + " AND ".join(condicoes) if condicoes else ""
+    return filtros, parametros
+
+
+# Converte (sessoes, download, upload) somados em um dicionário de uso
+def _uso(sessoes, download, upload):
+    download = round(download or 0.0, 2)
+    upload = round(upload or 0.0, 2)
+    return {
+        "sessoes": sessoes or 0,
+        "download_usado_mb": download,
+        "upload_usado_mb": upload,
+        "total_usado_mb": round(download + upload, 2),
+    }
+
+
+# Rota com o uso total das sessões encerradas no período
+@sessoes_bp.route("/trafego/sessoes/resumo", methods=["GET"])
+@cache_respostas.em_cache("uso_diario")
+def resumo_sessoes():
+    """
+    Soma o uso das sessões encerradas (parâmetros opcionais from, to e
+    dispositivo_id), lendo o resumo diário em vez da tabela de sessões.
+    """
+    try:
+        filtros, parametros = _filtros_resumo(request.args)
+        linha = banco.obter_conexao().execute(f"""
+            SELECT SUM(sessoes), SUM(download_bytes) / 1048576.0, SUM(upload_bytes) / 1048576.0, MIN(dia), MAX(dia)
+            FROM uso_diario{filtros}
+        """, parametros).fetchone()
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
     except Exception as e:
         return jsonify({"erro": str(e)}), 500
 
+    return jsonify({**_uso(*linha[:3]), "primeiro_dia": linha[3], "ultimo_dia": linha[4]})
+
+
+# Rota com o uso das sessões encerradas por dia
+@sessoes_bp.route("/trafego/sessoes/resumo/diario", methods=["GET"])
+@cache_respostas.em_cache("uso_diario")
+def resumo_sessoes_diario():
+    """
+    Uso das sessões encerradas por dia, em ordem cronológica (parâmetros
+    opcionais from, to e dispositivo_id; sem dispositivo_id, soma todos).
+    """
+    try:
+        filtros, parametros = _filtros_resumo(request.args)
+        linhas = banco.obter_conexao().execute(f"""
+            SELECT dia, SUM(sessoes), SUM(download_bytes) / 1048576.0, SUM(upload_bytes) / 1048576.0
+            FROM uso_diario{filtros}
+            GROUP BY dia
+            ORDER BY dia
+        """, parametros).fetchall()
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
+    except Exception as e:
+        return jsonify({"erro": str(e)}), 500
+
+    return jsonify({"dias": [{"dia": dia, **_uso(*totais)} for dia, *totais in linhas]})
+
+
+# Rota com o uso das sessões encerradas por dispositivo
+@sessoes_bp.route("/trafego/sessoes/resumo/dispositivos", methods=["GET"])
+@cache_respostas.em_cache("dispositivos", "uso_diario")
+def resumo_sessoes_por_dispositivo():
+    """
+    Uso das sessões encerradas por dispositivo, do maior para o menor uso
+    total (parâmetros opcionais from, to e dispositivo_id).
+    """
+    try:
+        filtros, parametros = _filtros_resumo(request.args)
+        linhas = banco.obter_conexao().execute(f"""
+            SELECT u.dispositivo_id, d.ip, d.hostname, u.sessoes, u.download_mb, u.upload_mb
+            FROM (
+                SELECT dispositivo_id, SUM(sessoes) AS sessoes,
+                       SUM(download_bytes) / 1048576.0 AS download_mb, SUM(upload_bytes) / 1048576.0 AS upload_mb
+                FROM uso_diario{filtros}
+                GROUP BY dispositivo_id
+            ) AS u
+            LEFT JOIN dispositivos AS d ON d.id = u.dispositivo_id
+            ORDER BY u.download_mb + u.upload_mb DESC
+        """, parametros).fetchall()
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
+    except Exception as e:
+        return jsonify({"erro": str(e)}), 500
+
+    return jsonify({"dispositivos": [{
+        "dispositivo_id": row[0],
+        "ip": row[1],
+        "hostname": row[2],
+        **_uso(*row[3:]),
+    } for row in linhas]})
+
+
 def deletar_sessoes_da_maquina_local():
-    dispositivo_id = obter_dispositivo_id()
+    dispositivo_id = sessoes_ativas.dispositivo_local()
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM sessoes WHERE dispositivo_id = ?", (dispositivo_id,))
-            conn.commit()
-            return True
+        # Apaga em lotes, sem segurar a trava de escrita por toda a exclusão
+        retencao.apagar_em_lotes("sessoes", "dispositivo_id = ?", (dispositivo_id,))
+        retencao.apagar_em_lotes("uso_diario", "dispositivo_id = ?", (dispositivo_id,),
+                                 chave="dispositivo_id, dia")
+        return True
     except Exception as e:
         print("Erro ao deletar sessões:", e)
         return False
+    finally:
+        # As sessões abertas apagadas saem do registro em memória
+        sessoes_ativas.carregar()
 
 
 
@@ -0,0 +1,270 @@
+# Registro em memória das sessões de monitoramento abertas.
+#
+# As sessões abertas ficam num dicionário (dispositivo, nome) -> SessaoAtiva,
+# restaurado do banco na inicialização. Iniciar e encerrar uma sessão não
+# consultam mais o banco para achar o dispositivo ou a sessão aberta: fazem
+# só a sua gravação. O uso ao vivo de cada sessão é a diferença entre os
+# acumuladores da contabilidade (atualizados pelo amostrador a cada segundo)
+# e o marco inicial da sessão, calculado sem tocar no banco.
+#
+# Um dispositivo pode ter várias sessões abertas ao mesmo tempo, uma por nome
+# ("" é a sessão sem nome, a das rotas antigas), cada uma com uma tag opcional.
+# O servidor roda num único processo (Procfile), cujo registro é a referência:
+# ele só é relido do banco depois de exclusões feitas fora dele e, ao iniciar
+# ou encerrar uma sessão, no máximo a cada INTERVALO_SINCRONIA_SESSOES
+# segundos. A leitura ao vivo (ativas) nunca consulta o banco. Com outros
+# processos, o índice único das sessões abertas (migração 13) impede
+# duplicatas.
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import amostrador
+import banco
+import config
+import contabilidade
+import identidade
+import trafego
+from trafego import BYTES_POR_MB
+
+TAMANHO_MAXIMO_NOME = 100
+
+_sessoes = {}  # (dispositivo_id, nome) -> SessaoAtiva
+_carregado_em = None  # time.monotonic() da última leitura do banco
+_lock = threading.Lock()
+_lock_escrita = threading.Lock()  # serializa inícios e encerramentos
+
+
+class SessaoAtiva:
+    """Sessão aberta: identificação e marcos iniciais dos contadores."""
+
+    __slots__ = ("id", "dispositivo_id", "nome", "tag", "inicio",
+                 "download_inicial", "upload_inicial", "download_inicial_bytes", "upload_inicial_bytes")
+
+    def __init__(self, id, dispositivo_id, nome, tag, inicio, download_inicial, upload_inicial,
+                 download_inicial_bytes, upload_inicial_bytes):
+        self.id = id
+        self.dispositivo_id = dispositivo_id
+        self.nome = nome
+        self.tag = tag
+        self.inicio = inicio
+        self.download_inicial = download_inicial
+        self.upload_inicial = upload_inicial
+        self.download_inicial_bytes = download_inicial_bytes
+        self.upload_inicial_bytes = upload_inicial_bytes
+
+    # Uso (bytes) desde o início, dados os acumuladores atuais
+    def uso(self, recebidos, enviados):
+        return (_uso_bytes(self.download_inicial_bytes, self.download_inicial, recebidos),
+                _uso_bytes(self.upload_inicial_bytes, self.upload_inicial, enviados))
+
+    def para_dict(self, recebidos, enviados):
+        download_bytes, upload_bytes = self.uso(recebidos, enviados)
+        download = round(download_bytes / BYTES_POR_MB, 2)
+        upload = round(upload_bytes / BYTES_POR_MB, 2)
+        return {
+            "id": self.id,
+            "dispositivo_id": self.dispositivo_id,
+            "nome": self.nome or None,
+            "tag": self.tag,
+            "inicio": str(self.inicio),
+            "duracao_segundos": round((datetime.now() - self.inicio).total_seconds(), 1),
+            "download_usado_mb": download,
+            "upload_usado_mb": upload,
+            "total_usado_mb": round(download + upload, 2),
+        }
+
+
+# Uso (bytes) entre o marco inicial da sessão e o atual; sessões anteriores à contabilidade
+# em bytes só têm os contadores em MB. Nunca é negativo.
+def _uso_bytes(inicial_bytes, inicial_mb, atual_bytes):
+    if inicial_bytes is not None:
+        return max(0, atual_bytes - inicial_bytes)
+    return max(0, atual_bytes - int(round(inicial_mb * BYTES_POR_MB)))
+
+
+# Soma o uso (bytes) de uma sessão encerrada ao dia (data de início) do dispositivo em uso_diario
+def _acumular_uso_diario(cursor, dispositivo_id, inicio, download_bytes, upload_bytes):
+    cursor.execute("""
+        INSERT INTO uso_diario (dispositivo_id, dia, sessoes, download_bytes, upload_bytes, download_mb, upload_mb)
+        VALUES (?, date(?), 1, ?, ?, ROUND(? / 1048576.0, 2), ROUND(? / 1048576.0, 2))
+        ON CONFLICT (dispositivo_id, dia) DO UPDATE SET
+            sessoes = sessoes + 1,
+            download_bytes = download_bytes + excluded.download_bytes,
+            upload_bytes = upload_bytes + excluded.upload_bytes,
+            download_mb = ROUND((download_bytes + excluded.download_bytes) / 1048576.0, 2),
+            upload_mb = ROUND((upload_bytes + excluded.upload_bytes) / 1048576.0, 2)
+    """, (dispositivo_id, str(inicio), download_bytes, upload_bytes, download_bytes, upload_bytes))
+
+
+def _ler_inicio(valor):
+    try:
+        return datetime.fromisoformat(str(valor))
+    except ValueError:
+        return datetime.now()
+
+
+# Restaura do banco as sessões abertas (na inicialização, após exclusões fora do registro
+# ou periodicamente, para escritas de outros processos)
+def carregar():
+    global _carregado_em
+    conn = banco.obter_conexao()
+    with _lock:
+        linhas = conn.execute("""
+            SELECT id, dispositivo_id, nome, tag, inicio, download_inicial, upload_inicial,
+                   download_inicial_bytes, upload_inicial_bytes
+            FROM sessoes WHERE fim IS NULL
+        """).fetchall()
+        _sessoes.clear()
+        for id, dispositivo_id, nome, tag, inicio, *marcos in linhas:
+            _sessoes[(dispositivo_id, nome)] = SessaoAtiva(id, dispositivo_id, nome, tag, _ler_inicio(inicio), *marcos)
+        _carregado_em = time.monotonic()
+
+
+# Relê o registro se ainda não foi carregado ou se a última leitura passou de INTERVALO_SINCRONIA_SESSOES
+def _sincronizar():
+    if _carregado_em is None or time.monotonic() - _carregado_em >= config.INTERVALO_SINCRONIA_SESSOES:
+        carregar()
+
+
+# ID do dispositivo local, em cache depois do primeiro registro (ver trafego.py)
+def dispositivo_local():
+    ip = identidade.ip_local()
+    return trafego.dispositivo_local_id(ip) if ip else None
+
+
+# Acumuladores atuais (recebidos, enviados) em bytes: os da última amostragem,
+# com o amostrador ativo, ou uma leitura dos contadores agora
+def _contadores():
+    if amostrador.ativo():
+        return contabilidade.ultimos_totais()
+    return contabilidade.totais()
+
+
+# Nome da sessão informado pelo cliente ("" para a sessão sem nome); ValueError se inválido
+def ler_nome(valor):
+    if valor is None:
+        return ""
+    if not isinstance(valor, str):
+        raise ValueError("Nome de sessão inválido")
+    valor = valor.strip()
+    if len(valor) > TAMANHO_MAXIMO_NOME:
+        raise ValueError(f"Nome de sessão com mais de {TAMANHO_MAXIMO_NOME} caracteres")
+    return valor
+
+
+# Abre uma sessão do dispositivo (local, se não informado). ValueError se já houver
+# uma sessão aberta com esse nome.
+def iniciar(nome="", tag=None, dispositivo_id=None):
+    dispositivo_id = dispositivo_id or dispositivo_local()
+    if not dispositivo_id:
+        raise ValueError("Falha ao registrar ou obter dispositivo")
+    chave = (dispositivo_id, nome)
+
+    with _lock_escrita:
+        _sincronizar()
+        if chave in _sessoes:
+            raise ValueError(_mensagem_ja_ativa(nome))
+
+        recebidos, enviados = _contadores()
+        download = round(recebidos / BYTES_POR_MB, 2)
+        upload = round(enviados / BYTES_POR_MB, 2)
+        inicio = datetime.now()
+        try:
+            with banco.transacao(imediata=True) as conn:
+                # Insere a sessão com o marco inicial da contabilidade (os finais são preenchidos ao encerrar)
+                cursor = conn.execute("""
+                    INSERT INTO sessoes (dispositivo_id, nome, tag, inicio, download_inicial, upload_inicial,
+                                         download_final, upload_final, download_inicial_bytes, upload_inicial_bytes)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (dispositivo_id, nome, tag, inicio, download, upload, download, upload, recebidos, enviados))
+                contabilidade.salvar(conn)
+        except sqlite3.IntegrityError:
+            # Outro processo abriu uma sessão com esse nome
+            carregar()
+            raise ValueError(_mensagem_ja_ativa(nome))
+
+        sessao = SessaoAtiva(cursor.lastrowid, dispositivo_id, nome, tag, inicio,
+                             download, upload, recebidos, enviados)
+        with _lock:
+            _sessoes[chave] = sessao
+    return sessao
+
+
+def _mensagem_ja_ativa(nome):
+    if nome:
+        return f"Já existe uma sessão ativa chamada {nome} para este dispositivo"
+    return "Já existe uma sessão ativa para este dispositivo"
+
+
+# Encerra a sessão aberta com o nome, gravando o uso nela e no resumo diário.
+# Retorna o dicionário da sessão encerrada; ValueError se não houver sessão aberta.
+def finalizar(nome="", dispositivo_id=None):
+    dispositivo_id = dispositivo_id or dispositivo_local()
+    if not dispositivo_id:
+        raise ValueError("Dispositivo não registrado no banco de dados")
+    chave = (dispositivo_id, nome)
+
+    with _lock_escrita:
+        _sincronizar()
+        sessao = _sessoes.get(chave)
+        if sessao is None:
+            if nome:
+                raise ValueError(f"Nenhuma sessão ativa chamada {nome} para este dispositivo")
+            raise ValueError("Nenhuma sessão iniciada encontrada para este dispositivo")
+
+        recebidos, enviados = _contadores()
+        download_final = round(recebidos / BYTES_POR_MB, 2)
+        upload_final = round(enviados / BYTES_POR_MB, 2)
+        download_bytes, upload_bytes = sessao.uso(recebidos, enviados)
+        total_download = round(download_bytes / BYTES_POR_MB, 2)
+        total_upload = round(upload_bytes / BYTES_POR_MB, 2)
+        fim = datetime.now()
+
+        with banco.transacao(imediata=True) as conn:
+            cursor = conn.cursor()
+            # Finaliza a sessão gravando o marco final e o uso calculado
+            cursor.execute("""
+                UPDATE sessoes
+                SET fim = ?, download_final = ?, upload_final = ?,
+                    download_final_bytes = ?, upload_final_bytes = ?,
+                    download_usado_mb = ?, upload_usado_mb = ?
+                WHERE id = ? AND fim IS NULL
+            """, (fim, download_final, upload_final, recebidos, enviados, total_download, total_upload, sessao.id))
+            encerrada = cursor.rowcount == 1
+            if encerrada:
+                # Acumula o uso no resumo diário do dispositivo, na mesma transação
+                _acumular_uso_diario(cursor, dispositivo_id, sessao.inicio, download_bytes, upload_bytes)
+                contabilidade.salvar(conn)
+
+        with _lock:
+            _sessoes.pop(chave, None)
+        if not encerrada:
+            # Outro processo encerrou a sessão antes
+            raise ValueError("Nenhuma sessão iniciada encontrada para este dispositivo")
+
+    return {
+        "id": sessao.id,
+        "dispositivo_id": dispositivo_id,
+        "nome": nome or None,
+        "tag": sessao.tag,
+        "inicio": str(sessao.inicio),
+        "fim": str(fim),
+        "download_usado_mb": total_download,
+        "upload_usado_mb": total_upload,
+        "total_usado_mb": round(total_download + total_upload, 2),
+    }
+
+
+# Sessões abertas com o uso até agora, das mais antigas para as mais recentes (sem tocar no banco)
+def ativas(dispositivo_id=None, tag=None):
+    if _carregado_em is None:
+        carregar()
+    recebidos, enviados = _contadores()
+    with _lock:
+        sessoes = [sessao for (dispositivo, _), sessao in _sessoes.items()
+                   if (dispositivo_id is None or dispositivo == dispositivo_id)
+                   and (tag is None or sessao.tag == tag)]
+    sessoes.sort(key=lambda sessao: sessao.id)
+    return [sessao.para_dict(recebidos, enviados) for sessao in sessoes]
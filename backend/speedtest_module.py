@@ -1,23 +1,21 @@
 # speedtest_module.py
 import speedtest 
-import sqlite3
-import socket
 from datetime import datetime
 from flask import Blueprint, jsonify
 from monitor import obter_mac_real_da_maquina
+import identidade
+import banco
+import paginacao
+import retencao
 
 
 # Blueprint para agrupar rotas de speedtest
 speed_bp = Blueprint('speed', __name__)
 
-# Caminho para o banco de dados SQLite onde os dados serão armazenados
-DB_PATH = "monitoramento.db"
 
 def buscar_ip_local():
-    """Obtém informações da máquina local, incluindo hostname e IP."""
-    hostname = socket.gethostname()
-    ip = socket.gethostbyname(hostname)
-    return ip
+    """Obtém o IP da máquina local a partir da identidade compartilhada."""
+    return identidade.ip_local()
 
 def obter_ip_maquina_local():
     """
@@ -25,13 +23,11 @@ def obter_ip_maquina_local():
     - Endereço IP local
     - Hostname
     """
-    try:
-        hostname = socket.gethostname()  # Nome do host da máquina
-        ip_local = socket.gethostbyname(hostname)  # Endereço IP associado
-        return ip_local, hostname
-    except Exception as e:
-        print("Erro ao obter dados da máquina local:", e)
-    return None, None
+    dados = identidade.obter_identidade()
+    if not dados["ip"]:
+        print("Erro ao obter dados da máquina local")
+        return None, None
+    return dados["ip"], dados["hostname"]
 
 def registrar_ou_atualizar_dispositivo():
     """
@@ -44,33 +40,28 @@ def registrar_ou_atualizar_dispositivo():
     if not ip:
         return None  # Se não conseguiu obter o IP, não prossegue
     
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        # Verifica se o dispositivo já existe
-        cursor.execute("SELECT id, ip, hostname FROM dispositivos WHERE ip = ?", (ip,))
-        dispositivo = cursor.fetchone()
-
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")  # Formato ISO
-
-        if dispositivo:
-            dispositivo_id, ip_antigo, hostname_antigo = dispositivo
-            # Atualiza se IP ou hostname mudaram
-            if ip_antigo != ip or hostname_antigo != hostname:
-                cursor.execute("""
-                    UPDATE dispositivos
-                    SET ip = ?, hostname = ?, mac = ?, ultima_verificacao = ?, online = 1
-                    WHERE id = ?
-                """, (ip, hostname, mac, timestamp, dispositivo_id))
-                conn.commit()
-            return dispositivo_id
-        else:
-            # Insere novo registro
-            cursor.execute("""
-                INSERT INTO dispositivos (ip, hostname, mac, ultima_verificacao, online)
-                VALUES (?, ?, ?, ?, 1)
-            """, (ip, hostname, mac, timestamp))
-            conn.commit()
-            return cursor.lastrowid
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")  # Formato ISO
+    with banco.transacao(imediata=True) as conn:
+        if not mac or mac == "Desconhecido":
+            # Sem MAC, o dispositivo só pode ser reconhecido pelo IP
+            dispositivo = conn.execute("SELECT id FROM dispositivos WHERE ip = ?", (ip,)).fetchone()
+            if dispositivo:
+                conn.execute("""
+                    UPDATE dispositivos SET hostname = ?, ultima_verificacao = ?, online = 1 WHERE id = ?
+                """, (hostname, timestamp, dispositivo[0]))
+                return dispositivo[0]
+            mac = "Desconhecido"
+        # Registra pelo MAC: se o IP ou o hostname mudaram, atualiza a mesma linha
+        return conn.execute("""
+            INSERT INTO dispositivos (ip, hostname, mac, ultima_verificacao, online)
+            VALUES (?, ?, ?, ?, 1)
+            ON CONFLICT(mac) DO UPDATE SET
+                ip = excluded.ip,
+                hostname = excluded.hostname,
+                ultima_verificacao = excluded.ultima_verificacao,
+                online = 1
+            RETURNING id
+        """, (ip, hostname, mac, timestamp)).fetchone()[0]
 
 def medir_velocidade():
     """
@@ -94,13 +85,12 @@ def medir_velocidade():
             return {"erro": "Falha ao registrar ou atualizar dispositivo"}
 
         # Insere dados de velocidade
-        with sqlite3.connect(DB_PATH) as conn:
+        with banco.transacao() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 INSERT INTO velocidade (dispositivo_id, ping_ms, download_mb, upload_mb, timestamp)
                 VALUES (?, ?, ?, ?, ?)
             """, (dispositivo_id, ping, download, upload, timestamp))
-            conn.commit()
 
         resultado = {
             "dispositivo_id": dispositivo_id,
@@ -117,57 +107,60 @@ def medir_velocidade():
         traceback.print_exc()
         return {"erro": f"Falha na medição de velocidade: {str("Sem Rede Conectada!, precisa se conectar a uma rede!")}"}
 
-def listar_velocidades_da_maquina_local():
+def listar_velocidades_da_maquina_local(pagina=None):
     """
-    Lista todos os registros de velocidade da máquina local (pelo IP).
-    Retorna lista de { ping_ms, download_mb, upload_mb, timestamp }.
+    Lista uma página dos registros de velocidade da máquina local (pelo IP), do mais recente ao mais antigo.
+    Retorna (lista de { ping_ms, download_mb, upload_mb, timestamp }, proximo_cursor).
     """
+    pagina = pagina or paginacao.Pagina()
     ip_local, _ = obter_ip_maquina_local()
     if not ip_local:
         print("IP local não encontrado.")
-        return []
+        return [], None
 
-    with sqlite3.connect(DB_PATH) as conn:
+    with banco.transacao() as conn:
         cursor = conn.cursor()
         # Busca ID do dispositivo local
         cursor.execute("SELECT id FROM dispositivos WHERE ip = ?", (ip_local,))
         resultado = cursor.fetchone()
         if not resultado:
             print("Dispositivo local não encontrado no banco de dados.")
-            return []
+            return [], None
         dispositivo_id = resultado[0]
 
-        # Seleciona históricos de velocidade
-        cursor.execute("""
-            SELECT ping_ms, download_mb, upload_mb, timestamp
+        # Seleciona uma página do histórico pelo índice (dispositivo_id, timestamp)
+        condicoes, parametros = pagina.condicoes("timestamp", ["timestamp", "id"])
+        filtros = "".join(f" AND {c}" for c in condicoes)
+        cursor.execute(f"""
+            SELECT ping_ms, download_mb, upload_mb, timestamp, id
             FROM velocidade
-            WHERE dispositivo_id = ?
-            ORDER BY timestamp DESC
-        """, (dispositivo_id,))
+            WHERE dispositivo_id = ?{filtros}
+            ORDER BY timestamp DESC, id DESC
+            LIMIT ?
+        """, (dispositivo_id, *parametros, pagina.limite + 1))
 
+        linhas, proximo_cursor = pagina.fatiar(cursor.fetchall(), lambda row: (row[3], row[4]))
         registros = []
-        for row in cursor.fetchall():
+        for row in linhas:
             registros.append({
                 "ping_ms": row[0],
                 "download_mb": row[1],
                 "upload_mb": row[2],
                 "timestamp": row[3]
             })
-        return registros
+        return registros, proximo_cursor
     
 def deletar_historico_speedtest_local():
     ip =  buscar_ip_local()
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT id FROM dispositivos WHERE ip = ?", (ip,))
-            res = cursor.fetchone()
-            if not res:
-                return False
-            dispositivo_id = res[0]
-            cursor.execute("DELETE FROM velocidade WHERE dispositivo_id = ?", (dispositivo_id,))
-            conn.commit()
-            return True
+        cursor = banco.obter_conexao().execute("SELECT id FROM dispositivos WHERE ip = ?", (ip,))
+        res = cursor.fetchone()
+        if not res:
+            return False
+        dispositivo_id = res[0]
+        # Apaga em lotes, sem segurar a trava de escrita por toda a exclusão
+        retencao.apagar_em_lotes("velocidade", "dispositivo_id = ?", (dispositivo_id,))
+        return True
     except Exception as e:
         print("Erro ao deletar speedtest:", e)
         return False
@@ -178,5 +171,6 @@ if __name__ == "__main__":
     print("Medindo a velocidade da rede...")
     print(medir_velocidade())
     print("\nHistórico de velocidade da máquina local:")
-    for registro in listar_velocidades_da_maquina_local():
+    registros, _ = listar_velocidades_da_maquina_local()
+    for registro in registros:
         print(registro)
@@ -0,0 +1,136 @@
+# Registro de tarefas em segundo plano (varreduras, limpezas etc.).
+#
+# Cada tarefa roda em uma thread própria e recebe um ID para consulta de status.
+# Tarefas criadas com a mesma chave enquanto uma delas ainda está em andamento
+# são unificadas: quem chega depois recebe a tarefa já em execução.
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+
+import config
+
+PENDENTE = "pendente"
+EXECUTANDO = "executando"
+CONCLUIDA = "concluida"
+FALHOU = "falhou"
+
+
+class Tarefa:
+    """Uma execução em segundo plano com estado, resultado e horários."""
+
+    def __init__(self, tipo, chave=None):
+        self.id = uuid.uuid4().hex
+        self.tipo = tipo
+        self.chave = chave
+        self.estado = PENDENTE
+        self.criada_em = time.time()
+        self.iniciada_em = None
+        self.concluida_em = None
+        self.resultado = None
+        self.erro = None
+        self._evento = threading.Event()
+
+    @property
+    def finalizada(self):
+        return self._evento.is_set()
+
+    def aguardar(self, timeout=None):
+        """Espera o fim da tarefa por até timeout segundos; retorna True se terminou."""
+        return self._evento.wait(timeout)
+
+    def para_dict(self, incluir_resultado=False):
+        dados = {
+            "id": self.id,
+            "tipo": self.tipo,
+            "estado": self.estado,
+            "criada_em": self.criada_em,
+            "iniciada_em": self.iniciada_em,
+            "concluida_em": self.concluida_em,
+            "erro": self.erro,
+        }
+        if incluir_resultado:
+            dados["resultado"] = self.resultado
+        return dados
+
+
+_tarefas = OrderedDict()  # id -> Tarefa (as mais antigas são descartadas)
+_em_andamento = {}  # chave -> Tarefa ainda não finalizada
+_assinantes = []
+_lock = threading.Lock()
+
+
+# Registra uma função chamada com a Tarefa a cada mudança de estado (início e fim)
+def assinar(callback):
+    with _lock:
+        if callback not in _assinantes:
+            _assinantes.append(callback)
+
+
+def _emitir(tarefa):
+    with _lock:
+        assinantes = list(_assinantes)
+    for callback in assinantes:
+        try:
+            callback(tarefa)
+        except Exception as e:
+            print(f"[ERRO] Assinante de tarefas falhou: {e}")
+
+
+# Executa a função da tarefa registrando estado, resultado e erro
+def _executar(tarefa, funcao, args, kwargs):
+    tarefa.estado = EXECUTANDO
+    tarefa.iniciada_em = time.time()
+    _emitir(tarefa)
+    try:
+        tarefa.resultado = funcao(*args, **kwargs)
+        tarefa.estado = CONCLUIDA
+    except Exception as e:
+        traceback.print_exc()
+        tarefa.erro = str(e)
+        tarefa.estado = FALHOU
+    finally:
+        tarefa.concluida_em = time.time()
+        with _lock:
+            if tarefa.chave is not None and _em_andamento.get(tarefa.chave) is tarefa:
+                del _em_andamento[tarefa.chave]
+        tarefa._evento.set()
+        _emitir(tarefa)
+
+
+# Inicia uma tarefa; com chave, reaproveita a tarefa de mesma chave ainda em andamento
+def iniciar(tipo, funcao, *args, chave=None, **kwargs):
+    with _lock:
+        if chave is not None and chave in _em_andamento:
+            return _em_andamento[chave]
+
+        tarefa = Tarefa(tipo, chave)
+        _tarefas[tarefa.id] = tarefa
+        while len(_tarefas) > config.HISTORICO_TAREFAS:
+            _tarefas.popitem(last=False)
+        if chave is not None:
+            _em_andamento[chave] = tarefa
+
+    threading.Thread(
+        target=_executar, args=(tarefa, funcao, args, kwargs), name=f"tarefa-{tipo}", daemon=True
+    ).start()
+    return tarefa
+
+
+# Retorna a tarefa pelo ID (ou None se desconhecida ou já descartada)
+def obter(tarefa_id):
+    with _lock:
+        return _tarefas.get(tarefa_id)
+
+
+# Retorna a tarefa em andamento para a chave, se houver
+def em_andamento(chave):
+    with _lock:
+        return _em_andamento.get(chave)
+
+
+# Lista as tarefas registradas, das mais recentes para as mais antigas
+def listar(tipo=None):
+    with _lock:
+        return [t for t in reversed(_tarefas.values()) if tipo is None or t.tipo == tipo]
@@ -0,0 +1,27 @@
+# Configuração comum dos testes: os módulos do backend são importados da pasta
+# pai e cada teste usa um banco novo, criado pelas migrações num diretório
+# temporário (o monitoramento.db do repositório nunca é tocado).
+import os
+import sys
+import tempfile
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+os.environ.setdefault("MONITOR_DB_PATH", os.path.join(tempfile.mkdtemp(), "monitoramento.db"))
+
+import pytest  # noqa: E402
+
+import banco  # noqa: E402
+import config  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+@pytest.fixture
+def banco_temporario(tmp_path, monkeypatch):
+    banco.fechar()
+    monkeypatch.setattr(config, "DB_PATH", str(tmp_path / "monitoramento.db"))
+    monkeypatch.setattr(banco, "_migrado", False)
+    conn = banco.obter_conexao()
+    yield conn
+    banco.fechar()
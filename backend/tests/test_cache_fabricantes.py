@@ -0,0 +1,126 @@
+# Cache de fabricantes contra uma API local (http.server) no lugar da remota:
+# single-flight, cache negativo, validade e limite de taxa.
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import cache_fabricantes
+import config
+
+# OUI -> (status, corpo) respondido pela API local; os demais recebem 200 "Outro Fabricante"
+RESPOSTAS = {
+    "00:1A:2B": (200, "Fabricante Teste"),
+    "00:11:22": (404, "Not Found"),
+    "00:99:99": (500, "erro"),
+}
+ATRASO = 0.3  # segundos que a API local leva para responder
+
+
+class _API(BaseHTTPRequestHandler):
+    def do_GET(self):
+        oui = self.path.lstrip("/")
+        self.server.requisicoes.append((oui, time.monotonic()))
+        time.sleep(ATRASO)
+        status, corpo = RESPOSTAS.get(oui, (200, "Outro Fabricante"))
+        corpo = corpo.encode()
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def api(banco_temporario, monkeypatch):
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), _API)
+    servidor.requisicoes = []
+    thread = threading.Thread(target=servidor.serve_forever, daemon=True)
+    thread.start()
+
+    monkeypatch.setattr(config, "URL_API_FABRICANTES", f"http://127.0.0.1:{servidor.server_port}/{{oui}}")
+    monkeypatch.setattr(config, "TIMEOUT_API_FABRICANTES", 2.0)
+    monkeypatch.setattr(config, "TAXA_API_FABRICANTES", 100.0)
+    # Estado do módulo limpo: sem cache, consultas em andamento nem trabalhador
+    monkeypatch.setattr(cache_fabricantes, "_cache", {})
+    monkeypatch.setattr(cache_fabricantes, "_voos", {})
+    monkeypatch.setattr(cache_fabricantes, "_fila", queue.Queue())
+    monkeypatch.setattr(cache_fabricantes, "_trabalhador", None)
+    monkeypatch.setattr(cache_fabricantes, "_cache_carregado", False)
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def _ouis(servidor):
+    return [oui for oui, _ in servidor.requisicoes]
+
+
+def test_single_flight(api, banco_temporario):
+    banco_temporario.execute(
+        "INSERT INTO dispositivos (ip, mac, fabricante, online) VALUES ('10.0.0.5', '00:1A:2B:00:00:05', ?, 1)",
+        (cache_fabricantes.PENDENTE,))
+    banco_temporario.commit()
+
+    resultados = []
+    threads = [threading.Thread(target=lambda i=i: resultados.append(
+        cache_fabricantes.resolver(f"00:1a:2b:00:00:{i:02x}"))) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert resultados == ["Fabricante Teste"] * 8
+    assert _ouis(api) == ["00:1A:2B"]
+    # O dispositivo que aguardava o OUI é preenchido
+    assert banco_temporario.execute(
+        "SELECT fabricante FROM dispositivos WHERE mac = '00:1A:2B:00:00:05'").fetchone() == ("Fabricante Teste",)
+
+
+def test_cache_negativo(api, banco_temporario):
+    assert cache_fabricantes.resolver("00:11:22:33:44:55") is None
+    # "Não encontrado" fica em cache: nem a memória nem o banco voltam a consultar a API
+    assert cache_fabricantes.consultar("00:11:22:aa:bb:cc") is None
+    assert _ouis(api) == ["00:11:22"]
+    fabricante, expira_em = banco_temporario.execute(
+        "SELECT fabricante, expira_em FROM cache_fabricantes WHERE oui = '00:11:22'").fetchone()
+    assert fabricante is None
+    assert expira_em == pytest.approx(time.time() + config.TTL_FABRICANTE_NEGATIVO, abs=60)
+
+    # Falhas também, com a validade curta
+    assert cache_fabricantes.resolver("00:99:99:00:00:01") is None
+    assert cache_fabricantes.consultar("00:99:99:00:00:02") is None
+    assert _ouis(api) == ["00:11:22", "00:99:99"]
+    assert cache_fabricantes._cache["00:99:99"][1] == pytest.approx(
+        time.time() + config.TTL_FABRICANTE_FALHA, abs=60)
+
+
+def test_validade(api, monkeypatch):
+    monkeypatch.setattr(config, "TTL_FABRICANTE", 0.5)
+    assert cache_fabricantes.resolver("00:33:44:00:00:01") == "Outro Fabricante"
+    assert cache_fabricantes.consultar("00:33:44:00:00:01") == "Outro Fabricante"
+    assert _ouis(api) == ["00:33:44"]
+
+    time.sleep(0.6)
+    # Expirada: a consulta volta a ficar pendente e a API é consultada de novo
+    assert cache_fabricantes.consultar("00:33:44:00:00:01") == cache_fabricantes.PENDENTE
+    assert cache_fabricantes.resolver("00:33:44:00:00:01") == "Outro Fabricante"
+    assert _ouis(api) == ["00:33:44", "00:33:44"]
+
+
+def test_limite_de_taxa(api, monkeypatch):
+    monkeypatch.setattr(config, "TAXA_API_FABRICANTES", 2.0)
+    ouis = ["00:55:66", "00:55:67", "00:55:68"]
+    for oui in ouis:
+        assert cache_fabricantes.consultar(oui + ":00:00:01") == cache_fabricantes.PENDENTE
+    for oui in ouis:
+        assert cache_fabricantes.resolver(oui + ":00:00:01", timeout=5) == "Outro Fabricante"
+
+    assert _ouis(api) == ouis
+    # Uma requisição por vez, com no mínimo 1 / TAXA_API_FABRICANTES segundos entre os inícios
+    inicios = [momento for _, momento in api.requisicoes]
+    assert all(b - a >= 0.5 - 0.05 for a, b in zip(inicios, inicios[1:]))
@@ -0,0 +1,131 @@
+# Importação de capturas: totais por dispositivo e reimportação sem contagem dupla.
+#
+# fixtures/captura.pcap (Ethernet, microssegundos, little-endian):
+#   t=1000  A -> B, IPv4, 54 bytes capturados (58 no fio)
+#   t=1000  B -> externo, IPv4 com VLAN, 58 (62 no fio)
+#   t=1001  externo -> A, IPv4, 94 (98 no fio)
+#   t=1001  A -> broadcast, ARP (atribuído pelo MAC), 42 (46 no fio)
+#   t=1002  externo -> externo, ignorado
+# fixtures/captura.pcapng (Linux SLL2, nanossegundos, big-endian):
+#   t=2000.25  A -> externo, 140 bytes
+#   t=2000.75  externo -> B, 70 bytes
+#   t=2001.5   externo -> A, 60 bytes
+import os
+import shutil
+
+import pytest
+
+import importar_capturas
+from conftest import FIXTURES
+
+A = ("198.51.100.10", "02:00:00:00:00:0A")
+B = ("198.51.100.20", "02:00:00:00:00:14")
+
+
+@pytest.fixture
+def dispositivos(banco_temporario):
+    ids = {}
+    for nome, (ip, mac) in (("A", A), ("B", B)):
+        cursor = banco_temporario.execute(
+            "INSERT INTO dispositivos (ip, mac, hostname, online) VALUES (?, ?, ?, 1)", (ip, mac, nome))
+        ids[nome] = cursor.lastrowid
+    banco_temporario.commit()
+    return ids
+
+
+@pytest.fixture
+def capturas(tmp_path):
+    for nome in ("captura.pcap", "captura.pcapng"):
+        shutil.copy(os.path.join(FIXTURES, nome), tmp_path / nome)
+    return tmp_path / "captura.pcap", tmp_path / "captura.pcapng"
+
+
+# Totais acumulados (download, upload) da série de um dispositivo
+def _serie(conn, dispositivo_id):
+    return conn.execute("""
+        SELECT ultimo_download, ultimo_upload FROM trafego_blocos
+        WHERE dispositivo_id = ? ORDER BY inicio DESC LIMIT 1
+    """, (dispositivo_id,)).fetchone()
+
+
+# Contagens (pacotes recebidos, enviados, bytes recebidos, enviados) de um dispositivo num arquivo
+def _por_arquivo(conn, caminho, dispositivo_id):
+    return conn.execute("""
+        SELECT d.pacotes_recebidos, d.pacotes_enviados, d.bytes_recebidos, d.bytes_enviados
+        FROM capturas_dispositivos d JOIN capturas c ON c.id = d.captura_id
+        WHERE c.caminho = ? AND d.dispositivo_id = ?
+    """, (str(caminho), dispositivo_id)).fetchone()
+
+
+def test_pcap_totais_por_dispositivo(banco_temporario, dispositivos, capturas):
+    pcap, _ = capturas
+    resumo = importar_capturas.Importador(incluir_local=True).importar(pcap)
+
+    assert resumo["formato"] == "pcap"
+    assert resumo["pacotes"] == 5
+    assert resumo["ignorados"] == 1
+    assert resumo["dispositivos"] == 2
+    assert _por_arquivo(banco_temporario, pcap, dispositivos["A"]) == (1, 2, 98, 58 + 46)
+    assert _por_arquivo(banco_temporario, pcap, dispositivos["B"]) == (1, 1, 58, 62)
+    assert _serie(banco_temporario, dispositivos["A"]) == (98, 104)
+    assert _serie(banco_temporario, dispositivos["B"]) == (58, 62)
+
+
+def test_pcapng_continua_a_serie(banco_temporario, dispositivos, capturas):
+    pcap, pcapng = capturas
+    importador = importar_capturas.Importador(incluir_local=True)
+    importador.importar(pcap)
+    resumo = importador.importar(pcapng)
+
+    assert resumo["formato"] == "pcapng"
+    assert resumo["pacotes"] == 3
+    assert resumo["ignorados"] == 0
+    assert _por_arquivo(banco_temporario, pcapng, dispositivos["A"]) == (1, 1, 60, 140)
+    assert _por_arquivo(banco_temporario, pcapng, dispositivos["B"]) == (1, 0, 70, 0)
+    assert _serie(banco_temporario, dispositivos["A"]) == (98 + 60, 104 + 140)
+    assert _serie(banco_temporario, dispositivos["B"]) == (58 + 70, 62)
+
+
+def test_reimportar_nao_conta_duas_vezes(banco_temporario, dispositivos, capturas):
+    pcap, pcapng = capturas
+    importar_capturas.Importador(incluir_local=True).importar(pcap)
+    importar_capturas.Importador(incluir_local=True).importar(pcapng)
+    antes = [_serie(banco_temporario, dispositivos[nome]) for nome in ("A", "B")]
+
+    # Arquivo já registrado: ignorado
+    importador = importar_capturas.Importador(incluir_local=True)
+    assert importador.importar(pcap) is None
+    assert importador.importar(pcapng) is None
+
+    # Forçado: relido, mas os segundos já gravados na série não contam de novo
+    resumo = importador.importar(pcap, forcar=True)
+    assert resumo["pacotes"] == 5
+    assert resumo["ignorados"] == 1
+    assert resumo["descartados"] == 4
+    assert resumo["dispositivos"] == 0
+    assert [_serie(banco_temporario, dispositivos[nome]) for nome in ("A", "B")] == antes
+    assert banco_temporario.execute("SELECT COUNT(*) FROM capturas").fetchone()[0] == 2
+
+
+def test_captura_anterior_a_serie(banco_temporario, dispositivos, capturas):
+    pcap, pcapng = capturas
+    importar_capturas.Importador(incluir_local=True).importar(pcapng)
+    antes = [_serie(banco_temporario, dispositivos[nome]) for nome in ("A", "B")]
+
+    # O pcap (t=1000) é anterior à série gravada pelo pcapng (t=2000): recusado sem gravar nada
+    with pytest.raises(ValueError, match="4 pacotes de 2 dispositivo"):
+        importar_capturas.Importador(incluir_local=True).importar(pcap)
+    assert banco_temporario.execute("SELECT COUNT(*) FROM capturas").fetchone()[0] == 1
+
+    # Com sobrepor, é importado e os pacotes descartados aparecem no resumo
+    resumo = importar_capturas.Importador(incluir_local=True).importar(pcap, sobrepor=True)
+    assert resumo["descartados"] == 4
+    assert resumo["ignorados"] == 1
+    assert [_serie(banco_temporario, dispositivos[nome]) for nome in ("A", "B")] == antes
+
+
+def test_arquivo_invalido(banco_temporario, tmp_path):
+    caminho = tmp_path / "texto.pcap"
+    caminho.write_bytes(b"nada de captura aqui")
+    with pytest.raises(ValueError):
+        importar_capturas.Importador().importar(caminho)
@@ -1,63 +1,107 @@
-import psutil
-import sqlite3
-import socket
-from datetime import datetime
-from flask import Blueprint, jsonify
+import time
+from datetime import datetime, timedelta
+from flask import Blueprint
+import config
+import identidade
+import banco
+import buffer_escrita
+import contabilidade
+import serie_temporal
+import paginacao
+import retencao
 
-DB_PATH = "monitoramento.db"
+BYTES_POR_MB = 1024 * 1024
 
 # Blueprint para o tráfego
 trafego_bp = Blueprint("trafego", __name__)
 
 def buscar_ip_local():
-    """Obtém informações da máquina local, incluindo hostname e IP."""
-    hostname = socket.gethostname()
-    ip = socket.gethostbyname(hostname)
-    return ip
+    """Obtém o IP da máquina local a partir da identidade compartilhada."""
+    return identidade.ip_local()
+
+# IDs dos dispositivos locais já registrados, por (IP, MAC) (evita consultar o banco a cada amostra)
+_dispositivos_locais = {}
+
+def dispositivo_local_id(ip):
+    """
+    Retorna o ID do dispositivo local, registrando-o na primeira vez. O registro é
+    feito pelo MAC: se o IP da máquina mudar, a mesma linha é atualizada.
+    """
+    mac = identidade.mac_local() or "Desconhecido"
+    dispositivo_id = _dispositivos_locais.get((ip, mac))
+    if dispositivo_id is not None:
+        return dispositivo_id
+
+    with banco.transacao(imediata=True) as conn:
+        dispositivo = None
+        if mac == "Desconhecido":
+            # Sem MAC, o dispositivo só pode ser reconhecido pelo IP
+            dispositivo = conn.execute("SELECT id FROM dispositivos WHERE ip = ?", (ip,)).fetchone()
+        if dispositivo is None:
+            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")  # Formato ISO 8601
+            dispositivo = conn.execute("""
+                INSERT INTO dispositivos (ip, mac, hostname, ultima_verificacao, online)
+                VALUES (?, ?, ?, ?, 1)
+                ON CONFLICT(mac) DO UPDATE SET ip = excluded.ip, hostname = excluded.hostname
+                RETURNING id
+            """, (ip, mac, identidade.hostname_local(), timestamp)).fetchone()
+        dispositivo_id = dispositivo[0]
+
+    _dispositivos_locais[(ip, mac)] = dispositivo_id
+    return dispositivo_id
+
+def _gravar_amostras(conn, itens):
+    """Grava um lote de amostras (dispositivo_id, epoch, bytes recebidos, bytes enviados) do buffer."""
+    por_dispositivo = {}
+    for dispositivo_id, ts, recebidos, enviados in itens:
+        por_dispositivo.setdefault(dispositivo_id, []).append((ts, recebidos, enviados))
+
+    for dispositivo_id, amostras in por_dispositivo.items():
+        amostras.sort(key=lambda amostra: amostra[0])
+        serie_temporal.gravar(conn, dispositivo_id, amostras)
+        # Atualizar a última verificação com a amostra mais recente do lote, no máximo uma vez
+        # por INTERVALO_MINIMO_VERIFICACAO (cada escrita em dispositivos invalida o cache das rotas)
+        ultima = datetime.fromtimestamp(amostras[-1][0])
+        timestamp = ultima.strftime("%Y-%m-%d %H:%M:%S")
+        limite = (ultima - timedelta(seconds=config.INTERVALO_MINIMO_VERIFICACAO)).strftime("%Y-%m-%d %H:%M:%S")
+        atualizado = conn.execute("""
+            UPDATE dispositivos SET ultima_verificacao = ?, online = 1
+            WHERE id = ? AND (ultima_verificacao IS NULL OR ultima_verificacao < ? OR online = 0)
+        """, (timestamp, dispositivo_id, limite)).rowcount
+        if not atualizado and not conn.execute("SELECT 1 FROM dispositivos WHERE id = ?", (dispositivo_id,)).fetchone():
+            # O dispositivo foi apagado: a próxima medição o registra de novo
+            for chave, id_local in list(_dispositivos_locais.items()):
+                if id_local == dispositivo_id:
+                    _dispositivos_locais.pop(chave, None)
+
+    # Marcos da contabilidade por interface, gravados junto com as amostras
+    contabilidade.salvar(conn)
+
+# Amostras esperando gravação; gravadas em lotes por uma thread (ver buffer_escrita.py)
+buffer_amostras = buffer_escrita.BufferEscrita("trafego", _gravar_amostras)
+
+def registrar_amostra(agora, bytes_recebidos, bytes_enviados, ip=None):
+    """Enfileira uma amostra dos contadores (em bytes) da máquina local para a série temporal."""
+    dispositivo_id = dispositivo_local_id(ip or buscar_ip_local())
+    return buffer_amostras.adicionar((dispositivo_id, agora, bytes_recebidos, bytes_enviados))
 
 def medir_trafego_local():
-    """Mede o tráfego de rede da máquina local e registra os dados no banco de dados."""
+    """
+    Mede o tráfego de rede da máquina local e enfileira a amostra para gravação em lote.
+    A amostra aparece no histórico em até INTERVALO_BUFFER segundos.
+    """
     ip = buscar_ip_local()
-    io = psutil.net_io_counters()
-    download = round(io.bytes_recv / (1024 * 1024), 2)  # Convertido para MB
-    upload = round(io.bytes_sent / (1024 * 1024), 2)
+    agora = time.time()
+    # Totais acumulados em bytes, resistentes a reinícios dos contadores (ver contabilidade.py)
+    recebidos, enviados = contabilidade.observar(agora=agora)
+    download = round(recebidos / BYTES_POR_MB, 2)  # Convertido para MB
+    upload = round(enviados / BYTES_POR_MB, 2)
     total = round(download + upload, 2)
-    
-    # Conectar ao banco de dados
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    # Verificar se o dispositivo já está cadastrado
-    cursor.execute("SELECT id, ip FROM dispositivos WHERE ip = ?", (ip,))
-    dispositivo = cursor.fetchone()
+    timestamp = datetime.fromtimestamp(agora).strftime("%Y-%m-%d %H:%M:%S")  # Formato ISO 8601
 
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")  # Formato ISO 8601
-    
-    if dispositivo:
-        dispositivo_id, dispositivo_ip = dispositivo
-        # Atualizar IP e última verificação
-        cursor.execute("""
-            UPDATE dispositivos 
-            SET ip = ?, ultima_verificacao = ?, online = 1
-            WHERE id = ?
-        """, (ip, timestamp, dispositivo_id))
-    else:
-        # Insere novo dispositivo
-        cursor.execute("""
-            INSERT INTO dispositivos (ip, ultima_verificacao, online) 
-            VALUES (?, ?, 1)
-        """, (ip, timestamp))
-        dispositivo_id = cursor.lastrowid
-        dispositivo_ip = ip
-    
-    # Inserir registro de tráfego
-    cursor.execute("""
-        INSERT INTO trafego (dispositivo_id, download_mb, upload_mb, timestamp)
-        VALUES (?, ?, ?, ?)
-    """, (dispositivo_id, download, upload, timestamp))
-    
-    conn.commit()
-    conn.close()
+    # Registrar a amostra (contadores em bytes) na série temporal, via buffer de escrita
+    registrar_amostra(agora, recebidos, enviados, ip)
+    dispositivo_ip = ip
     
     resultado = {
         "data": timestamp,
@@ -71,11 +115,16 @@ def medir_trafego_local():
           f"Download: {resultado['download_mb']} MB | Upload: {resultado['upload_mb']} MB | Total: {resultado['total_mb']} MB")
     return resultado
 
-def listar_trafego_local():
-    """Lista os registros de tráfego da máquina local a partir do banco de dados."""
+def listar_trafego_local(pagina=None):
+    """
+    Lista uma página dos registros de tráfego da máquina local, do mais recente ao mais antigo.
+    Retorna (registros, proximo_cursor); o cursor guarda o timestamp da última amostra
+    entregue e quantas amostras com esse mesmo timestamp já foram entregues.
+    """
+    pagina = pagina or paginacao.Pagina()
     ip = buscar_ip_local()
     
-    conn = sqlite3.connect(DB_PATH)
+    conn = banco.obter_conexao()
     cursor = conn.cursor()
     
     # Busca o ID do dispositivo local
@@ -84,43 +133,75 @@ def listar_trafego_local():
     
     if not resultado:
         print(f"[AVISO] Nenhum dispositivo encontrado com IP {ip}")
-        conn.close()
-        return []
+        return [], None
 
     dispositivo_id = resultado[0]
 
-    # Busca todos os registros de tráfego
-    cursor.execute("""
-        SELECT download_mb, upload_mb, timestamp 
-        FROM trafego 
-        WHERE dispositivo_id = ?
-        ORDER BY timestamp DESC
-    """, (dispositivo_id,))
-    
-    trafegos = cursor.fetchall()
-    conn.close()
+    fim = pagina.fim
+    ts_cursor, pular = None, 0
+    if pagina.cursor:
+        if len(pagina.cursor) != 2:
+            raise ValueError("Cursor inválido")
+        ts_cursor, pular = int(pagina.cursor[0]), int(pagina.cursor[1])
+        fim = ts_cursor if fim is None else min(fim, ts_cursor)
+
+    # Percorre a série temporal de trás para frente só até preencher a página
+    amostras = []
+    for amostra in serie_temporal.amostras(dispositivo_id, pagina.inicio, fim, decrescente=True):
+        if amostra[0] == ts_cursor and pular:
+            pular -= 1
+            continue
+        amostras.append(amostra)
+        if len(amostras) > pagina.limite:
+            break
+
+    proximo_cursor = None
+    if len(amostras) > pagina.limite:
+        amostras = amostras[:pagina.limite]
+        ultimo_ts = amostras[-1][0]
+        repetidas = sum(1 for amostra in amostras if amostra[0] == ultimo_ts)
+        if ultimo_ts == ts_cursor:
+            repetidas += int(pagina.cursor[1])
+        proximo_cursor = paginacao.codificar_cursor([ultimo_ts, repetidas])
 
     registros = [
-        {"download_mb": dl, "upload_mb": ul, "timestamp": ts}
-        for dl, ul, ts in trafegos
+        {
+            "download_mb": round(dl / BYTES_POR_MB, 2),
+            "upload_mb": round(ul / BYTES_POR_MB, 2),
+            "timestamp": datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        for ts, dl, ul in amostras
     ]
     
     print(f"[INFO] {len(registros)} registros de tráfego encontrados para IP {ip}")
-    return registros
+    return registros, proximo_cursor
+
+def serie_trafego_local(inicio=None, fim=None, resolucao=None, pontos=None):
+    """Retorna a série temporal de tráfego da máquina local no nível adequado à resolução pedida."""
+    ip = buscar_ip_local()
+    cursor = banco.obter_conexao().execute("SELECT id FROM dispositivos WHERE ip = ?", (ip,))
+    resultado = cursor.fetchone()
+    if not resultado:
+        print(f"[AVISO] Nenhum dispositivo encontrado com IP {ip}")
+        return None
+    return serie_temporal.consultar(resultado[0], inicio, fim, resolucao, pontos)
 
 def deletar_historico_trafego_local():
     ip = buscar_ip_local()
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT id FROM dispositivos WHERE ip = ?", (ip,))
-            res = cursor.fetchone()
-            if not res:
-                return False
-            dispositivo_id = res[0]
-            cursor.execute("DELETE FROM trafego WHERE dispositivo_id = ?", (dispositivo_id,))
-            conn.commit()
-            return True
+        cursor = banco.obter_conexao().execute("SELECT id FROM dispositivos WHERE ip = ?", (ip,))
+        res = cursor.fetchone()
+        if not res:
+            return False
+        dispositivo_id = res[0]
+        # Grava antes as amostras pendentes, para que não voltem depois da exclusão
+        buffer_amostras.esvaziar()
+        # Apaga em lotes, sem segurar a trava de escrita por toda a exclusão
+        retencao.apagar_em_lotes("trafego", "dispositivo_id = ?", (dispositivo_id,))
+        retencao.apagar_em_lotes("trafego_blocos", "dispositivo_id = ?", (dispositivo_id,))
+        retencao.apagar_em_lotes("trafego_agregados", "dispositivo_id = ?", (dispositivo_id,),
+                                 chave="dispositivo_id, nivel, balde")
+        return True
     except Exception as e:
         print("Erro ao deletar tráfego:", e)
         return False
@@ -132,6 +213,6 @@ if __name__ == "__main__":
     print("Iniciando monitoramento de tráfego de rede...")
     medir_trafego_local()
     # Opcional: testar também a listagem
-    registros = listar_trafego_local()
+    registros, _ = listar_trafego_local()
     for r in registros:
         print(r)
@@ -0,0 +1,93 @@
+# Varreduras da rede em segundo plano com resultado compartilhado.
+#
+# Só existe uma varredura em andamento por processo: pedidos simultâneos se
+# juntam à tarefa em execução. O último resultado concluído fica em memória
+# (ou é reconstruído a partir do banco) para ser servido imediatamente.
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import monitor
+import banco
+import tarefas
+
+
+# Chave usada para unificar varreduras simultâneas
+CHAVE_VARREDURA = "varredura-rede"
+
+_ultimo = {"dispositivos": None, "concluida_em": None}
+_assinantes = []
+_lock = threading.Lock()
+
+
+# Registra uma função chamada com a lista de dispositivos ao fim de cada varredura
+def assinar(callback):
+    with _lock:
+        if callback not in _assinantes:
+            _assinantes.append(callback)
+
+
+# Executa a varredura e guarda o resultado como o último instantâneo
+def _executar_varredura():
+    dispositivos = monitor.escanear_rede()
+    with _lock:
+        _ultimo["dispositivos"] = dispositivos
+        _ultimo["concluida_em"] = time.time()
+        assinantes = list(_assinantes)
+    for callback in assinantes:
+        try:
+            callback(dispositivos)
+        except Exception as e:
+            print(f"[ERRO] Assinante de varredura falhou: {e}")
+    return {"total": len(dispositivos)}
+
+
+# Inicia uma varredura ou retorna a que já está em andamento
+def iniciar_varredura():
+    return tarefas.iniciar("varredura", _executar_varredura, chave=CHAVE_VARREDURA)
+
+
+# Reconstrói o instantâneo a partir dos dispositivos online gravados no banco
+def _carregar_do_banco():
+    try:
+        with banco.transacao() as conn:
+            linhas = conn.execute("""
+                SELECT ip, mac, hostname, fabricante, tipo, ultima_verificacao
+                FROM dispositivos WHERE online = 1
+            """).fetchall()
+    except sqlite3.Error as e:
+        print(f"[ERRO] Falha ao carregar dispositivos do banco: {e}")
+        return None, None
+    if not linhas:
+        return None, None
+
+    dispositivos = [{
+        "ip": ip,
+        "mac": mac,
+        "hostname": hostname,
+        "fabricante": fabricante,
+        "tipo": tipo,
+        "online": True
+    } for ip, mac, hostname, fabricante, tipo, _ in linhas]
+
+    try:
+        mais_recente = max(datetime.strptime(l[5], "%Y-%m-%d %H:%M:%S") for l in linhas if l[5])
+        concluida_em = mais_recente.timestamp()
+    except ValueError:
+        concluida_em = 0.0
+    return dispositivos, concluida_em
+
+
+# Retorna (dispositivos, idade em segundos) do último resultado, ou (None, None)
+def ultimo_resultado():
+    with _lock:
+        dispositivos, concluida_em = _ultimo["dispositivos"], _ultimo["concluida_em"]
+    if dispositivos is None:
+        dispositivos, concluida_em = _carregar_do_banco()
+        if dispositivos is None:
+            return None, None
+        with _lock:
+            if _ultimo["dispositivos"] is None:
+                _ultimo["dispositivos"], _ultimo["concluida_em"] = dispositivos, concluida_em
+    return dispositivos, max(0.0, time.time() - concluida_em)
@@ -0,0 +1,192 @@
+# Serviço da tabela de vizinhos (IP -> MAC) do sistema.
+#
+# A tabela é lida uma vez por varredura a partir de /proc/net/arp (sem criar
+# processos), com "ip neigh" e "arp -a" como alternativas em outros sistemas.
+# Consultas a IPs ausentes disparam no máximo uma releitura a cada
+# INTERVALO_TABELA_ARP segundos, mesclada à tabela existente. Os estados dos
+# vizinhos (REACHABLE, STALE...) vêm de um único dump de netlink (ou "ip neigh")
+# por intervalo, compartilhado por todas as sondas em espera.
+import re
+import socket
+import struct
+import subprocess
+import threading
+import time
+
+import config
+
+_REGEX_MAC = re.compile(r"([0-9A-Fa-f]{1,2}[-:]){5}[0-9A-Fa-f]{1,2}")
+_REGEX_IP = re.compile(r"\b(\d{1,3}(?:\.\d{1,3}){3})\b")
+
+_tabela = {}  # ip -> mac (maiúsculo, separado por ":")
+_lidos_em = 0.0
+_lock = threading.Lock()
+
+
+# Normaliza um MAC para o formato AA:BB:CC:DD:EE:FF
+def normalizar_mac(mac):
+    partes = mac.replace("-", ":").split(":")
+    return ":".join(p.zfill(2) for p in partes).upper()
+
+
+# Lê a tabela ARP do kernel Linux; flags 0x0 indicam entrada incompleta
+def _ler_proc_net_arp():
+    tabela = {}
+    with open("/proc/net/arp") as f:
+        next(f, None)
+        for linha in f:
+            campos = linha.split()
+            if len(campos) >= 4 and campos[2] != "0x0" and campos[3] != "00:00:00:00:00:00":
+                tabela[campos[0]] = normalizar_mac(campos[3])
+    return tabela
+
+
+# Lê a tabela de vizinhos com "ip -4 neigh" (ignora entradas FAILED/INCOMPLETE)
+def _ler_ip_neigh():
+    tabela = {}
+    saida = subprocess.check_output(["ip", "-4", "neigh", "show"], timeout=5).decode(errors="ignore")
+    for linha in saida.splitlines():
+        campos = linha.split()
+        if "lladdr" in campos and campos[-1] not in ("FAILED", "INCOMPLETE"):
+            tabela[campos[0]] = normalizar_mac(campos[campos.index("lladdr") + 1])
+    return tabela
+
+
+# Lê a tabela com "arp -a" (Windows, macOS e sistemas sem /proc)
+def _ler_arp_a():
+    tabela = {}
+    saida = subprocess.check_output(["arp", "-a"], timeout=5).decode(errors="ignore")
+    for linha in saida.splitlines():
+        ip = _REGEX_IP.search(linha)
+        mac = _REGEX_MAC.search(linha)
+        if ip and mac:
+            tabela[ip.group(1)] = normalizar_mac(mac.group(0))
+    return tabela
+
+
+# Tenta cada fonte em ordem até uma funcionar
+def _ler_tabela_sistema():
+    for leitor in (_ler_proc_net_arp, _ler_ip_neigh, _ler_arp_a):
+        try:
+            return leitor()
+        except (OSError, subprocess.SubprocessError):
+            continue
+    print("[ERRO] Nenhuma fonte de tabela ARP disponível")
+    return {}
+
+
+# Relê a tabela do sistema e mescla com o instantâneo atual
+def atualizar():
+    global _lidos_em
+    novas = _ler_tabela_sistema()
+    with _lock:
+        _tabela.update(novas)
+        _lidos_em = time.monotonic()
+
+
+# Descarta o instantâneo e lê a tabela do zero (início de cada varredura)
+def recarregar():
+    global _lidos_em
+    novas = _ler_tabela_sistema()
+    with _lock:
+        _tabela.clear()
+        _tabela.update(novas)
+        _lidos_em = time.monotonic()
+
+
+# Retorna o MAC de um IP ou None; relê a tabela se o IP ainda não apareceu
+def obter_mac(ip):
+    with _lock:
+        mac = _tabela.get(ip)
+        recente = time.monotonic() - _lidos_em < config.INTERVALO_TABELA_ARP
+    if mac or recente:
+        return mac
+    atualizar()
+    with _lock:
+        return _tabela.get(ip)
+
+
+# ==== ESTADOS DOS VIZINHOS ====
+
+# Estados NUD do kernel (ndm_state) pelo nome usado no "ip neigh"
+_NUD = ((0x01, "INCOMPLETE"), (0x02, "REACHABLE"), (0x04, "STALE"), (0x08, "DELAY"),
+        (0x10, "PROBE"), (0x20, "FAILED"), (0x40, "NOARP"), (0x80, "PERMANENT"))
+_RTM_GETNEIGH = 30
+_NLMSG_DONE = 3
+_NLMSG_ERROR = 2
+_NDA_DST = 1
+
+_estados = None  # ip -> estado NUD, ou None se o sistema não informa estados
+_estados_lidos_em = 0.0
+_lock_estados = threading.Lock()
+
+
+# Lê os estados de todos os vizinhos IPv4 com um único dump de netlink (sem criar processos)
+def _ler_estados_netlink():
+    if not hasattr(socket, "AF_NETLINK"):
+        raise OSError("netlink indisponível")
+    estados = {}
+    with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE) as sock:
+        sock.settimeout(2)
+        # nlmsghdr (NLM_F_REQUEST | NLM_F_DUMP) + ndmsg com a família AF_INET
+        sock.send(struct.pack("=IHHII", 28, _RTM_GETNEIGH, 0x301, 1, 0) +
+                  struct.pack("=BxxxiHBB", socket.AF_INET, 0, 0, 0, 0))
+        while True:
+            dados = sock.recv(65536)
+            posicao = 0
+            while posicao + 16 <= len(dados):
+                tamanho, tipo = struct.unpack_from("=IH", dados, posicao)
+                if tipo == _NLMSG_DONE:
+                    return estados
+                if tipo == _NLMSG_ERROR or tamanho < 16:
+                    raise OSError("falha no dump de vizinhos")
+                if tipo == 28:  # RTM_NEWNEIGH
+                    nud = struct.unpack_from("=H", dados, posicao + 24)[0]
+                    atributo = posicao + 28
+                    fim = posicao + tamanho
+                    while atributo + 4 <= fim:
+                        comprimento, codigo = struct.unpack_from("=HH", dados, atributo)
+                        if comprimento < 4:
+                            break
+                        if codigo == _NDA_DST and comprimento == 8:
+                            ip = socket.inet_ntoa(dados[atributo + 4:atributo + 8])
+                            estados[ip] = next((nome for bit, nome in _NUD if nud & bit), "NONE")
+                        atributo += (comprimento + 3) & ~3
+                posicao += (tamanho + 3) & ~3
+
+
+# Lê os estados de todos os vizinhos IPv4 com um único "ip -4 neigh"
+def _ler_estados_ip_neigh():
+    estados = {}
+    saida = subprocess.check_output(["ip", "-4", "neigh", "show"], timeout=5).decode(errors="ignore")
+    for linha in saida.splitlines():
+        campos = linha.split()
+        if len(campos) >= 2:
+            estados[campos[0]] = campos[-1]
+    return estados
+
+
+# Estados de todos os vizinhos, relidos de uma vez no máximo a cada INTERVALO_TABELA_ARP
+# segundos e compartilhados por todas as consultas; None se nenhuma fonte informa estados
+def _tabela_estados():
+    global _estados, _estados_lidos_em
+    with _lock_estados:
+        if time.monotonic() - _estados_lidos_em >= config.INTERVALO_TABELA_ARP:
+            _estados = None
+            for leitor in (_ler_estados_netlink, _ler_estados_ip_neigh):
+                try:
+                    _estados = leitor()
+                    break
+                except (OSError, subprocess.SubprocessError, struct.error):
+                    continue
+            _estados_lidos_em = time.monotonic()
+        return _estados
+
+
+# Estado NUD de um vizinho (REACHABLE, STALE, DELAY, PROBE, FAILED...), "" se não houver
+# entrada, ou None se o sistema não informa estados (use obter_mac nesse caso)
+def estado(ip):
+    estados = _tabela_estados()
+    if estados is None:
+        return None
+    return estados.get(ip, "")
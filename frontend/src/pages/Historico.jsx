@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import axios from 'axios';
 import { Line } from 'react-chartjs-2';
 import {
@@ -13,17 +13,27 @@ import {
 
 ChartJS.register(LineElement, PointElement, CategoryScale, LinearScale, Tooltip, Legend);
 
+const LIMITE_PAGINA = 100;
+
 function Historico() {
   const [tipoSelecionado, setTipoSelecionado] = useState('dispositivos');
   const [dados, setDados] = useState([]);
   const [periodo, setPeriodo] = useState('todos');
+  const [proximoCursor, setProximoCursor] = useState(null);
+  const [carregando, setCarregando] = useState(false);
+  const tipoAtual = useRef(tipoSelecionado);
+  tipoAtual.current = tipoSelecionado;
   const API_URL = "https://mynetwork-egj2.onrender.com";
 
   useEffect(() => {
+    setDados([]);
+    setProximoCursor(null);
     buscarHistorico(tipoSelecionado);
   }, [tipoSelecionado]);
 
-  const buscarHistorico = async (tipo) => {
+  // As rotas de histórico são paginadas: cada página traz até LIMITE_PAGINA registros
+  // e "proximo_cursor" aponta a seguinte (null quando não há mais)
+  const buscarHistorico = async (tipo, cursor = null) => {
     let url = '';
     switch (tipo) {
       case 'dispositivos':
@@ -41,7 +51,10 @@ function Historico() {
     }
 
     try {
-      const res = await axios.get(url);
+      setCarregando(true);
+      const params = { limit: LIMITE_PAGINA };
+      if (cursor) params.cursor = cursor;
+      const res = await axios.get(url, { params });
       let registros = [];
 
       if (tipo === 'dispositivos') {
@@ -79,9 +92,14 @@ function Historico() {
         }));
       }
 
-      setDados(registros);
+      // Uma resposta de outra aba (o usuário trocou o tipo no meio) é descartada
+      if (tipo !== tipoAtual.current) return;
+      setDados(anteriores => (cursor ? [...anteriores, ...registros] : registros));
+      setProximoCursor(res.data.proximo_cursor ?? null);
     } catch (error) {
       console.error('Erro ao buscar histórico:', error);
+    } finally {
+      setCarregando(false);
     }
   };
 
@@ -106,7 +124,14 @@ function Historico() {
     }
   
     try {
-      await axios.delete(`${API_URL}${rota}`);
+      const res = await axios.delete(`${API_URL}${rota}`);
+      // A exclusão roda em segundo plano: acompanha a tarefa até ela terminar
+      let tarefa = res.data.tarefa;
+      while (tarefa && tarefa.estado !== 'concluida' && tarefa.estado !== 'falhou') {
+        await new Promise(resolve => setTimeout(resolve, 500));
+        tarefa = (await axios.get(`${API_URL}/tarefas/${tarefa.id}`)).data.tarefa;
+      }
+      if (tarefa && tarefa.estado === 'falhou') throw new Error(tarefa.erro);
       alert(`Histórico de ${tipoSelecionado} apagado com sucesso.`);
       buscarHistorico(tipoSelecionado);
     } catch (error) {
@@ -266,6 +291,20 @@ function Historico() {
             ))}
           </tbody>
         </table>
+        <div style={{ display: 'flex', alignItems: 'center', gap: '1rem', marginTop: '0.75rem' }}>
+          <span>
+            {dados.length} registros carregados{proximoCursor ? ' (há registros mais antigos)' : ''}
+          </span>
+          {proximoCursor && (
+            <button
+              onClick={() => buscarHistorico(tipoSelecionado, proximoCursor)}
+              disabled={carregando}
+              style={botao(false)}
+            >
+              {carregando ? 'Carregando...' : 'Carregar mais'}
+            </button>
+          )}
+        </div>
       </div>
 
       <div style={{ maxWidth: '800px', margin: 'auto' }}>
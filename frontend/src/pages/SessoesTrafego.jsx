@@ -16,6 +16,40 @@ function SessoesTrafego() {
       .catch(() => {});
   }, []);
 
+  // Sessões abertas da máquina local (o backend pode ter sessões de outros dispositivos)
+  const buscarAtivas = () =>
+    axios.get(`${API_URL}/trafego/sessoes/ativas`, { params: { dispositivo_id: maquina.dispositivo_id } });
+
+  // Retoma a sessão sem nome que já estiver aberta (após recarregar a página, por exemplo)
+  useEffect(() => {
+    if (!maquina?.dispositivo_id) return;
+    buscarAtivas()
+      .then(res => {
+        const aberta = res.data.sessoes.find(s => s.nome === null);
+        if (aberta) {
+          setSessao(aberta);
+          setDuracao(Math.floor(aberta.duracao_segundos));
+        }
+      })
+      .catch(() => {});
+  }, [maquina?.dispositivo_id]);
+
+  // Uso ao vivo da sessão aberta, atualizado a cada 5 segundos
+  useEffect(() => {
+    if (!sessao || sessao.fim || !maquina?.dispositivo_id) return;
+    const id = setInterval(() => {
+      buscarAtivas()
+        .then(res => {
+          const aberta = res.data.sessoes.find(s => s.nome === null);
+          if (aberta) {
+            setSessao(prev => (prev && !prev.fim ? { ...prev, ...aberta } : prev));
+          }
+        })
+        .catch(() => {});
+    }, 5000);
+    return () => clearInterval(id);
+  }, [sessao?.inicio, sessao?.fim, maquina?.dispositivo_id]);
+
   // Contador de duração
   useEffect(() => {
     if (sessao && !sessao.fim) {
@@ -1,11 +1,19 @@
 // src/pages/Trafego.jsx
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import axios from 'axios';
 
+const formatarTaxa = (bps) => {
+  if (bps === null || bps === undefined) return '—';
+  if (bps >= 1024 * 1024) return `${(bps / (1024 * 1024)).toFixed(2)} MB/s`;
+  if (bps >= 1024) return `${(bps / 1024).toFixed(1)} KB/s`;
+  return `${bps.toFixed(0)} B/s`;
+};
+
 function Trafego() {
   const [trafego, setTrafego] = useState(null);
   const [carregando, setCarregando] = useState(false);
   const [maquina, setMaquina] = useState(null);
+  const fluxo = useRef(null);
   const API_URL = "https://mynetwork-egj2.onrender.com";
 
   useEffect(() => {
@@ -13,20 +21,34 @@ function Trafego() {
     axios.get(`${API_URL}/maquina`)
       .then(res => setMaquina(res.data))
       .catch(() => setMaquina(null));
+    // encerra o fluxo de eventos ao sair da página
+    return () => fluxo.current && fluxo.current.close();
   }, []);
 
-  const iniciarMonitor = async () => {
-    setCarregando(true);
-    setTrafego(null);
-
-    try {
-      const res = await axios.get(`${API_URL}/trafego`);
-      setTrafego(res.data.trafego);
-    } catch {
-      setTrafego({ erro: 'Erro ao medir tráfego.' });
+  // Acompanha as taxas ao vivo pelo fluxo de eventos (SSE); um novo clique encerra
+  const iniciarMonitor = () => {
+    if (fluxo.current) {
+      fluxo.current.close();
+      fluxo.current = null;
+      setCarregando(false);
+      return;
     }
 
-    setCarregando(false);
+    setCarregando(true);
+    setTrafego(null);
+    const eventos = new EventSource(`${API_URL}/eventos?tipos=trafego`);
+    eventos.addEventListener('trafego', (e) => setTrafego(JSON.parse(e.data)));
+    eventos.onerror = () => {
+      // Sem suporte a eventos no servidor: faz uma medição avulsa
+      if (eventos.readyState === EventSource.CLOSED) {
+        fluxo.current = null;
+        setCarregando(false);
+        axios.get(`${API_URL}/trafego`)
+          .then(res => setTrafego(res.data.trafego))
+          .catch(() => setTrafego({ erro: 'Erro ao medir tráfego.' }));
+      }
+    };
+    fluxo.current = eventos;
   };
 
   return (
@@ -37,7 +59,6 @@ function Trafego() {
 
       <button
         onClick={iniciarMonitor}
-        disabled={carregando}
         style={{
           width: '120px',
           height: '120px',
@@ -48,10 +69,10 @@ function Trafego() {
           fontSize: '1rem',
           border: 'none',
           marginBottom: '2rem',
-          cursor: carregando ? 'not-allowed' : 'pointer',
+          cursor: 'pointer',
         }}
       >
-        {carregando ? 'Monitorando…' : 'Iniciar Monitor'}
+        {carregando ? 'Parar Monitor' : 'Iniciar Monitor'}
       </button>
 
       {trafego && !trafego.erro && (
@@ -67,10 +88,12 @@ function Trafego() {
           <p><strong>Download:</strong> {trafego.download_mb} MB</p>
           <p><strong>Upload:</strong> {trafego.upload_mb} MB</p>
           <p><strong>Total:</strong> {trafego.total_mb} MB</p>
+          <p><strong>Taxa de download:</strong> {formatarTaxa(trafego.download_bps)}</p>
+          <p><strong>Taxa de upload:</strong> {formatarTaxa(trafego.upload_bps)}</p>
           <p><strong>Data:</strong> {trafego.data}</p>
           <hr style={{ margin: '1rem 0' }}/>
           <p style={{ fontSize: '0.9rem', color: '#555' }}>
-            *Este valor é acumulado desde o boot do sistema.
+            *Os totais são acumulados pelo monitor e continuam somando após reinicializações.
           </p>
           
           {maquina && (